@@ -1,47 +1,156 @@
-from flask import Flask, request
+from flask import Flask, Response, request, jsonify
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from flask_cors import CORS
 
+from ser_analytics import EmotionAnalytics
+from ser_metrics import REGISTRY, STAGE_SECONDS
+from ser_results_store import open_results_sink
+
 
 app = Flask(__name__)
 from flask_cors import CORS
 CORS(app)
 
 UPLOAD_DIR = 'received_audio'
+RESULTS_FILE = 'emotion_results.jsonl'
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# "memory": score uploads straight from the request body; "disk": save and let watchdog pick them up
+INGEST_MODE = os.environ.get("SER_INGEST_MODE", "memory")
+# In memory mode, still keep a copy of the raw audio (written off the request path)
+PERSIST_UPLOADS = os.environ.get("SER_PERSIST_UPLOADS", "1") == "1"
+# Outside the watched UPLOAD_DIR, so the copy of an upload already scored from memory is not scored again
+PERSIST_DIR = os.environ.get("SER_PERSIST_DIR", "persisted_audio")
+os.makedirs(PERSIST_DIR, exist_ok=True)
+persist_executor = ThreadPoolExecutor(max_workers=1)
+# With SER_SHARDS > 1 the sharded monitor processes (python ser_predictor.py --shards N) score
+# received_audio; the app then only stores uploads, so no file is scored twice
+SHARDED = int(os.environ.get("SER_SHARDS", 1)) > 1
+RUN_MONITOR = os.environ.get("SER_APP_MONITOR", "0" if SHARDED else "1") == "1"
+# Also forward each prediction to the Express backend (see ser_delivery for the target URL)
+FORWARD_PREDICTIONS = os.environ.get("SER_FORWARD_PREDICTIONS", "0") == "1"
+
+# Set once the emotion monitor is running
+monitor = None
+
+# Dashboard aggregates, updated as each prediction lands
+analytics = EmotionAnalytics()
+
+def persist_upload(filepath, data):
+    try:
+        with open(filepath, 'wb') as f:
+            f.write(data)
+    except OSError as e:
+        print(f"❌ Failed to persist {filepath}: {e}")
+
 @app.route('/receive_audio', methods=['POST'])
 def receive_audio():
-    if 'file' not in request.files:
+    # Chunk senders post the file as "audio"; accept "file" too
+    file = request.files.get('file') or request.files.get('audio')
+    if file is None:
         return "No file part", 400
-    file = request.files['file']
     if file.filename == '':
         return "No selected file", 400
 
-    filepath = os.path.join(UPLOAD_DIR, file.filename)
+    filepath = os.path.join(UPLOAD_DIR, os.path.basename(file.filename))
+
+    if INGEST_MODE == 'memory' and monitor is not None:
+        data = file.stream.read()
+        # Includes any wait for room in the inference queue
+        with STAGE_SECONDS.time(stage="upload_submit"):
+            accepted = monitor.submit_upload(filepath, data)
+        if not accepted:
+            return "Inference queue full", 503
+        if PERSIST_UPLOADS:
+            persist_executor.submit(persist_upload, os.path.join(PERSIST_DIR, os.path.basename(filepath)), data)
+        print(f"✅ Received (in memory): {file.filename}")
+        return "File received", 200
+
     file.save(filepath)
     print(f"✅ Received: {file.filename}")
     return "File received", 200
+
+@app.route('/api/calls')
+def list_calls():
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify(analytics.calls(agent_id=request.args.get('agentId'), limit=limit))
+
+@app.route('/api/calls/active')
+def active_calls():
+    return jsonify(analytics.active_calls())
+
+@app.route('/api/calls/<call_id>/timeline')
+def call_timeline(call_id):
+    timeline = analytics.call_timeline(call_id)
+    if timeline is None:
+        return jsonify({'error': 'Unknown call'}), 404
+    return jsonify(timeline)
+
+@app.route('/api/calls/<call_id>/state')
+def call_state(call_id):
+    state = monitor.call_states.get(call_id) if monitor is not None else None
+    if state is None:
+        return jsonify({'error': 'Unknown call'}), 404
+    return jsonify(state)
+
+@app.route('/api/analytics/emotions')
+def emotion_analytics():
+    return jsonify(analytics.emotion_summary())
+
+@app.route('/api/calls/agent-stats')
+def agent_stats():
+    return jsonify(analytics.agent_stats(request.args.get('agentId', 'system')))
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text exposition format
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # In your Flask app
 import threading
-from ser_predictor import AudioEmotionMonitor
 
 def start_emotion_monitoring():
+    global monitor
+    # Imported here so the web server comes up without waiting on torch/transformers
+    from ser_predictor import AudioEmotionMonitor
+
+    # Rebuild today's and yesterday's aggregates from the results store
+    store = open_results_sink(RESULTS_FILE)
+    since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    analytics.replay(store.query(start=since))
+    store.close()
+
     monitor = AudioEmotionMonitor(
-        watch_directory="received_audio",
-        results_callback=handle_emotion_result
+        watch_directory=UPLOAD_DIR,
+        results_file=RESULTS_FILE,
+        results_callback=handle_emotion_result,
+        escalation_callback=handle_escalation
     )
     monitor.start_monitoring()
 
 def handle_emotion_result(result):
     # Process the emotion result in your Flask app
     # Update database, emit Socket.IO events, etc.
-    pass
+    analytics.update(result)
+    if FORWARD_PREDICTIONS:
+        from ser_predictor import flask_callback
+        flask_callback(result)
+
+def handle_escalation(event):
+    # Sustained negative emotion on a call; push it out straight away
+    if FORWARD_PREDICTIONS:
+        from ser_predictor import escalation_callback
+        escalation_callback(event)
 
 # Start monitoring in a separate thread
-emotion_thread = threading.Thread(target=start_emotion_monitoring)
-emotion_thread.daemon = True
-emotion_thread.start()
+if RUN_MONITOR:
+    emotion_thread = threading.Thread(target=start_emotion_monitoring)
+    emotion_thread.daemon = True
+    emotion_thread.start()
+else:
+    print(f"ℹ️ In-app monitor off; uploads are saved to {UPLOAD_DIR} for the sharded monitor")
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import resource
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+from ser_labels import canonical_emotion
+
+CANDIDATE_MODELS = [
+    "ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition",
+    "harshit345/xlsr-wav2vec-speech-emotion-recognition",
+    "m3hrdadfi/wav2vec2-xlsr-persian-speech-emotion-recognition"  # Try cross-lingual
+]
+
+
+def _percentile(values, q):
+    return round(values[min(len(values) - 1, int(len(values) * q))], 1) if values else None
+
+
+def _evaluate_model(model_name, store_dir, labels, torch_threads):
+    """Child process body: score every cached clip with one model"""
+    import numpy as np
+    from sklearn.metrics import accuracy_score, f1_score
+
+    from ser_feature_store import FeatureStore
+    from ser_predictor import AudioEmotionRecognizer, torch
+    from ser_preprocessing import TARGET_SR, peak_normalize_
+
+    torch.set_num_threads(torch_threads)
+    store = FeatureStore(store_dir)
+
+    start = time.perf_counter()
+    recognizer = AudioEmotionRecognizer(model_name)
+    recognizer.load()
+    load_seconds = time.perf_counter() - start
+    peak = recognizer.needs_peak_normalization()
+
+    truth, predicted, latencies = [], [], []
+    audio_seconds = 0.0
+    for i, label in enumerate(labels):
+        # Copy out of the read-only mapping; the model may normalize in place
+        waveform = torch.from_numpy(np.array(store[i])).unsqueeze(0)
+        if peak:
+            peak_normalize_(waveform)
+        start = time.perf_counter()
+        inputs = recognizer.model_inputs(
+            [waveform], return_attention_mask=recognizer.feature_extractor.return_attention_mask)
+        with torch.no_grad():
+            predicted_id = int(recognizer.backend.logits(inputs).argmax(dim=-1)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+        audio_seconds += waveform.shape[1] / TARGET_SR
+
+        truth.append(canonical_emotion(label) or str(label).lower())
+        # Labels the taxonomy does not know count as wrong rather than fuzzily matched
+        predicted.append(canonical_emotion(recognizer.config.id2label[predicted_id]) or "unmapped")
+
+    inference_seconds = sum(latencies) / 1000
+    classes = sorted(set(truth))
+    latencies.sort()
+    return {
+        'model': model_name,
+        'clips': len(latencies),
+        'accuracy': round(accuracy_score(truth, predicted), 4) if truth else None,
+        'macro_f1': round(f1_score(truth, predicted, labels=classes, average="macro", zero_division=0), 4)
+        if truth else None,
+        'load_seconds': round(load_seconds, 2),
+        'latency_ms_p50': _percentile(latencies, 0.5),
+        'latency_ms_p95': _percentile(latencies, 0.95),
+        'clips_per_second': round(len(latencies) / inference_seconds, 2) if inference_seconds else None,
+        'audio_seconds_per_second': round(audio_seconds / inference_seconds, 2) if inference_seconds else None,
+        # ru_maxrss is reported in KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def _map_isolated(fn, jobs, workers):
+    """fn(*args) for every job, each in a fresh spawned process; results (or exceptions) in job order"""
+    # A reused worker would carry the previous model's weights and ru_maxrss into the next one
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             max_tasks_per_child=1) as pool:
+        futures = [pool.submit(fn, *args) for args in jobs]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+
+def run_benchmark(samples, model_names=CANDIDATE_MODELS, store_dir="benchmark_cache", workers=None,
+                  report_path="benchmark_report.json"):
+    """Decode the eval set once, then score each candidate in its own process"""
+    from ser_feature_store import load_or_build_feature_store
+
+    # Raw waveforms: each model applies its own normalization
+    store = load_or_build_feature_store([s["path"] for s in samples], store_dir,
+                                        max_samples=None, do_normalize=False)
+    label_by_path = {str(s["path"]): s["label"] for s in samples}
+    labels = [label_by_path[path] for path in store.paths]
+
+    workers = workers or min(len(model_names), os.cpu_count() or 1)
+    # Split the cores so concurrent models do not oversubscribe each other
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"🏁 Benchmarking {len(model_names)} models on {len(labels)} clips "
+          f"({workers} processes x {torch_threads} threads)")
+
+    report = []
+    outcomes = _map_isolated(_evaluate_model, [(name, store_dir, labels, torch_threads) for name in model_names],
+                             workers)
+    for name, outcome in zip(model_names, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"❌ {name} failed: {outcome}")
+            report.append({'model': name, 'error': str(outcome)})
+        else:
+            report.append(outcome)
+
+    print(f"\n{'model':<62}{'acc':>7}{'F1':>7}{'p50 ms':>9}{'p95 ms':>9}{'clips/s':>9}{'RSS MB':>9}")
+    for row in report:
+        if 'error' in row:
+            print(f"{row['model']:<62} failed")
+            continue
+        print(f"{row['model']:<62}{row['accuracy']:>7}{row['macro_f1']:>7}{row['latency_ms_p50']:>9}"
+              f"{row['latency_ms_p95']:>9}{row['clips_per_second']:>9}{row['peak_rss_mb']:>9}")
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump({'clips': len(labels), 'workers': workers, 'torch_threads': torch_threads,
+                       'models': report}, f, indent=2)
+        print(f"📄 Report written to {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from datasets import load_from_disk
+
+    parser = argparse.ArgumentParser(description="Accuracy and cost of candidate emotion models")
+    parser.add_argument("--dataset", default="ser_dataset", help="dataset saved with save_to_disk")
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--limit", type=int, help="only use the first N samples")
+    parser.add_argument("--models", nargs="+", default=CANDIDATE_MODELS)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--json", default="benchmark_report.json", help="report path")
+    args = parser.parse_args()
+
+    eval_samples = list(load_from_disk(args.dataset)[args.split])
+    if args.limit:
+        eval_samples = eval_samples[:args.limit]
+    run_benchmark(eval_samples, args.models, workers=args.workers, report_path=args.json)
@@ -1,14 +1,29 @@
-from ser_predictor import predict_emotion
-from ser_sec import predict_emotion_mix
+import sys
 
-audio_path = "received_audio/your_test_file.wav"  # change this as needed
+from ser_predictor import EnsembleEmotionRecognizer, FUSION_RULES
+
+audio_path = sys.argv[1] if len(sys.argv) > 1 else "received_audio/your_test_file.wav"  # change this as needed
+fusion = sys.argv[2] if len(sys.argv) > 2 else "mean"
 
 print("\n📢 Comparing Models for:", audio_path)
 
-print("\n🔷 Old Model Prediction:")
-old_pred = predict_emotion(audio_path)
-print(f"➡️ {old_pred}")
+# Decodes the clip once and runs both models on it side by side
+ensemble = EnsembleEmotionRecognizer(fusion=fusion)
+result = ensemble.predict_emotion_top3(audio_path)
+if result is None:
+    sys.exit("❌ Could not score this clip")
+if result.get('skipped'):
+    sys.exit("🔇 No speech in this clip")
+
+for model in result['ensemble']['models']:
+    print(f"\n🔷 {model['model']} ({model['latency_ms']} ms):")
+    for p in model['predictions']:
+        print(f"  {p['emotion']}: {p['confidence']:.4f}")
+    print(f"➡️ {model['top_emotion']}")
 
-print("\n🔶 New Mix Model Prediction:")
-new_pred = predict_emotion_mix(audio_path)
-print(f"➡️ {new_pred}")
+timing = result['timing']
+print(f"\n🔶 Ensemble ({result['ensemble']['fusion']}; fusion rules: {', '.join(FUSION_RULES)}):")
+for p in result['predictions']:
+    print(f"  {p['emotion']}: {p['confidence']:.4f}")
+print(f"➡️ {result['top_emotion']}")
+print(f"\n⏱️ Decode {timing['decode_ms']} ms | models {timing['models_ms']} ms | total {timing['total_ms']} ms")
@@ -0,0 +1,226 @@
+import io
+import os
+import sys
+import json
+import time
+import wave
+import tempfile
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def synthesize_chunk(seconds, sample_rate=8000, seed=0):
+    """Speech-like 16-bit mono WAV bytes: a gliding harmonic voice with syllable-rate bursts"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = rng.uniform(100, 220) * (1 + 0.15 * np.sin(2 * np.pi * rng.uniform(0.2, 0.6) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    # Roughly four syllables a second with pauses in between
+    syllables = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, np.pi)), 0, None) ** 2
+    signal = 0.3 * voice * syllables + 0.01 * rng.standard_normal(len(t))
+    pcm = (np.clip(signal / np.abs(signal).max(), -1, 1) * 32767 * 0.8).astype('<i2')
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+class DeliveryRecorder:
+    def __init__(self):
+        """Arrival time of every prediction the stub Express receiver gets"""
+        self.delivered = {}
+        self._lock = threading.Lock()
+
+    def record(self, payloads):
+        now = time.time()
+        with self._lock:
+            for payload in payloads:
+                self.delivered.setdefault(payload.get('file_name'), now)
+
+    def count(self):
+        with self._lock:
+            return len(self.delivered)
+
+
+def start_stub_receiver(recorder, port=0):
+    """Local stand-in for the Express /api/receive-prediction endpoint"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+            recorder.record(payload if isinstance(payload, list) else [payload])
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"ok": true}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(len(values) * q))], 1)
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(values[-1], 1)}
+
+
+def run_load_test(calls=4, chunks_per_call=5, chunk_seconds=5.0, speed=1.0, workers=1,
+                  drain_timeout=120.0, vad=False, report_path="load_test_report.json", startup_timeout=600.0):
+    """Drive the real Flask app and monitor with synthetic calls and time chunk -> delivery"""
+    workdir = tempfile.mkdtemp(prefix="ser_load_")
+    recorder = DeliveryRecorder()
+    stub = start_stub_receiver(recorder)
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}/api/receive-prediction"
+
+    # Everything the app writes lands in the scratch directory; no cache so every chunk is scored
+    os.environ.update({
+        'SER_DELIVERY_URL': stub_url,
+        'SER_DELIVERY_OUTBOX': os.path.join(workdir, 'outbox.db'),
+        'SER_FORWARD_PREDICTIONS': '1',
+        'SER_INGEST_MODE': 'memory',
+        'SER_PERSIST_UPLOADS': '0',
+        'SER_PREDICTION_CACHE': '',
+        'SER_VAD': '1' if vad else '0',
+        'SER_WORKERS': str(workers)
+    })
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+
+    import requests
+    from werkzeug.serving import make_server
+
+    import app as ser_app
+
+    server = make_server("127.0.0.1", 0, ser_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    upload_url = f"http://127.0.0.1:{server.server_port}/receive_audio"
+
+    print(f"⏳ Waiting for {workers} inference worker(s)...")
+    startup_deadline = time.time() + startup_timeout
+    while (ser_app.monitor is None or ser_app.monitor.pool.stats()['workers_ready'] < workers):
+        if time.time() > startup_deadline:
+            server.shutdown()
+            stub.shutdown()
+            raise RuntimeError(f"Inference workers not ready after {startup_timeout:.0f}s; "
+                               f"check the model download and the worker logs")
+        time.sleep(0.5)
+
+    created = {}
+    responses = {'accepted': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+
+    def call(call_index):
+        session = requests.Session()
+        caller = f"555{call_index:04d}"
+        started = datetime.now().strftime("%Y%m%d%H%M%S")
+        for k in range(chunks_per_call):
+            name = f"{caller}_{started}_{k:03d}.wav"
+            data = synthesize_chunk(chunk_seconds, seed=call_index * 1000 + k)
+            # A chunk "exists" once a full window of call audio has been captured
+            with lock:
+                created[name] = time.time()
+            try:
+                r = session.post(upload_url, files={'audio': (name, data, 'audio/wav')},
+                                 data={'caller': caller, 'timestamp': started}, timeout=60)
+                outcome = 'accepted' if r.status_code == 200 else 'rejected'
+            except requests.RequestException:
+                outcome = 'errors'
+            with lock:
+                responses[outcome] += 1
+            time.sleep(chunk_seconds / speed)
+
+    print(f"🚦 {calls} concurrent calls x {chunks_per_call} chunks of {chunk_seconds}s "
+          f"at {speed}x real time")
+    start = time.time()
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def skipped():
+        # Chunks the VAD gate found silent are scored but never forwarded to the receiver
+        return ser_app.monitor.pool.stats()['skipped']
+
+    deadline = time.time() + drain_timeout
+    while recorder.count() + skipped() < responses['accepted'] and time.time() < deadline:
+        time.sleep(0.2)
+    elapsed = time.time() - start
+
+    latencies = [(recorder.delivered[name] - t0) * 1000
+                 for name, t0 in created.items() if name in recorder.delivered]
+    delivered = len(latencies)
+    no_speech = skipped()
+    report = {
+        'config': {'calls': calls, 'chunks_per_call': chunks_per_call, 'chunk_seconds': chunk_seconds,
+                   'speed': speed, 'workers': workers, 'vad': vad},
+        'chunks_sent': len(created),
+        'accepted': responses['accepted'],
+        'rejected': responses['rejected'],
+        'errors': responses['errors'],
+        'delivered': delivered,
+        'skipped_no_speech': no_speech,
+        'lost': len(created) - delivered - no_speech,
+        'elapsed_seconds': round(elapsed, 2),
+        'throughput_chunks_per_second': round(delivered / elapsed, 3) if elapsed else 0.0,
+        'throughput_audio_seconds_per_second': round(delivered * chunk_seconds / elapsed, 2) if elapsed else 0.0,
+        'chunk_to_delivery_ms': _percentiles(latencies),
+        'pool': ser_app.monitor.pool.stats()
+    }
+
+    lat = report['chunk_to_delivery_ms']
+    print(f"📊 Delivered {delivered}/{len(created)} ({no_speech} without speech) | {report['throughput_chunks_per_second']} chunks/s | "
+          f"p50 {lat['p50']} ms, p95 {lat['p95']} ms, p99 {lat['p99']} ms")
+    if report_path:
+        report_path = os.path.join(REPO_DIR, report_path) if not os.path.isabs(report_path) else report_path
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {report_path}")
+
+    server.shutdown()
+    stub.shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="End-to-end load test: upload -> monitor -> delivery")
+    parser.add_argument("--calls", type=int, default=4, help="concurrent calls")
+    parser.add_argument("--chunks", type=int, default=5, help="chunks per call")
+    parser.add_argument("--chunk-seconds", type=float, default=5.0)
+    parser.add_argument("--speed", type=float, default=1.0, help="multiple of real time to send chunks at")
+    parser.add_argument("--workers", type=int, default=1, help="inference worker processes")
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--startup-timeout", type=float, default=600.0,
+                        help="seconds to wait for the workers to load the model")
+    parser.add_argument("--vad", action="store_true", help="keep the voice-activity gate on")
+    parser.add_argument("--json", default="load_test_report.json", help="report path")
+    args = parser.parse_args()
+
+    run_load_test(args.calls, args.chunks, args.chunk_seconds, args.speed, args.workers,
+                  args.drain_timeout, args.vad, args.json, args.startup_timeout)
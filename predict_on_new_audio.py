@@ -2,9 +2,11 @@
 import os
 import time
 import torch
-import torchaudio
 from transformers import Wav2Vec2ForSequenceClassification, Wav2Vec2Processor
 
+from ser_backends import load_backend
+from ser_preprocessing import batch_input_values, prepare_waveform
+
 # Set device
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -12,6 +14,13 @@ device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 model = Wav2Vec2ForSequenceClassification.from_pretrained("ser-model").to(device)
 processor = Wav2Vec2Processor.from_pretrained("ser-model")
 
+# torch (default), torch-dynamic-int8 or onnx; the CPU backends run on the CPU only
+backend_name = os.environ.get("SER_BACKEND", "torch")
+if backend_name != "torch":
+    model = model.to("cpu")
+    device = torch.device("cpu")
+backend = load_backend(backend_name, "ser-model", model=model)
+
 # Emotion label mapping
 id2label = {
     0: "neutral",
@@ -26,20 +35,17 @@ id2label = {
 
 # Function to predict emotion from file
 def predict_emotion(audio_path):
-    waveform, sample_rate = torchaudio.load(audio_path)
-
-    if sample_rate != 16000:
-        resampler = torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=16000)
-        waveform = resampler(waveform)
-
-    if waveform.shape[0] > 1:
-        waveform = waveform.mean(dim=0).unsqueeze(0)
+    waveform = prepare_waveform(audio_path, peak_normalize=False, min_samples=0)
 
-    inputs = processor(waveform.squeeze().numpy(), sampling_rate=16000, return_tensors="pt", padding=True)
-    input_values = inputs.input_values.to(device)
+    inputs = batch_input_values(
+        [waveform],
+        do_normalize=processor.feature_extractor.do_normalize,
+        return_attention_mask=False
+    )
+    input_values = inputs['input_values'].to(device)
 
     with torch.no_grad():
-        logits = model(input_values).logits
+        logits = backend.logits({"input_values": input_values})
         predicted_id = torch.argmax(logits, dim=-1).item()
 
     return id2label[predicted_id]
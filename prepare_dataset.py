@@ -2,6 +2,8 @@ import os
 import pandas as pd
 import torchaudio
 
+from ser_preprocessing import get_resampler
+
 # Base dataset folder and output metadata
 base_dir = "data_finetune"
 metadata_csv = "metadata.csv"
@@ -35,8 +37,7 @@ for label in os.listdir(base_dir):
 
             # Resample to 16kHz if needed
             if sr != target_sr:
-                resample = torchaudio.transforms.Resample(orig_freq=sr, new_freq=target_sr)
-                waveform = resample(waveform)
+                waveform = get_resampler(sr, target_sr)(waveform)
                 sr = target_sr
 
             # Overwrite with trimmed + resampled version
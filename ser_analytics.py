@@ -0,0 +1,206 @@
+import threading
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta
+
+from ser_results_store import caller_from_path, call_id_from_path
+
+# Dashboard only knows six emotions; fold the model's extra labels into them
+DASHBOARD_EMOTIONS = {
+    'happy': 'happy',
+    'neutral': 'neutral',
+    'calm': 'neutral',
+    'sad': 'sad',
+    'angry': 'angry',
+    'disgust': 'angry',
+    'surprised': 'surprised',
+    'fearful': 'fearful',
+    'fear': 'fearful',
+}
+
+EMOTION_COLORS = {
+    'happy': '#22c55e',
+    'neutral': '#64748b',
+    'sad': '#3b82f6',
+    'angry': '#ef4444',
+    'surprised': '#eab308',
+    'fearful': '#8b5cf6',
+}
+
+
+def dashboard_emotion(label):
+    return DASHBOARD_EMOTIONS.get(str(label).lower(), 'neutral')
+
+
+def _parse_time(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+class EmotionAnalytics:
+    def __init__(self, max_calls=1000, timeline_length=500, trend_hours=24,
+                 active_window_seconds=60):
+        """Dashboard aggregates maintained incrementally as predictions land"""
+        self.max_calls = max_calls
+        self.timeline_length = timeline_length
+        self.trend_hours = trend_hours
+        self.active_window = timedelta(seconds=active_window_seconds)
+
+        # Most recently updated call last
+        self._calls = OrderedDict()
+        self._distribution = Counter()
+        # Hour -> Counter; results can arrive out of hour order (replay, backlog)
+        self._trend = {}
+        # Agent -> {day: call ids}, today and yesterday only; the sets also dedupe calls evicted from _calls
+        self._agent_days = {}
+        self._lock = threading.Lock()
+
+    def update(self, result):
+        """Fold one prediction into every aggregate (O(1) amortized)"""
+        if not result or not result.get('top_emotion'):
+            return
+        file_path = result.get('file_path', '')
+        call_id = result.get('call_id') or call_id_from_path(file_path)
+        emotion = dashboard_emotion(result['top_emotion'])
+        when = _parse_time(result.get('timestamp'))
+        agent_id = str(result.get('agent_id') or result.get('user_id') or 'system')
+
+        with self._lock:
+            call = self._calls.get(call_id)
+            if call is None:
+                call = {
+                    'id': call_id,
+                    'customerName': caller_from_path(file_path),
+                    'agentId': agent_id,
+                    'start': when,
+                    'last': when,
+                    'emotions': Counter(),
+                    'timeline': deque(maxlen=self.timeline_length)
+                }
+                self._calls[call_id] = call
+                self._count_call(agent_id, call_id, when.date())
+                if len(self._calls) > self.max_calls:
+                    self._calls.popitem(last=False)
+            else:
+                self._calls.move_to_end(call_id)
+            call['start'] = min(call['start'], when)
+            call['last'] = max(call['last'], when)
+            call['emotions'][emotion] += 1
+            call['emotion'] = emotion
+            call['timeline'].append({'time': when.isoformat(), 'emotion': emotion,
+                                     'predictions': result.get('predictions', [])})
+
+            self._distribution[emotion] += 1
+
+            hour = when.replace(minute=0, second=0, microsecond=0)
+            bucket = self._trend.get(hour)
+            if bucket is None:
+                bucket = self._trend[hour] = Counter()
+                # Drop the oldest hour, which is not necessarily the first one seen
+                while len(self._trend) > self.trend_hours:
+                    del self._trend[min(self._trend)]
+            bucket[emotion] += 1
+
+    def _count_call(self, agent_id, call_id, day):
+        """Add a call to its agent's day, keeping only today and yesterday"""
+        oldest = datetime.now().date() - timedelta(days=1)
+        if day < oldest:
+            return
+        days = self._agent_days.setdefault(agent_id, {})
+        if day not in days:
+            # A new day: drop days that fell out of the window, for every agent
+            for agent in list(self._agent_days):
+                kept = {d: ids for d, ids in self._agent_days[agent].items() if d >= oldest}
+                if kept or agent == agent_id:
+                    self._agent_days[agent] = kept
+                else:
+                    del self._agent_days[agent]
+            days = self._agent_days[agent_id]
+        days.setdefault(day, set()).add(call_id)
+
+    def replay(self, results):
+        """Rebuild the aggregates from stored results at startup"""
+        count = 0
+        for result in results:
+            self.update(result)
+            count += 1
+        print(f"📊 Analytics rebuilt from {count} stored results")
+        return count
+
+    def _call_view(self, call, now):
+        return {
+            'id': call['id'],
+            'customerName': call['customerName'],
+            'agentId': call['agentId'],
+            'timestamp': call['start'].isoformat(),
+            'duration': int((call['last'] - call['start']).total_seconds()),
+            'emotion': call['emotion'],
+            'status': 'active' if now - call['last'] <= self.active_window else 'completed'
+        }
+
+    def calls(self, agent_id=None, limit=50):
+        """Most recent calls first, for /api/calls"""
+        now = datetime.now()
+        views = []
+        with self._lock:
+            for call in reversed(self._calls.values()):
+                if agent_id and call['agentId'] != agent_id:
+                    continue
+                views.append(self._call_view(call, now))
+                if len(views) >= limit:
+                    break
+        return views
+
+    def call_timeline(self, call_id):
+        with self._lock:
+            call = self._calls.get(call_id)
+            return list(call['timeline']) if call else None
+
+    def active_calls(self):
+        """Calls that produced a prediction within the active window, for /api/calls/active"""
+        now = datetime.now()
+        active = []
+        with self._lock:
+            for call in reversed(self._calls.values()):
+                if now - call['last'] > self.active_window:
+                    # Ordered by last update, so everything older is inactive too
+                    break
+                active.append({
+                    'id': call['id'],
+                    'agent': call['agentId'],
+                    'customer': call['customerName'],
+                    'duration': int((now - call['start']).total_seconds()),
+                    'startTime': call['start'].isoformat()
+                })
+        return active
+
+    def emotion_summary(self):
+        """Distribution percentages and hourly trend, for /api/analytics/emotions"""
+        with self._lock:
+            total = sum(self._distribution.values())
+            emotion_data = [
+                {'name': emotion, 'value': round(100 * count / total, 1), 'color': EMOTION_COLORS[emotion]}
+                for emotion, count in self._distribution.most_common()
+            ] if total else []
+            trend_data = [
+                dict({'time': hour.strftime('%H:00')},
+                     **{emotion: bucket.get(emotion, 0) for emotion in ('happy', 'neutral', 'sad', 'angry')})
+                for hour, bucket in sorted(self._trend.items())
+            ]
+        return {'emotionData': emotion_data, 'trendData': trend_data}
+
+    def agent_stats(self, agent_id):
+        """Per-agent call counts, for /api/calls/agent-stats"""
+        today = datetime.now().date()
+        with self._lock:
+            days = self._agent_days.get(agent_id, {})
+            today_calls = len(days.get(today, ()))
+            yesterday_calls = len(days.get(today - timedelta(days=1), ()))
+            return {
+                'agentId': agent_id,
+                'todayCalls': today_calls,
+                'yesterdayCalls': yesterday_calls,
+                # Over the same two-day window; older days are not kept
+                'totalCalls': today_calls + yesterday_calls
+            }
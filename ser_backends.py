@@ -0,0 +1,278 @@
+import os
+import time
+import resource
+import multiprocessing as mp
+from pathlib import Path
+
+import numpy as np
+
+from ser_startup import lazy_import, record_startup
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+BACKENDS = ("torch", "torch-dynamic-int8", "onnx")
+# Local snapshots and exported graphs live side by side
+MODELS_DIR = "models"
+
+
+class TorchBackend:
+    def __init__(self, model, name="torch"):
+        """Run the PyTorch model (fp32 or dynamically quantized)"""
+        self.name = name
+        self.model = model
+        self.config = model.config
+
+    def logits(self, inputs):
+        with torch.no_grad():
+            return self.model(**inputs).logits
+
+
+class OnnxBackend:
+    def __init__(self, onnx_path, config, num_threads=None):
+        """Run an exported ONNX graph with onnxruntime on the CPU"""
+        import onnxruntime as ort
+
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(
+                f"No ONNX model at {onnx_path}; run: python ser_backends.py export")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.name = "onnx"
+        self.model = None
+        self.config = config
+        self.session = ort.InferenceSession(
+            str(onnx_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def logits(self, inputs):
+        input_values = inputs["input_values"].numpy().astype(np.float32)
+        feed = {"input_values": input_values}
+        if "attention_mask" in self.input_names:
+            mask = inputs.get("attention_mask")
+            feed["attention_mask"] = (mask.numpy() if mask is not None
+                                      else np.ones(input_values.shape, dtype=np.int64)).astype(np.int64)
+        return torch.from_numpy(self.session.run(["logits"], feed)[0])
+
+
+def default_onnx_path(model_name):
+    """Where export_onnx writes the graph for a hub model name"""
+    return os.path.join(MODELS_DIR, model_name.replace("/", "__") + ".onnx")
+
+
+def snapshot_path(model_name):
+    """Local directory holding the safetensors snapshot of a hub model"""
+    return os.path.join(MODELS_DIR, model_name.replace("/", "__"))
+
+
+def resolve_model_path(model_name):
+    """Prefer the local snapshot (memory-mapped safetensors) over a hub lookup"""
+    local = snapshot_path(model_name)
+    if os.path.exists(os.path.join(local, "config.json")):
+        return local
+    return model_name
+
+
+def snapshot_model(model_name, out_dir=None):
+    """Save model weights as safetensors plus config and feature extractor locally"""
+    out_dir = out_dir or snapshot_path(model_name)
+    print(f"🔄 Snapshotting {model_name} to {out_dir}...")
+    model = transformers.Wav2Vec2ForSequenceClassification.from_pretrained(model_name)
+    extractor = transformers.Wav2Vec2FeatureExtractor.from_pretrained(model_name)
+    model.save_pretrained(out_dir, safe_serialization=True)
+    extractor.save_pretrained(out_dir)
+    print(f"✅ Snapshot saved to {out_dir}")
+    return out_dir
+
+
+def load_backend(name, model_name, model=None, onnx_path=None):
+    """Build the named backend; an already loaded fp32 model is reused"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}', choose from: {', '.join(BACKENDS)}")
+    source = resolve_model_path(model_name)
+
+    if name == "onnx":
+        onnx_path = onnx_path or os.environ.get("SER_ONNX_PATH") or default_onnx_path(model_name)
+        config = model.config if model is not None else transformers.AutoConfig.from_pretrained(source)
+        return OnnxBackend(onnx_path, config, num_threads=torch.get_num_threads())
+
+    if model is None:
+        start = time.perf_counter()
+        model = transformers.Wav2Vec2ForSequenceClassification.from_pretrained(source)
+        record_startup("model_weights" if source != model_name else "model_weights_hub",
+                       time.perf_counter() - start)
+    model.eval()
+    if name == "torch-dynamic-int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return TorchBackend(model, name)
+
+
+def export_onnx(model_name, onnx_path=None, opset=14):
+    """Export the classifier to ONNX with dynamic batch and length axes"""
+    onnx_path = onnx_path or default_onnx_path(model_name)
+    Path(onnx_path).parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"🔄 Exporting {model_name} to ONNX...")
+    model = transformers.Wav2Vec2ForSequenceClassification.from_pretrained(resolve_model_path(model_name))
+    model.eval()
+    input_values = torch.randn(1, 16000 * 4)
+    attention_mask = torch.ones(1, 16000 * 4, dtype=torch.long)
+    torch.onnx.export(
+        model,
+        (input_values, attention_mask),
+        onnx_path,
+        input_names=["input_values", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_values": {0: "batch", 1: "samples"},
+            "attention_mask": {0: "batch", 1: "samples"},
+            "logits": {0: "batch"}
+        },
+        opset_version=opset
+    )
+    print(f"✅ Saved ONNX model to {onnx_path}")
+    return onnx_path
+
+
+def verify_backend(name, reference_paths, model_name=None, min_agreement=1.0):
+    """Check that a backend's top-1 labels match the fp32 model on a reference set"""
+    from ser_predictor import AudioEmotionRecognizer
+    from ser_workers import DEFAULT_MODEL
+
+    model_name = model_name or DEFAULT_MODEL
+    reference = AudioEmotionRecognizer(model_name, backend="torch")
+    candidate = AudioEmotionRecognizer(model_name, backend=name)
+
+    matched = 0
+    compared = 0
+    mismatches = []
+    for path in reference_paths:
+        expected = reference.predict_emotion_top3(path)
+        actual = candidate.predict_emotion_top3(path)
+        if expected is None or actual is None:
+            continue
+        compared += 1
+        if expected['top_emotion'] == actual['top_emotion']:
+            matched += 1
+        else:
+            mismatches.append((str(path), expected['top_emotion'], actual['top_emotion']))
+
+    agreement = matched / compared if compared else 0.0
+    print(f"🔎 {name}: top-1 agreement with fp32 {matched}/{compared} ({agreement:.2%})")
+    for path, expected, actual in mismatches:
+        print(f"   ⚠️ {Path(path).name}: fp32={expected} {name}={actual}")
+    return {'backend': name, 'compared': compared, 'matched': matched,
+            'agreement': round(agreement, 4), 'passed': compared > 0 and agreement >= min_agreement,
+            'mismatches': mismatches}
+
+
+def _measure_backend(name, model_name, reference_paths, result_queue):
+    """Child process body: load one backend and time it so RSS is attributable"""
+    from ser_predictor import AudioEmotionRecognizer
+
+    start = time.perf_counter()
+    recognizer = AudioEmotionRecognizer(model_name, backend=name)
+    recognizer.load()
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    for path in reference_paths:
+        start = time.perf_counter()
+        recognizer.predict_emotion_top3(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    result_queue.put({
+        'backend': name,
+        'load_seconds': round(load_seconds, 2),
+        'clips': len(latencies),
+        'latency_ms_p50': round(latencies[len(latencies) // 2], 1) if latencies else None,
+        'latency_ms_p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1)
+        if latencies else None,
+        # ru_maxrss is reported in KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    })
+
+
+def compare_backends(reference_paths, backends=BACKENDS, model_name=None):
+    """Latency and peak RSS per backend, each measured in a fresh process"""
+    from ser_workers import DEFAULT_MODEL
+
+    model_name = model_name or DEFAULT_MODEL
+    reference_paths = [str(p) for p in reference_paths]
+    ctx = mp.get_context("spawn")
+    report = []
+    for name in backends:
+        result_queue = ctx.Queue()
+        process = ctx.Process(target=_measure_backend,
+                              args=(name, model_name, reference_paths, result_queue))
+        process.start()
+        process.join()
+        if result_queue.empty():
+            print(f"❌ Backend {name} failed (exit code {process.exitcode})")
+            continue
+        report.append(result_queue.get())
+
+    print(f"\n{'backend':<20}{'load s':>8}{'p50 ms':>10}{'p95 ms':>10}{'RSS MB':>10}")
+    for row in report:
+        print(f"{row['backend']:<20}{row['load_seconds']:>8}{row['latency_ms_p50']:>10}"
+              f"{row['latency_ms_p95']:>10}{row['peak_rss_mb']:>10}")
+    return report
+
+
+def _reference_files(paths):
+    """Expand directories into the audio files they contain"""
+    from ser_predictor import SUPPORTED_FORMATS
+
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.suffix.lower() in SUPPORTED_FORMATS))
+        else:
+            files.append(path)
+    return files
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from ser_workers import DEFAULT_MODEL
+
+    parser = argparse.ArgumentParser(description="Export, verify and compare CPU inference backends")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_cmd = sub.add_parser("snapshot", help="save a local safetensors snapshot of the model")
+    snapshot_cmd.add_argument("--output", help="directory (default: models/<model>)")
+
+    export_cmd = sub.add_parser("export", help="export the model to ONNX")
+    export_cmd.add_argument("--output", help="ONNX path (default: models/<model>.onnx)")
+    export_cmd.add_argument("--opset", type=int, default=14)
+
+    verify_cmd = sub.add_parser("verify", help="check top-1 labels against fp32")
+    verify_cmd.add_argument("backend", choices=BACKENDS)
+    verify_cmd.add_argument("reference", nargs="+", help="audio files or directories")
+    verify_cmd.add_argument("--min-agreement", type=float, default=1.0)
+
+    compare_cmd = sub.add_parser("compare", help="latency and RSS per backend")
+    compare_cmd.add_argument("reference", nargs="+", help="audio files or directories")
+    compare_cmd.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    compare_cmd.add_argument("--json", help="also write the report to this file")
+
+    args = parser.parse_args()
+    if args.command == "snapshot":
+        snapshot_model(args.model, args.output)
+    elif args.command == "export":
+        export_onnx(args.model, args.output, args.opset)
+    elif args.command == "verify":
+        outcome = verify_backend(args.backend, _reference_files(args.reference), args.model,
+                                 args.min_agreement)
+        raise SystemExit(0 if outcome['passed'] else 1)
+    else:
+        report = compare_backends(_reference_files(args.reference), args.backends, args.model)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
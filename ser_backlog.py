@@ -0,0 +1,154 @@
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class ProcessedLedger:
+    def __init__(self, path="backlog_ledger.db", max_attempts=3):
+        """Files whose inference finished (or kept failing), recorded from the result path"""
+        self.max_attempts = max_attempts
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(str(file_path))
+
+    def _record(self, file_path, done):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            # Never reached disk (in-memory upload); a later walk cannot find it either
+            return
+        key = self._key(file_path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, attempts FROM files WHERE path = ?", (key,)).fetchone()
+            # A rewritten file starts over
+            attempts = row[2] if row and (row[0], row[1]) == (st.st_size, st.st_mtime_ns) else 0
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, done, attempts) VALUES (?, ?, ?, ?, ?)",
+                (key, st.st_size, st.st_mtime_ns, int(done), attempts + (0 if done else 1)))
+            self._conn.commit()
+
+    def mark_done(self, file_path):
+        self._record(file_path, done=True)
+
+    def mark_failed(self, file_path):
+        self._record(file_path, done=False)
+
+    def needs_processing(self, file_path, st=None):
+        """False once this exact file (same size and mtime) is done or out of attempts"""
+        try:
+            st = st or os.stat(file_path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, done, attempts FROM files WHERE path = ?",
+                (self._key(file_path),)).fetchone()
+        if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+            return True
+        return not row[2] and row[3] < self.max_attempts
+
+    def is_done(self, file_path):
+        """True if this exact file (same size and mtime) was recorded as done"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, done FROM files WHERE path = ?", (self._key(file_path),)).fetchone()
+        return row is not None and (row[0], row[1]) == (st.st_size, st.st_mtime_ns) and bool(row[2])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BacklogWalker:
+    def __init__(self, root, submit, ledger, formats, rescan_seconds=300, min_age_seconds=2.0):
+        """Background walk that queues every file in root the ledger does not mark as finished"""
+        # Nothing is skipped by position or mtime: work lost to a crash, a full queue or a failed
+        # inference is not in the ledger, so the next walk (restart or rescan) queues it again
+        self.root = Path(root)
+        self.submit = submit
+        self.ledger = ledger
+        self.formats = formats
+        self.rescan_seconds = rescan_seconds
+        # Younger files belong to live events still being handled
+        self.min_age_seconds = min_age_seconds
+        self.submitted = 0
+        self.walks = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _files(self, directory):
+        """Audio files under directory in sorted depth-first order"""
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name.startswith('.'):
+                # Bookkeeping such as the shard claims directory
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._files(entry.path)
+            elif Path(entry.name).suffix.lower() in self.formats:
+                yield Path(entry.path), entry
+
+    def walk(self):
+        """One pass over the tree; returns how many files were queued"""
+        queued = 0
+        for path, entry in self._files(self.root):
+            if self._stop.is_set():
+                break
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if time.time() - st.st_mtime < self.min_age_seconds:
+                continue
+            if not self.ledger.needs_processing(path, st):
+                continue
+            self.submit(path)
+            queued += 1
+        self.submitted += queued
+        self.walks += 1
+        return queued
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        print("🔍 Checking for existing audio files in the background...")
+        while not self._stop.is_set():
+            queued = self.walk()
+            if self._stop.is_set():
+                break
+            if self.walks == 1 or queued:
+                print(f"✅ Backlog walk finished ({queued} files queued)")
+            if not self.rescan_seconds:
+                break
+            self._stop.wait(self.rescan_seconds)
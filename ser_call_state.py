@@ -0,0 +1,167 @@
+import time
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from ser_labels import CANONICAL_EMOTIONS, canonical_emotion
+from ser_results_store import call_id_from_path, caller_from_path
+
+# Emotions that count towards an escalation
+NEGATIVE_EMOTIONS = ('angry', 'fearful', 'disgust')
+
+
+class CallState:
+    __slots__ = ('call_id', 'customer_name', 'started', 'last_seen', 'last_update', 'chunks', 'scores',
+                 'counts', 'streak', 'longest_streak', 'peak_negative', 'escalated', 'escalations')
+
+    def __init__(self, call_id, customer_name, when):
+        self.call_id = call_id
+        self.customer_name = customer_name
+        self.started = when
+        self.last_seen = when
+        self.last_update = time.monotonic()
+        self.chunks = 0
+        self.scores = dict.fromkeys(CANONICAL_EMOTIONS, 0.0)
+        self.counts = Counter()
+        self.streak = 0
+        self.longest_streak = 0
+        self.peak_negative = 0.0
+        self.escalated = False
+        self.escalations = 0
+
+    def negative_score(self):
+        return sum(self.scores[e] for e in NEGATIVE_EMOTIONS)
+
+    def summary(self):
+        dominant = self.counts.most_common(1)
+        return {
+            'call_id': self.call_id,
+            'customer_name': self.customer_name,
+            'started': self.started,
+            'last_seen': self.last_seen,
+            'chunks': self.chunks,
+            'scores': {e: round(v, 4) for e, v in self.scores.items()},
+            'dominant_emotion': dominant[0][0] if dominant else None,
+            'emotion_counts': dict(self.counts),
+            'negative_score': round(self.negative_score(), 4),
+            'negative_streak': self.streak,
+            'longest_negative_streak': self.longest_streak,
+            'peak_negative_score': round(self.peak_negative, 4),
+            'escalated': self.escalated,
+            'escalations': self.escalations
+        }
+
+
+class CallStateTable:
+    def __init__(self, ttl_seconds=300, alpha=0.4, streak_threshold=3, score_threshold=0.6,
+                 min_chunks=2, max_calls=10000, on_escalation=None):
+        """Running per-call emotion state, updated in O(1) per chunk, with escalation events"""
+        self.ttl_seconds = ttl_seconds
+        self.alpha = alpha
+        self.streak_threshold = streak_threshold
+        self.score_threshold = score_threshold
+        self.min_chunks = min_chunks
+        self.max_calls = max_calls
+        self.on_escalation = on_escalation
+        # Least recently updated call first, so expiry only ever looks at the front
+        self._calls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._calls:
+            call_id, state = next(iter(self._calls.items()))
+            if now - state.last_update <= self.ttl_seconds and len(self._calls) <= self.max_calls:
+                break
+            self._calls.popitem(last=False)
+
+    def update(self, result):
+        """Fold one chunk's predictions into its call; returns (summary, escalation event or None)"""
+        if not result or not result.get('top_emotion'):
+            return None, None
+        file_path = result.get('file_path', '')
+        call_id = result.get('call_id') or call_id_from_path(file_path)
+        when = result.get('timestamp') or datetime.now().isoformat()
+
+        # Only the top 3 are reported; the rest of the probability mass counts as zero
+        observed = dict.fromkeys(CANONICAL_EMOTIONS, 0.0)
+        for prediction in result.get('predictions', []):
+            emotion = canonical_emotion(prediction['emotion'])
+            if emotion:
+                observed[emotion] += prediction['confidence']
+        top = canonical_emotion(result['top_emotion'])
+
+        now = time.monotonic()
+        with self._lock:
+            state = self._calls.get(call_id)
+            if state is None:
+                state = self._calls[call_id] = CallState(call_id, caller_from_path(file_path), when)
+            else:
+                self._calls.move_to_end(call_id)
+            state.last_update = now
+            state.last_seen = when
+            state.chunks += 1
+            if top:
+                state.counts[top] += 1
+
+            alpha = 1.0 if state.chunks == 1 else self.alpha
+            for emotion, value in observed.items():
+                state.scores[emotion] += alpha * (value - state.scores[emotion])
+
+            if top in NEGATIVE_EMOTIONS:
+                state.streak += 1
+                state.longest_streak = max(state.longest_streak, state.streak)
+            else:
+                state.streak = 0
+            negative = state.negative_score()
+            state.peak_negative = max(state.peak_negative, negative)
+
+            event = None
+            reason = None
+            if state.streak >= self.streak_threshold:
+                reason = 'negative_streak'
+            elif state.chunks >= self.min_chunks and negative >= self.score_threshold:
+                reason = 'negative_score'
+            if reason and not state.escalated:
+                state.escalated = True
+                state.escalations += 1
+                worst = max(NEGATIVE_EMOTIONS, key=lambda e: state.scores[e])
+                event = {
+                    'type': 'escalation',
+                    'reason': reason,
+                    'call_id': call_id,
+                    'customer_name': state.customer_name,
+                    'emotion': worst,
+                    'negative_score': round(negative, 4),
+                    'negative_streak': state.streak,
+                    'file_name': str(file_path).replace('\\', '/').rsplit('/', 1)[-1],
+                    'timestamp': when
+                }
+            elif state.escalated and state.streak == 0 and negative < 0.8 * self.score_threshold:
+                # Calmed down (with some hysteresis); a new episode may escalate again
+                state.escalated = False
+
+            summary = state.summary()
+            if event is not None:
+                event['summary'] = summary
+            self._evict(now)
+
+        if event is not None and self.on_escalation is not None:
+            try:
+                self.on_escalation(event)
+            except Exception as e:
+                print(f"❌ Escalation handler failed for call {call_id}: {str(e)}")
+        return summary, event
+
+    def get(self, call_id):
+        with self._lock:
+            state = self._calls.get(call_id)
+            return state.summary() if state else None
+
+    def active(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return [state.summary() for state in reversed(self._calls.values())]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
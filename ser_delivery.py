@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import threading
+
+DEFAULT_URL = "http://localhost:3000/api/receive-prediction"
+DEFAULT_ESCALATION_URL = "http://localhost:3000/api/escalation"
+
+# 4xx answers that may succeed on a later attempt; any other 4xx is final
+RETRYABLE_CLIENT_ERRORS = {408, 429}
+
+
+class DeliveryClient:
+    def __init__(self, url=DEFAULT_URL, batch_url=None, batch_size=1, outbox_path="delivery_outbox.db",
+                 pool_size=8, timeout=10, base_backoff=0.5, max_backoff=60.0):
+        """Deliver payloads from a durable outbox over pooled keep-alive connections"""
+        self.url = url
+        # Several payloads go in one POST only when the backend has a batch endpoint
+        self.batch_url = batch_url
+        self.batch_size = batch_size if batch_url else 1
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._conn = sqlite3.connect(outbox_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL
+            )
+        """)
+        # Payloads the backend rejected outright; kept for inspection instead of retried forever
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dead_lettered = 0
+        self.last_error = None
+
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        self._stopping = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload, url=None):
+        """Persist a payload to the outbox and return immediately"""
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT INTO outbox (url, payload, next_attempt) VALUES (?, ?, ?)",
+                (url or self.url, json.dumps(payload), time.time()))
+            self._conn.commit()
+        self._loop.call_soon_threadsafe(self._notify)
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stats(self):
+        with self._db_lock:
+            pending = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        return {
+            'running': self._thread.is_alive(),
+            'pending': pending,
+            'delivered': self.delivered,
+            'failed_attempts': self.failed_attempts,
+            'dead_lettered': self.dead_lettered,
+            'last_error': self.last_error
+        }
+
+    def close(self, timeout=5):
+        """Stop the delivery loop; anything undelivered stays in the outbox"""
+        self._stopping = True
+        self._loop.call_soon_threadsafe(self._notify)
+        self._thread.join(timeout)
+        with self._db_lock:
+            self._conn.close()
+
+    def _due(self, limit):
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT id, url, payload, attempts FROM outbox WHERE next_attempt <= ? "
+                "ORDER BY id LIMIT ?", (time.time(), limit)).fetchall()
+
+    def _next_due_in(self):
+        with self._db_lock:
+            row = self._conn.execute("SELECT MIN(next_attempt) FROM outbox").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def _delivered(self, ids):
+        with self._db_lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+        self.delivered += len(ids)
+
+    def _retry_later(self, rows, error):
+        """Exponential backoff with jitter per outbox row"""
+        self.failed_attempts += 1
+        self.last_error = error
+        now = time.time()
+        updates = []
+        for row_id, _, _, attempts in rows:
+            delay = min(self.max_backoff, self.base_backoff * (2 ** attempts)) * random.uniform(0.5, 1.0)
+            updates.append((attempts + 1, now + delay, row_id))
+        with self._db_lock:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?", updates)
+            self._conn.commit()
+        print(f"⚠️ Delivery failed ({error}); {len(rows)} payload(s) kept in outbox for retry")
+
+    def _dead_letter(self, rows, error):
+        """Move rows the backend will never accept out of the outbox"""
+        self.last_error = error
+        now = time.time()
+        with self._db_lock:
+            self._conn.executemany(
+                "INSERT INTO dead_letter (id, url, payload, attempts, error, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(row_id, url, payload, attempts + 1, error, now) for row_id, url, payload, attempts in rows])
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(row[0],) for row in rows])
+            self._conn.commit()
+        self.dead_lettered += len(rows)
+        print(f"❌ Delivery rejected ({error}); {len(rows)} payload(s) moved to dead_letter")
+
+    async def _post(self, session, url, body, rows):
+        try:
+            async with session.post(url, json=body) as response:
+                if 200 <= response.status < 300:
+                    self._delivered([row[0] for row in rows])
+                elif 400 <= response.status < 500 and response.status not in RETRYABLE_CLIENT_ERRORS:
+                    self._dead_letter(rows, f"HTTP {response.status}")
+                else:
+                    self._retry_later(rows, f"HTTP {response.status}")
+        except Exception as e:
+            self._retry_later(rows, f"{type(e).__name__}: {e}")
+
+    def _serve(self):
+        """Delivery thread; says why it stopped rather than dying silently"""
+        try:
+            self._loop.run_until_complete(self._run())
+        except ImportError:
+            self.last_error = "aiohttp is not installed"
+            print("❌ Prediction delivery stopped: aiohttp is not installed (pip install aiohttp); "
+                  "payloads stay in the outbox")
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"❌ Prediction delivery stopped ({self.last_error}); payloads stay in the outbox")
+
+    async def _run(self):
+        import aiohttp
+
+        self._wakeup = asyncio.Event()
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            while not self._stopping:
+                # Cleared before the outbox is read, so a submit() racing the read still wakes the wait
+                self._wakeup.clear()
+                rows = self._due(self.pool_size * self.batch_size)
+                if rows:
+                    await asyncio.gather(*[
+                        self._post(session, url, body, group) for url, body, group in self._group(rows)
+                    ])
+                    continue
+
+                wait = self._next_due_in()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait if wait is not None else 5.0)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _group(self, rows):
+        """One POST per payload, or batches of up to batch_size for the default URL"""
+        if self.batch_size <= 1:
+            return [(row[1], json.loads(row[2]), [row]) for row in rows]
+        single = [row for row in rows if row[1] != self.url]
+        batched = [row for row in rows if row[1] == self.url]
+        groups = [(row[1], json.loads(row[2]), [row]) for row in single]
+        for i in range(0, len(batched), self.batch_size):
+            chunk = batched[i:i + self.batch_size]
+            groups.append((self.batch_url, [json.loads(row[2]) for row in chunk], chunk))
+        return groups
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def escalation_url():
+    return os.environ.get("SER_ESCALATION_URL", DEFAULT_ESCALATION_URL)
+
+
+def get_delivery_client():
+    """Process-wide client configured from SER_DELIVERY_* environment variables"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DeliveryClient(
+                url=os.environ.get("SER_DELIVERY_URL", DEFAULT_URL),
+                batch_url=os.environ.get("SER_DELIVERY_BATCH_URL"),
+                batch_size=int(os.environ.get("SER_DELIVERY_BATCH_SIZE", 10)),
+                outbox_path=os.environ.get("SER_DELIVERY_OUTBOX", "delivery_outbox.db")
+            )
+        return _client
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+
+import numpy as np
+
+from ser_preprocessing import TARGET_SR, prepare_waveform
+from ser_startup import lazy_import
+
+torch = lazy_import("torch")
+
+# Bump when the stored features change meaning, so stale stores get rebuilt
+FEATURE_STORE_VERSION = 1
+
+WAVEFORMS_FILE = "waveforms.f32"
+INDEX_FILE = "index.json"
+
+
+def _fingerprint(paths):
+    """Cheap identity of the source files: path, size and mtime"""
+    entries = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            entries.append([str(path), stat.st_size, int(stat.st_mtime)])
+        except OSError:
+            entries.append([str(path), None, None])
+    return entries
+
+
+def build_feature_store(paths, store_dir, max_samples=64000, do_normalize=True):
+    """Decode every clip once and append its float32 waveform to one flat file"""
+    os.makedirs(store_dir, exist_ok=True)
+    start = time.perf_counter()
+    offsets, lengths, stored_paths = [], [], []
+    position = 0
+    with open(os.path.join(store_dir, WAVEFORMS_FILE), "wb") as out:
+        for path in paths:
+            try:
+                waveform = prepare_waveform(path, peak_normalize=False, min_samples=1)
+            except Exception as e:
+                print(f"⚠️ Skipping file {path} due to error: {e}")
+                continue
+            if waveform is None:
+                continue
+            samples = waveform.reshape(-1)[:max_samples].numpy().astype(np.float32, copy=False)
+            if do_normalize:
+                # Same per-utterance zero mean/unit variance as Wav2Vec2FeatureExtractor
+                samples = (samples - samples.mean()) / np.sqrt(samples.var() + 1e-7)
+            out.write(samples.tobytes())
+            offsets.append(position)
+            lengths.append(len(samples))
+            stored_paths.append(str(path))
+            position += len(samples)
+
+    index = {
+        'version': FEATURE_STORE_VERSION,
+        'sample_rate': TARGET_SR,
+        'max_samples': max_samples,
+        'do_normalize': do_normalize,
+        'sources': _fingerprint(paths),
+        'paths': stored_paths,
+        'offsets': offsets,
+        'lengths': lengths
+    }
+    with open(os.path.join(store_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    print(f"💾 Feature store: {len(stored_paths)} clips, {position * 4 / 1e6:.1f} MB "
+          f"in {time.perf_counter() - start:.1f}s")
+    return FeatureStore(store_dir)
+
+
+def load_or_build_feature_store(paths, store_dir="feature_cache", max_samples=64000, do_normalize=True):
+    """Reuse the store in store_dir if it was built from the same files and settings"""
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if (index.get('version') == FEATURE_STORE_VERSION
+                and index.get('max_samples') == max_samples
+                and index.get('do_normalize') == do_normalize
+                and index.get('sources') == _fingerprint(paths)):
+            print(f"💾 Reusing feature store in {store_dir}")
+            return FeatureStore(store_dir)
+    return build_feature_store(paths, store_dir, max_samples, do_normalize)
+
+
+class FeatureStore:
+    def __init__(self, store_dir):
+        """Read-only, memory-mapped view of a store written by build_feature_store"""
+        with open(os.path.join(store_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.paths = index['paths']
+        self.offsets = np.asarray(index['offsets'], dtype=np.int64)
+        self.lengths = np.asarray(index['lengths'], dtype=np.int64)
+        waveforms_path = os.path.join(store_dir, WAVEFORMS_FILE)
+        # np.memmap refuses empty files
+        if os.path.getsize(waveforms_path):
+            self.waveforms = np.memmap(waveforms_path, dtype=np.float32, mode="r")
+        else:
+            self.waveforms = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        """Zero-copy slice of the mapped file; pages are read only when touched"""
+        offset = self.offsets[i]
+        return self.waveforms[offset:offset + self.lengths[i]]
+
+
+class LengthBucketBatchSampler:
+    def __init__(self, lengths, max_samples_per_batch=256000, max_batch_size=32, shuffle=True, seed=42):
+        """Batches of similar-length clips sized by a padded-sample budget instead of a fixed count"""
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        # Composition is fixed (so len() is stable for the Trainer); only the batch order is shuffled
+        order = np.argsort(np.asarray(lengths), kind="stable")
+        self.batches = []
+        batch, longest = [], 0
+        for position in order.tolist():
+            length = int(lengths[position])
+            candidate = max(longest, length)
+            if batch and (candidate * (len(batch) + 1) > max_samples_per_batch
+                          or len(batch) >= max_batch_size):
+                self.batches.append(batch)
+                batch, candidate = [], length
+            batch.append(position)
+            longest = candidate
+        if batch:
+            self.batches.append(batch)
+
+    def set_epoch(self, epoch):
+        self.epoch = int(epoch)
+
+    def __iter__(self):
+        order = np.arange(len(self.batches))
+        if self.shuffle:
+            np.random.default_rng(self.seed + self.epoch).shuffle(order)
+        for i in order.tolist():
+            yield self.batches[i]
+
+    def __len__(self):
+        return len(self.batches)
+
+
+class FeatureStoreCollator:
+    def __init__(self, store, return_attention_mask=True):
+        """Batch features of the form {'index': i, 'label': id} straight from the store"""
+        self.store = store
+        self.return_attention_mask = return_attention_mask
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.batched_samples = 0
+        self.padded_samples = 0
+        self.batches = 0
+
+    def padding_ratio(self):
+        """Share of the batched samples that were padding since the last reset"""
+        return self.padded_samples / self.batched_samples if self.batched_samples else 0.0
+
+    def __call__(self, features):
+        indices = [f["index"] for f in features]
+        lengths = [int(self.store.lengths[i]) for i in indices]
+        max_length = max(lengths)
+        input_values = torch.zeros(len(indices), max_length, dtype=torch.float32)
+        # One copy per clip, from the page cache straight into the padded batch
+        buffer = input_values.numpy()
+        for row, i in enumerate(indices):
+            buffer[row, :lengths[row]] = self.store[i]
+
+        total = len(indices) * max_length
+        self.batched_samples += total
+        self.padded_samples += total - sum(lengths)
+        self.batches += 1
+
+        batch = {
+            'input_values': input_values,
+            'labels': torch.tensor([f["label"] for f in features], dtype=torch.long)
+        }
+        if self.return_attention_mask:
+            attention_mask = torch.zeros(len(indices), max_length, dtype=torch.long)
+            for row, length in enumerate(lengths):
+                attention_mask[row, :length] = 1
+            batch['attention_mask'] = attention_mask
+        return batch
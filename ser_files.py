@@ -0,0 +1,20 @@
+import os
+import time
+
+
+def wait_until_ready(file_path, interval=0.1, timeout=5.0):
+    """Wait until a file stops growing instead of sleeping a fixed time"""
+    deadline = time.monotonic() + timeout
+    last_size = -1
+    while time.monotonic() < deadline:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        size = stat.st_size
+        if size > 0 and (size == last_size or time.time() - stat.st_mtime >= interval):
+            # Unchanged for a whole interval already; most queued files are, so skip the sleep
+            return True
+        last_size = size
+        time.sleep(interval)
+    return last_size > 0
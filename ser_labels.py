@@ -0,0 +1,36 @@
+# One taxonomy for every model; each checkpoint names the same emotions differently
+CANONICAL_EMOTIONS = ('angry', 'disgust', 'fearful', 'happy', 'neutral', 'sad', 'surprised')
+
+LABEL_ALIASES = {
+    'angry': 'angry',
+    'anger': 'angry',
+    'ang': 'angry',
+    'disgust': 'disgust',
+    'disgusted': 'disgust',
+    'dis': 'disgust',
+    'fearful': 'fearful',
+    'fear': 'fearful',
+    'fea': 'fearful',
+    'happy': 'happy',
+    'happiness': 'happy',
+    'joy': 'happy',
+    'hap': 'happy',
+    'neutral': 'neutral',
+    'neu': 'neutral',
+    'calm': 'neutral',
+    'sad': 'sad',
+    'sadness': 'sad',
+    'sur': 'surprised',
+    'surprise': 'surprised',
+    'surprised': 'surprised',
+}
+
+
+def canonical_emotion(label):
+    """Canonical name for a model or dataset label, or None if it has no counterpart"""
+    return LABEL_ALIASES.get(str(label).strip().lower())
+
+
+def canonical_index(label):
+    emotion = canonical_emotion(label)
+    return CANONICAL_EMOTIONS.index(emotion) if emotion else None
@@ -1,47 +1,113 @@
-import requests  
-import torch
-import torchaudio
+import numpy as np
+import io
 import os
 import time
-import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from transformers import Wav2Vec2ForSequenceClassification, Wav2Vec2FeatureExtractor
+
+from ser_backends import load_backend, resolve_model_path
+from ser_backlog import BacklogWalker, ProcessedLedger
+from ser_call_state import CallStateTable
+from ser_labels import CANONICAL_EMOTIONS, canonical_index
+from ser_metrics import STAGE_SECONDS, StageTimer, observe_stages
+from ser_prediction_cache import hash_bytes, hash_file
+from ser_preprocessing import (StreamResampler, audio_duration, batch_input_values, peak_normalize_,
+                               prepare_waveform, stream_windows)
+from ser_results_store import call_id_from_path, caller_from_path, open_results_sink
+from ser_sharding import ShardAssignment
+from ser_startup import lazy_import, record_startup, startup_report
+from ser_workers import DEFAULT_MODEL, PRIORITY_BACKLOG, PRIORITY_LIVE, InferenceWorkerPool
+
+# Heavy imports happen on first use so restarts and imports stay fast
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+
+# Supported audio formats
+SUPPORTED_FORMATS = {'.wav', '.mp3', '.flac', '.m4a', '.ogg', '.wma'}
+
+# Models scored together in ensemble mode (override with SER_ENSEMBLE_MODELS=a,b,...)
+ENSEMBLE_MODELS = (DEFAULT_MODEL, "j-hartmann/emotion-english-wav2vec2")
+
+# Ensemble fusion rules: average, log-linear pool, elementwise max, or majority vote
+FUSION_RULES = ('mean', 'geometric', 'max', 'vote')
+
+# Bump whenever preprocessing changes so cached predictions are not reused
+PREPROCESS_VERSION = 4
+
+class UploadedAudio:
+    def __init__(self, name, data):
+        """Encoded audio bytes received over HTTP, scored without touching disk"""
+        self.name = str(name)
+        self.data = data
+    
+    def __str__(self):
+        return self.name
+    
+    def open(self):
+        return io.BytesIO(self.data)
 
 class AudioEmotionRecognizer:
-    def __init__(self, model_name="ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition"):
-        """Initialize the emotion recognition model"""
-        print("🔄 Loading emotion recognition model...")
-        self.model = Wav2Vec2ForSequenceClassification.from_pretrained(model_name)
-        self.feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
-        self.model.eval()
-        print("✅ Model loaded successfully!")
-        
-        # Supported audio formats
-        self.supported_formats = {'.wav', '.mp3', '.flac', '.m4a', '.ogg', '.wma'}
-    
-    def preprocess_waveform(self, audio_path):
+    def __init__(self, model_name=DEFAULT_MODEL, backend=None, prediction_cache=None, vad=None,
+                 long_audio_seconds=None, window_seconds=10.0, window_batch_size=8):
+        """Initialize the emotion recognizer; the model loads on first use"""
+        self.model_name = model_name
+        self.backend_name = backend or os.environ.get("SER_BACKEND", "torch")
+        self.prediction_cache = prediction_cache
+        self.vad = vad
+        # Attention is quadratic in length, so recordings past this are scored window by window
+        self.long_audio_seconds = long_audio_seconds or float(os.environ.get("SER_LONG_AUDIO_SECONDS", 60))
+        self.window_seconds = window_seconds
+        self.window_batch_size = window_batch_size
+        self.cache_model_id = f"{model_name}@{self.backend_name}" + ("+vad" if vad else "")
+        self.backend = None
+        self.model = None
+        self.config = None
+        self.feature_extractor = None
+        self._load_lock = threading.Lock()
+        
+        self.supported_formats = SUPPORTED_FORMATS
+    
+    def load(self):
+        """Load the model and feature extractor (once, from the local snapshot if present)"""
+        if self.backend is not None:
+            return
+        with self._load_lock:
+            if self.backend is not None:
+                return
+            print("🔄 Loading emotion recognition model...")
+            start = time.perf_counter()
+            backend = load_backend(self.backend_name, self.model_name)
+            self.feature_extractor = transformers.Wav2Vec2FeatureExtractor.from_pretrained(
+                resolve_model_path(self.model_name))
+            self.model = backend.model
+            self.config = backend.config
+            self.backend = backend
+            record_startup("model_load", time.perf_counter() - start)
+            print(f"✅ Model loaded successfully! (backend: {self.backend_name})")
+    
+    def warm_up(self):
+        """Load the model and run one dummy forward so the first real clip is fast"""
+        self.load()
+        start = time.perf_counter()
+        self.predict_waveform_top3(torch.zeros(1, 16000), "warm-up")
+        record_startup("warm_up", time.perf_counter() - start)
+        return startup_report()
+    
+    def preprocess_waveform(self, audio_path, timer=None):
         """Preprocess audio waveform for emotion recognition"""
         try:
-            waveform, sr = torchaudio.load(audio_path)
-            
-            # Resample to 16kHz
-            if sr != 16000:
-                waveform = torchaudio.transforms.Resample(orig_freq=sr, new_freq=16000)(waveform)
-            
-            # Convert to mono
-            if waveform.shape[0] > 1:
-                waveform = waveform.mean(dim=0).unsqueeze(0)
-            
-            # Normalize volume
-            max_val = waveform.abs().max()
-            if max_val > 0:
-                waveform = waveform / max_val
+            source = audio_path.open() if isinstance(audio_path, UploadedAudio) else audio_path
+            waveform = prepare_waveform(source, peak_normalize=self.needs_peak_normalization(),
+                                        timer=timer)
             
             # Check for very short clips
-            if waveform.shape[1] < 16000:
+            if waveform is None:
                 print(f"⚠️ Audio too short (<1 sec): {audio_path}")
                 return None
             
@@ -51,54 +117,946 @@ class AudioEmotionRecognizer:
             print(f"❌ Error processing {audio_path}: {str(e)}")
             return None
     
-    def predict_emotion_top3(self, audio_path):
-        """Predict top 3 emotions with probabilities"""
-        waveform = self.preprocess_waveform(audio_path)
+    def needs_peak_normalization(self):
+        """Peak scaling only matters when the extractor does not z-normalize"""
+        self.load()
+        return not self.feature_extractor.do_normalize
+    
+    def model_inputs(self, waveforms, return_attention_mask=True, do_normalize=None):
+        """Padded (and normalized, if the extractor does) input tensors for a list of waveforms"""
+        self.load()
+        if do_normalize is None:
+            do_normalize = self.feature_extractor.do_normalize
+        return batch_input_values(
+            waveforms,
+            do_normalize=do_normalize,
+            return_attention_mask=return_attention_mask
+        )
+    
+    def predict_emotion_top3(self, audio_path, timer=None):
+        """Predict top 3 emotions with probabilities; stage times go to timer if given"""
+        with _stage(timer, "cache_lookup"):
+            key, cached = self._cache_lookup(audio_path)
+        if cached is not None:
+            return cached
+        
+        if self.is_long(audio_path):
+            with _stage(timer, "long_form"):
+                result = self.predict_long(audio_path)
+            if key and result:
+                self.prediction_cache.put(key, result)
+            return result
+        
+        waveform = self.preprocess_waveform(audio_path, timer)
         if waveform is None:
             return None
         
+        with _stage(timer, "vad"):
+            waveform, vad_stats = self._gate(waveform)
+        if waveform is None:
+            result = self._skipped_result(audio_path, vad_stats)
+        else:
+            result = self.predict_waveform_top3(waveform, audio_path, timer)
+            if result and vad_stats:
+                result['vad'] = vad_stats
+        if key and result:
+            self.prediction_cache.put(key, result)
+        return result
+    
+    def _gate(self, waveform):
+        """Trim to speech with the VAD; (None, stats) means skip the model entirely"""
+        if self.vad is None:
+            return waveform, None
+        return self.vad.trim(waveform)
+    
+    def _skipped_result(self, audio_path, vad_stats):
+        """Result for a chunk with no usable speech (silence, ringback, hold music)"""
+        print(f"🔇 No speech in {Path(str(audio_path)).name}, skipped "
+              f"{vad_stats['total_seconds']}s of audio")
+        return {
+            'file_path': str(audio_path),
+            'timestamp': datetime.now().isoformat(),
+            'predictions': [],
+            'top_emotion': None,
+            'skipped': 'no_speech',
+            'vad': vad_stats
+        }
+    
+    def _cache_lookup(self, audio_path):
+        """Return (cache key, cached result) for a file; both None without a cache"""
+        if self.prediction_cache is None:
+            return None, None
         try:
-            inputs = self.feature_extractor(
-                waveform.squeeze().numpy(),
-                sampling_rate=16000,
-                return_tensors="pt",
-                padding=True
-            )
+            if isinstance(audio_path, UploadedAudio):
+                content_hash = hash_bytes(audio_path.data)
+            else:
+                content_hash = hash_file(audio_path)
+            key = self.prediction_cache.make_key(content_hash, self.cache_model_id, PREPROCESS_VERSION)
+        except OSError:
+            return None, None
+        cached = self.prediction_cache.get(key)
+        if cached is None:
+            return key, None
+        
+        # Same bytes seen before: reuse the predictions under this file's name
+        result = dict(cached)
+        result['already_processed'] = cached.get('file_path') == str(audio_path)
+        result['file_path'] = str(audio_path)
+        result['timestamp'] = datetime.now().isoformat()
+        result['cached'] = True
+        return key, result
+    
+    def predict_waveform_top3(self, waveform, source, timer=None, normalize=True):
+        """Predict top 3 emotions for an already preprocessed 16kHz mono waveform"""
+        # normalize=False: the caller already scaled the waveform (see stream_normalization)
+        self.load()
+        try:
+            with _stage(timer, "features"):
+                inputs = self.model_inputs(
+                    [waveform],
+                    return_attention_mask=self.feature_extractor.return_attention_mask,
+                    do_normalize=None if normalize else False
+                )
+            
+            with _stage(timer, "forward"), torch.no_grad():
+                logits = self.backend.logits(inputs)
+                probs = torch.nn.functional.softmax(logits, dim=1)
+            
+            return self._build_result(source, probs[0])
+            
+        except Exception as e:
+            print(f"❌ Error predicting emotion for {source}: {str(e)}")
+            return None
+    
+    def predict_batch(self, audio_paths, timers=None):
+        """Predict top 3 emotions for several files in one padded forward pass"""
+        # timers: optional StageTimer per file; batch-wide stages are charged to every scored file
+        timers = timers or [None] * len(audio_paths)
+        results = [None] * len(audio_paths)
+        keys = [None] * len(audio_paths)
+        vad_stats = [None] * len(audio_paths)
+        waveforms = []
+        positions = []
+        for i, audio_path in enumerate(audio_paths):
+            with _stage(timers[i], "cache_lookup"):
+                keys[i], results[i] = self._cache_lookup(audio_path)
+            if results[i] is not None:
+                continue
+            if self.is_long(audio_path):
+                # Scored on its own so one long recording cannot inflate the padded batch
+                with _stage(timers[i], "long_form"):
+                    results[i] = self.predict_long(audio_path)
+                if keys[i] and results[i]:
+                    self.prediction_cache.put(keys[i], results[i])
+                continue
+            waveform = self.preprocess_waveform(audio_path, timers[i])
+            if waveform is None:
+                continue
+            with _stage(timers[i], "vad"):
+                waveform, vad_stats[i] = self._gate(waveform)
+            if waveform is None:
+                results[i] = self._skipped_result(audio_path, vad_stats[i])
+                if keys[i]:
+                    self.prediction_cache.put(keys[i], results[i])
+                continue
+            waveforms.append(waveform)
+            positions.append(i)
+        
+        if not waveforms:
+            return results
+        
+        self.load()
+        try:
+            # Pad to the longest clip; the attention mask keeps padding out of pooling
+            start = time.perf_counter()
+            inputs = self.model_inputs(waveforms)
+            built = time.perf_counter()
             
             with torch.no_grad():
-                logits = self.model(**inputs).logits
+                logits = self.backend.logits(inputs)
                 probs = torch.nn.functional.softmax(logits, dim=1)
-                topk = torch.topk(probs, k=3)
             
-            # Prepare results
-            results = []
-            for i in range(3):
-                label = self.model.config.id2label[topk.indices[0][i].item()]
-                confidence = topk.values[0][i].item()
-                results.append({
-                    'emotion': label,
-                    'confidence': round(confidence, 4),
-                    'percentage': round(confidence * 100, 2)
-                })
+            for i in positions:
+                if timers[i] is not None:
+                    timers[i].add("features", (built - start) * 1000)
+                    timers[i].add("forward", (time.perf_counter() - built) * 1000)
+            
+            for row, i in enumerate(positions):
+                results[i] = self._build_result(audio_paths[i], probs[row])
+                if vad_stats[i]:
+                    results[i]['vad'] = vad_stats[i]
+                if keys[i]:
+                    self.prediction_cache.put(keys[i], results[i])
             
+        except Exception as e:
+            print(f"❌ Error predicting emotion batch of {len(waveforms)} files: {str(e)}")
+        
+        return results
+    
+    def is_long(self, audio_path):
+        """True when the clip is longer than long_audio_seconds, or its length cannot be told"""
+        try:
+            if isinstance(audio_path, UploadedAudio):
+                duration = audio_duration(audio_path.open(), audio_path.open)
+            else:
+                duration = audio_duration(audio_path)
+        except Exception as e:
+            print(f"⚠️ Could not read the length of {audio_path}, scoring it whole: {e}")
+            return False
+        # Windowed decoding is safe at any length; decoding an unknown length whole is not
+        return duration is None or duration > self.long_audio_seconds
+    
+    def predict_long(self, audio_path, window_seconds=None, batch_size=None):
+        """Score a long recording in fixed windows, decoding and batching as it goes"""
+        # Peak memory depends on window_seconds * batch_size, not on the recording length
+        self.load()
+        window_seconds = window_seconds or self.window_seconds
+        batch_size = batch_size or self.window_batch_size
+        open_source = (audio_path.open if isinstance(audio_path, UploadedAudio)
+                       else lambda: audio_path)
+        peak = self.needs_peak_normalization()
+        
+        timeline = []
+        weighted = None
+        scored_seconds = 0.0
+        skipped_seconds = 0.0
+        pending = []
+        
+        def flush():
+            nonlocal weighted, scored_seconds
+            inputs = self.model_inputs([waveform for _, _, waveform in pending])
+            with torch.no_grad():
+                probs = torch.nn.functional.softmax(self.backend.logits(inputs), dim=1)
+            for row, (start, end, _) in enumerate(pending):
+                duration = end - start
+                contribution = probs[row] * duration
+                weighted = contribution if weighted is None else weighted + contribution
+                scored_seconds += duration
+                window = self._build_result(audio_path, probs[row])
+                timeline.append({
+                    'start': round(start, 2),
+                    'end': round(end, 2),
+                    'top_emotion': window['top_emotion'],
+                    'predictions': window['predictions']
+                })
+            pending.clear()
+        
+        try:
+            for start, waveform in stream_windows(open_source, window_seconds):
+                end = start + waveform.shape[1] / 16000
+                if peak:
+                    peak_normalize_(waveform)
+                waveform, vad_stats = self._gate(waveform)
+                if waveform is None:
+                    skipped_seconds += end - start
+                    timeline.append({'start': round(start, 2), 'end': round(end, 2),
+                                     'top_emotion': None, 'skipped': 'no_speech'})
+                    continue
+                pending.append((start, end, waveform))
+                if len(pending) >= batch_size:
+                    flush()
+            if pending:
+                flush()
+        except Exception as e:
+            print(f"❌ Error predicting emotion for {audio_path}: {str(e)}")
+            return None
+        timeline.sort(key=lambda window: window['start'])
+        
+        if weighted is None:
             return {
                 'file_path': str(audio_path),
                 'timestamp': datetime.now().isoformat(),
-                'predictions': results,
-                'top_emotion': results[0]['emotion']
+                'predictions': [],
+                'top_emotion': None,
+                'skipped': 'no_speech',
+                'timeline': timeline
             }
+        
+        # Duration-weighted mean of the window probabilities
+        result = self._build_result(audio_path, weighted / scored_seconds)
+        result['timeline'] = timeline
+        result['long_form'] = {
+            'windows': len(timeline),
+            'window_seconds': window_seconds,
+            'scored_seconds': round(scored_seconds, 2),
+            'skipped_seconds': round(skipped_seconds, 2)
+        }
+        return result
+    
+    def supports_frame_cache(self):
+        """Conv frames only depend on their own samples when the front-end uses layer norm (torch backends only)"""
+        self.load()
+        if self.model is None:
+            return False
+        return getattr(self.config, 'feat_extract_norm', 'group') == 'layer'
+    
+    def frame_geometry(self):
+        """Receptive field and hop of the conv feature encoder, in samples"""
+        self.load()
+        receptive, stride = 1, 1
+        for kernel, conv_stride in zip(self.config.conv_kernel, self.config.conv_stride):
+            receptive += (kernel - 1) * stride
+            stride *= conv_stride
+        return receptive, stride
+    
+    def stream_normalization(self, samples):
+        """(shift, scale) for a live call, from its first full window and then kept for the call"""
+        # Per-window statistics would change every cached conv frame each hop
+        if self.needs_peak_normalization():
+            peak = float(np.abs(samples).max())
+            return 0.0, peak if peak > 0 else 1.0
+        return float(samples.mean()), float(np.sqrt(samples.var() + 1e-7))
+    
+    def encode_new_samples(self, call_id, samples, cache, keep_frames):
+        """Run the conv front-end over newly arrived (already normalized) samples; returns frames added"""
+        self.load()
+        entry = cache.get(call_id)
+        if entry is None:
+            entry = cache.put(call_id, FrameCacheEntry())
+        receptive, stride = self.frame_geometry()
+        
+        tail = np.concatenate([entry.tail, samples.astype(np.float32)])
+        if len(tail) < receptive:
+            entry.tail = tail
+            cache.touch(call_id)
+            return 0
+        
+        n = (len(tail) - receptive) // stride + 1
+        segment = torch.from_numpy(tail[:stride * (n - 1) + receptive]).unsqueeze(0)
+        with torch.no_grad():
+            new_frames = self.model.wav2vec2.feature_extractor(segment)[0].transpose(0, 1)
+        
+        frames = new_frames if entry.frames is None else torch.cat([entry.frames, new_frames])
+        entry.frames = frames[-keep_frames:]
+        entry.tail = tail[stride * n:]
+        cache.touch(call_id)
+        return n
+    
+    def predict_from_frames(self, frames, source):
+        """Run only the transformer and classifier head over cached conv frames"""
+        self.load()
+        try:
+            wav2vec2 = self.model.wav2vec2
+            use_layer_sum = getattr(self.config, 'use_weighted_layer_sum', False)
+            with torch.no_grad():
+                hidden_states, _ = wav2vec2.feature_projection(frames.unsqueeze(0))
+                encoder_outputs = wav2vec2.encoder(hidden_states, output_hidden_states=use_layer_sum)
+                if wav2vec2.adapter is not None:
+                    hidden_states = wav2vec2.adapter(encoder_outputs[0])
+                elif use_layer_sum:
+                    layers = torch.stack(encoder_outputs.hidden_states, dim=1)
+                    weights = torch.nn.functional.softmax(self.model.layer_weights, dim=-1)
+                    hidden_states = (layers * weights.view(-1, 1, 1)).sum(dim=1)
+                else:
+                    hidden_states = encoder_outputs[0]
+                pooled = self.model.projector(hidden_states).mean(dim=1)
+                logits = self.model.classifier(pooled)
+                probs = torch.nn.functional.softmax(logits, dim=1)
             
+            return self._build_result(source, probs[0])
+            
+        except Exception as e:
+            print(f"❌ Error predicting emotion for {source}: {str(e)}")
+            return None
+    
+    def _build_result(self, audio_path, probs):
+        """Turn one row of class probabilities into the result dict"""
+        topk = torch.topk(probs, k=3)
+        
+        # Prepare results
+        results = []
+        for i in range(3):
+            label = self.config.id2label[topk.indices[i].item()]
+            confidence = topk.values[i].item()
+            results.append({
+                'emotion': label,
+                'confidence': round(confidence, 4),
+                'percentage': round(confidence * 100, 2)
+            })
+        
+        return {
+            'file_path': str(audio_path),
+            'timestamp': datetime.now().isoformat(),
+            'predictions': results,
+            'top_emotion': results[0]['emotion']
+        }
+
+def _stage(timer, name):
+    """Time a block into timer, or do nothing when timing is off"""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+class EnsembleEmotionRecognizer:
+    def __init__(self, model_names=None, fusion="mean", weights=None, backend=None, vad=None,
+                 max_workers=None, prediction_cache=None):
+        """Score each clip with several models after decoding and preprocessing it only once"""
+        if fusion not in FUSION_RULES:
+            raise ValueError(f"Unknown fusion rule '{fusion}', choose from: {', '.join(FUSION_RULES)}")
+        if model_names is None:
+            env = os.environ.get("SER_ENSEMBLE_MODELS")
+            model_names = env.split(",") if env else ENSEMBLE_MODELS
+        self.members = [AudioEmotionRecognizer(name.strip(), backend) for name in model_names]
+        self.fusion = fusion
+        self.weights = weights or [1.0] * len(self.members)
+        if len(self.weights) != len(self.members):
+            raise ValueError("Need one fusion weight per model")
+        self.vad = vad
+        self.prediction_cache = prediction_cache
+        members = ",".join(f"{member.cache_model_id}*{weight}"
+                           for member, weight in zip(self.members, self.weights))
+        self.cache_model_id = f"ensemble:{fusion}:{members}" + ("+vad" if vad else "")
+        # The encoders differ, so only decode/resample is shared; the forward passes run side by side
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or min(len(self.members), os.cpu_count() or 1),
+            thread_name_prefix="ensemble")
+        self._projections = None
+    
+    def load(self):
+        """Load every member concurrently and build its label-to-canonical projection"""
+        if self._projections is not None:
+            return
+        list(self.executor.map(lambda member: member.load(), self.members))
+        projections = []
+        for member in self.members:
+            # (model labels x canonical labels) 0/1 matrix; labels without a counterpart drop out
+            projection = torch.zeros(len(member.config.id2label), len(CANONICAL_EMOTIONS))
+            for idx, label in member.config.id2label.items():
+                column = canonical_index(label)
+                if column is not None:
+                    projection[int(idx), column] = 1.0
+            projections.append(projection)
+        self._projections = projections
+    
+    def warm_up(self):
+        """Load every member and run one dummy clip through each"""
+        self.load()
+        start = time.perf_counter()
+        waveform = torch.zeros(1, 16000)
+        list(self.executor.map(lambda i: self._score_member(i, waveform), range(len(self.members))))
+        record_startup("warm_up", time.perf_counter() - start)
+        return startup_report()
+    
+    # Same content-hash keying as a single model, under the ensemble's own model id
+    _cache_lookup = AudioEmotionRecognizer._cache_lookup
+    
+    def _score_member(self, position, waveform):
+        """Canonical probabilities and latency for one model"""
+        member = self.members[position]
+        start = time.perf_counter()
+        if member.needs_peak_normalization():
+            waveform = peak_normalize_(waveform.clone())
+        inputs = member.model_inputs(
+            [waveform],
+            return_attention_mask=member.feature_extractor.return_attention_mask
+        )
+        with torch.no_grad():
+            probs = torch.nn.functional.softmax(member.backend.logits(inputs), dim=1)[0]
+        canonical = probs @ self._projections[position]
+        canonical = canonical / canonical.sum().clamp_min(1e-8)
+        return canonical, (time.perf_counter() - start) * 1000
+    
+    def _fuse(self, rows):
+        weights = torch.tensor(self.weights, dtype=torch.float32).unsqueeze(1)
+        stacked = torch.stack(rows)
+        if self.fusion == 'mean':
+            fused = (stacked * weights).sum(dim=0)
+        elif self.fusion == 'geometric':
+            fused = torch.exp((torch.log(stacked.clamp_min(1e-8)) * weights).sum(dim=0) / weights.sum())
+        elif self.fusion == 'max':
+            fused = (stacked * weights).max(dim=0).values
+        else:
+            # Weighted votes for each model's top label; mean probability breaks ties
+            fused = torch.zeros(len(CANONICAL_EMOTIONS))
+            fused.index_add_(0, stacked.argmax(dim=1), weights.squeeze(1))
+            fused = fused + 1e-3 * stacked.mean(dim=0)
+        return fused / fused.sum()
+    
+    @staticmethod
+    def _top3(probs):
+        topk = torch.topk(probs, k=3)
+        return [{
+            'emotion': CANONICAL_EMOTIONS[index],
+            'confidence': round(value, 4),
+            'percentage': round(value * 100, 2)
+        } for index, value in zip(topk.indices.tolist(), topk.values.tolist())]
+    
+    def predict_emotion_top3(self, audio_path, timer=None):
+        """Fused top 3 emotions plus per-model predictions and latency"""
+        with _stage(timer, "cache_lookup"):
+            key, cached = self._cache_lookup(audio_path)
+        if cached is not None:
+            return cached
+        
+        start = time.perf_counter()
+        self.load()
+        try:
+            source = audio_path.open() if isinstance(audio_path, UploadedAudio) else audio_path
+            waveform = prepare_waveform(source, peak_normalize=False, timer=timer)
+        except Exception as e:
+            print(f"❌ Error processing {audio_path}: {str(e)}")
+            return None
+        if waveform is None:
+            print(f"⚠️ Audio too short (<1 sec): {audio_path}")
+            return None
+        
+        vad_stats = None
+        if self.vad is not None:
+            with _stage(timer, "vad"):
+                waveform, vad_stats = self.vad.trim(waveform)
+            if waveform is None:
+                result = self.members[0]._skipped_result(audio_path, vad_stats)
+                if key:
+                    self.prediction_cache.put(key, result)
+                return result
+        decode_ms = (time.perf_counter() - start) * 1000
+        
+        models_start = time.perf_counter()
+        futures = [self.executor.submit(self._score_member, i, waveform) for i in range(len(self.members))]
+        try:
+            with _stage(timer, "forward"):
+                scored = [future.result() for future in futures]
         except Exception as e:
             print(f"❌ Error predicting emotion for {audio_path}: {str(e)}")
             return None
+        models_ms = (time.perf_counter() - models_start) * 1000
+        
+        fused = self._fuse([probs for probs, _ in scored])
+        predictions = self._top3(fused)
+        result = {
+            'file_path': str(audio_path),
+            'timestamp': datetime.now().isoformat(),
+            'predictions': predictions,
+            'top_emotion': predictions[0]['emotion'],
+            'ensemble': {
+                'fusion': self.fusion,
+                'models': [{
+                    'model': member.model_name,
+                    'weight': weight,
+                    'predictions': self._top3(probs),
+                    'top_emotion': CANONICAL_EMOTIONS[int(probs.argmax())],
+                    'latency_ms': round(latency_ms, 2)
+                } for member, weight, (probs, latency_ms) in zip(self.members, self.weights, scored)]
+            },
+            'timing': {
+                'decode_ms': round(decode_ms, 2),
+                'models_ms': round(models_ms, 2),
+                'total_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+        }
+        if vad_stats:
+            result['vad'] = vad_stats
+        if key:
+            self.prediction_cache.put(key, result)
+        return result
+    
+    def predict_batch(self, audio_paths, timers=None):
+        """Worker-pool entry point; clips go one by one, each with its members in parallel"""
+        timers = timers or [None] * len(audio_paths)
+        return [self.predict_emotion_top3(audio_path, timer) for audio_path, timer in zip(audio_paths, timers)]
+    
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def make_recognizer(model_name=DEFAULT_MODEL, backend=None, prediction_cache=None, vad=None):
+    """Recognizer for the monitor's workers: one model, or the ensemble with SER_ENSEMBLE=1"""
+    # SER_ENSEMBLE_MODELS (comma-separated) and SER_ENSEMBLE_FUSION pick the members and fusion rule
+    if os.environ.get("SER_ENSEMBLE", "0") == "1":
+        return EnsembleEmotionRecognizer(fusion=os.environ.get("SER_ENSEMBLE_FUSION", "mean"),
+                                         backend=backend, vad=vad, prediction_cache=prediction_cache)
+    return AudioEmotionRecognizer(model_name, backend, prediction_cache, vad)
+
+class FileTailSource:
+    def __init__(self, path, sample_rate=8000, channels=1, poll_interval=0.2, idle_timeout=10.0,
+                 block_seconds=0.5):
+        """Read 16-bit PCM from a file that is still being appended to"""
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.block_seconds = block_seconds
+        self.block_bytes = int(sample_rate * block_seconds) * channels * 2
+    
+    def _read_wav_header(self, f):
+        """Skip a RIFF header if present and pick up the format; False while it is still being written"""
+        header = f.read(12)
+        if len(header) < 4 and b'RIFF'.startswith(header):
+            return False
+        if header[:4] != b'RIFF':
+            f.seek(0)
+            return True
+        if len(header) < 12:
+            return False
+        if header[8:12] != b'WAVE':
+            f.seek(0)
+            return True
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return False
+            chunk_id, size = chunk[:4], int.from_bytes(chunk[4:], 'little')
+            if chunk_id == b'fmt ':
+                fmt = f.read(size)
+                if len(fmt) < size:
+                    return False
+                self.channels = int.from_bytes(fmt[2:4], 'little')
+                self.sample_rate = int.from_bytes(fmt[4:8], 'little')
+                self.block_bytes = int(self.sample_rate * self.block_seconds) * self.channels * 2
+            elif chunk_id == b'data':
+                # Recorders leave the size at 0 until the call ends; stream until idle
+                return True
+            else:
+                f.seek(size, os.SEEK_CUR)
+    
+    def __iter__(self):
+        """Yield float32 arrays of shape (channels, samples) as the file grows"""
+        with open(self.path, 'rb') as f:
+            # A header read half-written would be taken for PCM, and the format never picked up
+            started = time.monotonic()
+            while not self._read_wav_header(f):
+                if time.monotonic() - started > self.idle_timeout:
+                    return
+                f.seek(0)
+                time.sleep(self.poll_interval)
+            frame_bytes = self.channels * 2
+            leftover = b''
+            last_growth = time.monotonic()
+            while True:
+                data = f.read(self.block_bytes)
+                if not data:
+                    if time.monotonic() - last_growth > self.idle_timeout:
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+                last_growth = time.monotonic()
+                data = leftover + data
+                usable = len(data) - len(data) % frame_bytes
+                leftover = data[usable:]
+                if usable:
+                    yield _pcm16_to_float(data[:usable], self.channels)
+
+class SocketSource:
+    def __init__(self, sock, sample_rate=8000, channels=1, block_seconds=0.25):
+        """Read raw 16-bit PCM from a connected socket until the peer closes it"""
+        self.sock = sock
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_bytes = int(sample_rate * block_seconds) * channels * 2
+    
+    def __iter__(self):
+        frame_bytes = self.channels * 2
+        leftover = b''
+        while True:
+            data = self.sock.recv(self.block_bytes)
+            if not data:
+                return
+            data = leftover + data
+            usable = len(data) - len(data) % frame_bytes
+            leftover = data[usable:]
+            if usable:
+                yield _pcm16_to_float(data[:usable], self.channels)
+
+def _pcm16_to_float(data, channels):
+    """Convert interleaved little-endian int16 bytes to a (channels, samples) float32 array"""
+    samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+    return samples.reshape(-1, channels).T
+
+class FrameCacheEntry:
+    def __init__(self):
+        """Conv frames and unconsumed samples for one call"""
+        self.frames = None
+        self.tail = np.zeros(0, dtype=np.float32)
+        self.last_used = time.monotonic()
+    
+    def nbytes(self):
+        frames = 0 if self.frames is None else self.frames.numel() * self.frames.element_size()
+        return frames + self.tail.nbytes
+
+class ConvFeatureCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_seconds=300):
+        """Per-call conv front-end frames with LRU/TTL eviction bounded by total memory"""
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        # Calls still streaming; evicting one would restart its window from nothing
+        self.active = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+    
+    def get(self, call_id):
+        with self._lock:
+            entry = self.entries.get(call_id)
+            if entry is not None:
+                self.entries.move_to_end(call_id)
+            return entry
+    
+    def put(self, call_id, entry):
+        with self._lock:
+            self.entries[call_id] = entry
+            self.entries.move_to_end(call_id)
+        return entry
+    
+    def touch(self, call_id):
+        """Mark a call as recently used and enforce the memory and age limits"""
+        with self._lock:
+            entry = self.entries.get(call_id)
+            if entry is not None:
+                entry.last_used = time.monotonic()
+                self.entries.move_to_end(call_id)
+            self._evict()
+    
+    def pin(self, call_id):
+        with self._lock:
+            self.active.add(call_id)
+    
+    def discard(self, call_id):
+        with self._lock:
+            self.active.discard(call_id)
+            self.entries.pop(call_id, None)
+    
+    def record(self, hits, misses):
+        """Count frames reused from the cache versus frames computed fresh"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+    
+    def _evict(self):
+        now = time.monotonic()
+        # Oldest first; active calls are only dropped when their stream ends
+        idle = [c for c in self.entries if c not in self.active]
+        for call_id in [c for c in idle if now - self.entries[c].last_used > self.ttl_seconds]:
+            del self.entries[call_id]
+            self.evictions += 1
+        total = sum(e.nbytes() for e in self.entries.values())
+        for call_id in idle:
+            if total <= self.max_bytes:
+                break
+            entry = self.entries.pop(call_id, None)
+            if entry is not None:
+                total -= entry.nbytes()
+                self.evictions += 1
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'active': len(self.active),
+                'bytes': sum(e.nbytes() for e in self.entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+class StreamingEmotionRecognizer:
+    def __init__(self, recognizer, window_seconds=4.0, hop_seconds=1.0, feature_cache=None):
+        """Rolling top-3 predictions over overlapping windows of a live PCM stream"""
+        self.recognizer = recognizer
+        self.window = int(window_seconds * 16000)
+        self.hop = int(hop_seconds * 16000)
+        
+        # Reuse conv frames across overlapping windows when the model allows it
+        if feature_cache is not None and not recognizer.supports_frame_cache():
+            print("⚠️ Model front-end uses group norm; frame cache disabled")
+            feature_cache = None
+        self.feature_cache = feature_cache
+        if feature_cache is not None:
+            self.window_frames = self.window // recognizer.frame_geometry()[1]
+    
+    def _blocks_16k_mono(self, source):
+        """(arrival time, 16kHz mono samples) per source block, resampled as one continuous signal"""
+        resampler = None
+        for block in source:
+            arrived = time.monotonic()
+            # A file source learns its rate from the header, i.e. once the first block is read
+            if resampler is None:
+                resampler = StreamResampler(source.sample_rate)
+            mono = torch.from_numpy(np.ascontiguousarray(block)).to(torch.float32).mean(dim=0)
+            yield arrived, resampler(mono).numpy()
+    
+    def _normalized_blocks(self, source):
+        """16kHz mono blocks scaled with the call's normalization, fixed at its first full window"""
+        # Both stream paths see the same samples, so cached and uncached predictions agree
+        held = []
+        held_samples = 0
+        normalization = None
+        for arrived, samples in self._blocks_16k_mono(source):
+            if normalization is None:
+                held.append(samples)
+                held_samples += len(samples)
+                if held_samples < self.window:
+                    continue
+                samples = np.concatenate(held)
+                held = None
+                normalization = self.recognizer.stream_normalization(samples[-self.window:])
+            shift, scale = normalization
+            yield arrived, ((samples - shift) / scale).astype(np.float32)
+    
+    def stream(self, source, call_id):
+        """Yield a result dict every hop once a full window has arrived"""
+        if self.feature_cache is not None:
+            yield from self._stream_cached(source, call_id)
+            return
+        
+        # Fixed-size buffer: memory stays at one window per call however long it runs
+        buffer = np.zeros(self.window, dtype=np.float32)
+        filled = 0
+        since_last = 0
+        total = 0
+        
+        for arrived, samples in self._normalized_blocks(source):
+            n = len(samples)
+            if n == 0:
+                continue
+            if n >= self.window:
+                buffer[:] = samples[-self.window:]
+            else:
+                buffer[:-n] = buffer[n:]
+                buffer[-n:] = samples
+            filled = min(self.window, filled + n)
+            since_last += n
+            total += n
+            
+            if filled < self.window or since_last < self.hop:
+                continue
+            since_last = 0
+            
+            window = torch.from_numpy(buffer.copy()).unsqueeze(0)
+            result = self.recognizer.predict_waveform_top3(window, getattr(source, 'path', call_id),
+                                                           normalize=False)
+            if result is None:
+                continue
+            result['call_id'] = call_id
+            result['window_start'] = round((total - self.window) / 16000, 2)
+            result['window_end'] = round(total / 16000, 2)
+            result['latency_ms'] = round((time.monotonic() - arrived) * 1000, 1)
+            yield result
+    
+    def _stream_cached(self, source, call_id):
+        """Same windows as stream(), but the conv front-end only sees new samples"""
+        cache = self.feature_cache
+        since_last = 0
+        fresh_frames = 0
+        total = 0
+        cache.pin(call_id)
+        try:
+            for arrived, samples in self._normalized_blocks(source):
+                fresh_frames += self.recognizer.encode_new_samples(
+                    call_id, samples, cache, self.window_frames)
+                since_last += len(samples)
+                total += len(samples)
+                
+                if total < self.window or since_last < self.hop:
+                    continue
+                since_last = 0
+                
+                entry = cache.get(call_id)
+                if entry is None or entry.frames is None:
+                    continue
+                frames = entry.frames[-self.window_frames:]
+                cache.record(max(0, len(frames) - fresh_frames), min(fresh_frames, len(frames)))
+                fresh_frames = 0
+                
+                result = self.recognizer.predict_from_frames(frames, getattr(source, 'path', call_id))
+                if result is None:
+                    continue
+                result['call_id'] = call_id
+                result['window_start'] = round((total - self.window) / 16000, 2)
+                result['window_end'] = round(total / 16000, 2)
+                result['latency_ms'] = round((time.monotonic() - arrived) * 1000, 1)
+                yield result
+        finally:
+            cache.discard(call_id)
+
+def run_live_call_streams(watch_directory="/tmp/livecalls", results_callback=None,
+                          window_seconds=4.0, hop_seconds=1.0, poll_interval=1.0,
+                          cache_bytes=64 * 1024 * 1024):
+    """Stream every recording that appears under watch_directory while the call is live"""
+    recognizer = AudioEmotionRecognizer()
+    recognizer.warm_up()
+    feature_cache = ConvFeatureCache(max_bytes=cache_bytes) if cache_bytes else None
+    streamer = StreamingEmotionRecognizer(recognizer, window_seconds, hop_seconds, feature_cache)
+    watch_directory = Path(watch_directory)
+    active = {}
+    
+    def follow(path):
+        call_id = path.stem
+        print(f"📞 Streaming live call: {call_id}")
+        for result in streamer.stream(FileTailSource(path), call_id):
+            print(f"🎭 {call_id} [{result['window_start']:.1f}-{result['window_end']:.1f}s] "
+                  f"{result['top_emotion']} ({result['latency_ms']} ms)")
+            if results_callback:
+                results_callback(result)
+        print(f"📴 Call ended: {call_id}")
+        if feature_cache is not None:
+            print(f"🧠 Frame cache: {feature_cache.stats()}")
+    
+    print(f"🔍 Watching for live calls in: {watch_directory.absolute()}")
+    while True:
+        for path in watch_directory.glob("*.wav"):
+            if str(path) not in active:
+                thread = threading.Thread(target=follow, args=(path,), daemon=True)
+                active[str(path)] = thread
+                thread.start()
+        time.sleep(poll_interval)
+
+def benchmark_batching(recognizer, audio_paths, max_batch_size=8):
+    """Compare clips/sec of the per-file path against predict_batch, on a warm model with no cache"""
+    audio_paths = list(audio_paths)
+    if not audio_paths:
+        return None
+    
+    # Otherwise the first pass pays for model load and the second is served from the cache
+    recognizer.warm_up()
+    prediction_cache, recognizer.prediction_cache = recognizer.prediction_cache, None
+    try:
+        start = time.perf_counter()
+        for audio_path in audio_paths:
+            recognizer.predict_emotion_top3(audio_path)
+        per_file_elapsed = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        for i in range(0, len(audio_paths), max_batch_size):
+            recognizer.predict_batch(audio_paths[i:i + max_batch_size])
+        batched_elapsed = time.perf_counter() - start
+    finally:
+        recognizer.prediction_cache = prediction_cache
+    
+    report = {
+        'clips': len(audio_paths),
+        'batch_size': max_batch_size,
+        'per_file_clips_per_sec': round(len(audio_paths) / per_file_elapsed, 3),
+        'batched_clips_per_sec': round(len(audio_paths) / batched_elapsed, 3),
+        'speedup': round(per_file_elapsed / batched_elapsed, 2)
+    }
+    print(f"⏱️ Per-file: {report['per_file_clips_per_sec']} clips/sec | "
+          f"Batched (k={max_batch_size}): {report['batched_clips_per_sec']} clips/sec | "
+          f"Speedup: {report['speedup']}x")
+    return report
 
 class AudioFileHandler(FileSystemEventHandler):
-    def __init__(self, recognizer, results_callback=None, results_file=None):
+    def __init__(self, recognizer=None, results_callback=None, results_file=None, pool=None,
+                 submit_timeout=30, call_states=None, ledger=None):
         """Initialize file handler"""
         self.recognizer = recognizer
         self.results_callback = results_callback
+        self.call_states = call_states
+        # Finished files are recorded here, so backlog walks only resubmit unfinished work
+        self.ledger = ledger
         self.results_file = results_file
+        self.results_sink = None
+        self.pool = pool
+        self.submit_timeout = submit_timeout
+        # Per-prediction stage breakdown in the stored/delivered result (SER_TIMING_IN_RESULT=1)
+        self.include_timing = os.environ.get("SER_TIMING_IN_RESULT", "0") == "1"
         self.processed_files = set()
+        self.pending_files = set()
+        self._lock = threading.Lock()
+        # Files the live queue had no room for wait here for a backlog slot instead of being dropped
+        self._deferred = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deferred")
     
     def on_created(self, event):
         """Handle new file creation"""
@@ -110,81 +1068,252 @@ class AudioFileHandler(FileSystemEventHandler):
         if not os.path.isdir(event.dest_path):
             self.process_audio_file(event.dest_path)
     
-    def process_audio_file(self, file_path):
-        """Process a new audio file"""
+    def process_audio_file(self, file_path, priority=PRIORITY_LIVE):
+        """Queue a new audio file for inference (runs inline without a pool)"""
         file_path = Path(file_path)
         
         # Check if it's an audio file and hasn't been processed
-        if (file_path.suffix.lower() in self.recognizer.supported_formats and 
-            str(file_path) not in self.processed_files):
-            
-            print(f"🎵 New audio file detected: {file_path.name}")
-            
+        if file_path.suffix.lower() not in SUPPORTED_FORMATS or not self._claim(file_path):
+            return
+        
+        print(f"🎵 New audio file detected: {file_path.name}")
+        
+        if self.pool is None:
             # Wait a moment for file to be fully written
             time.sleep(0.5)
-            
-            # Process the audio
-            result = self.recognizer.predict_emotion_top3(file_path)
-            
+            self._predict_inline(file_path, file_path)
+            return
+        
+        # Blocks the observer only when the queue is full (backpressure)
+        timeout = None if priority == PRIORITY_BACKLOG else self.submit_timeout
+        if not self.pool.submit(file_path, timeout=timeout, priority=priority):
+            print(f"⚠️ Inference queue full, deferring {file_path.name} to the backlog queue")
+            self._deferred.submit(self._submit_deferred, file_path)
+    
+    def _submit_deferred(self, file_path):
+        """Wait as long as it takes for a backlog slot; only a stopped pool gives up on the file"""
+        if not self.pool.submit(file_path, timeout=None, priority=PRIORITY_BACKLOG):
+            self._release(file_path)
+    
+    def process_upload(self, file_path, data):
+        """Queue audio bytes received over HTTP; file_path is where it would be saved"""
+        file_path = Path(file_path)
+        if not self._claim(file_path):
+            return True
+        
+        print(f"📥 Upload received in memory: {file_path.name}")
+        audio = UploadedAudio(file_path, data)
+        
+        if self.pool is None:
+            self._predict_inline(file_path, audio)
+            return True
+        
+        if not self.pool.submit(file_path, timeout=self.submit_timeout, audio=audio):
+            print(f"⚠️ Inference queue full, rejecting upload {file_path.name}")
+            self._release(file_path)
+            return False
+        return True
+    
+    def _predict_inline(self, file_path, source):
+        """Score in the calling thread, with the same timing breakdown the pool reports"""
+        timer = StageTimer()
+        start = time.perf_counter()
+        result = self.recognizer.predict_emotion_top3(source, timer)
+        timing = dict(timer.timings, total_ms=round((time.perf_counter() - start) * 1000, 1))
+        observe_stages(timing)
+        self.handle_result(file_path, result, timing)
+    
+    def _claim(self, file_path):
+        """Mark a path as in progress; False if it is already queued or done"""
+        with self._lock:
+            if str(file_path) in self.processed_files or str(file_path) in self.pending_files:
+                return False
+            self.pending_files.add(str(file_path))
+            return True
+    
+    def _release(self, file_path):
+        with self._lock:
+            self.pending_files.discard(str(file_path))
+    
+    def handle_result(self, file_path, result, timing=None):
+        """Record, save and forward the prediction for one file"""
+        file_path = Path(file_path)
+        with self._lock:
+            self.pending_files.discard(str(file_path))
             if result:
                 self.processed_files.add(str(file_path))
-                
-                # Print results
-                print(f"\n🎭 Emotion Analysis for: {file_path.name}")
-                print("-" * 50)
-                for i, pred in enumerate(result['predictions'], 1):
-                    print(f"{i}. {pred['emotion']}: {pred['percentage']:.2f}%")
-                print(f"📊 Top Emotion: {result['top_emotion']}")
-                print("-" * 50)
-                
-                # Save results to file if specified
-                if self.results_file:
-                    self.save_results(result)
-                
-                # Call callback function if provided
-                if self.results_callback:
-                    self.results_callback(result)
+        
+        if not result:
+            if self.ledger is not None:
+                self.ledger.mark_failed(file_path)
+            return
+        # The worker caches a prediction before it is saved here, so a cache hit under the same
+        # path only means "scored", not "saved and delivered"; only the ledger can say that
+        done_before = self.ledger is not None and self.ledger.is_done(file_path)
+        if result.get('already_processed') and done_before:
+            print(f"⏭️ Already processed (cached): {file_path.name}")
+            return
+        try:
+            self._publish(file_path, result, timing)
+        except Exception:
+            if self.ledger is not None:
+                self.ledger.mark_failed(file_path)
+            raise
+        # Marked only once saved and delivered, so a crash in between gets the file walked again
+        if self.ledger is not None:
+            self.ledger.mark_done(file_path)
+    
+    def _publish(self, file_path, result, timing):
+        """Save and forward one prediction"""
+        if result.get('skipped'):
+            # VAD found no speech; nothing to save or deliver
+            return
+        
+        # Running per-call view travels with the chunk; escalations are pushed from update()
+        event = None
+        if self.call_states is not None:
+            summary, event = self.call_states.update(result)
+            if summary:
+                result['call'] = summary
+        
+        # Print results
+        print(f"\n🎭 Emotion Analysis for: {file_path.name}")
+        print("-" * 50)
+        for i, pred in enumerate(result['predictions'], 1):
+            print(f"{i}. {pred['emotion']}: {pred['percentage']:.2f}%")
+        print(f"📊 Top Emotion: {result['top_emotion']}")
+        if event:
+            print(f"🚨 Escalation: {event['reason']} ({event['emotion']}, "
+                  f"streak {event['negative_streak']}, score {event['negative_score']})")
+        if timing and 'queue_wait_ms' in timing:
+            print(f"⏱️ Queue wait: {timing['queue_wait_ms']} ms | "
+                  f"Inference: {timing['inference_ms']} ms | Total: {timing['total_ms']} ms")
+        print("-" * 50)
+        if timing and self.include_timing:
+            result['timing'] = dict(timing)
+        
+        # Save results to file if specified
+        if self.results_file:
+            with STAGE_SECONDS.time(stage="results_write"):
+                self.save_results(result)
+        
+        # Call callback function if provided
+        if self.results_callback:
+            with STAGE_SECONDS.time(stage="results_callback"):
+                self.results_callback(result)
     
     def save_results(self, result):
-        """Save results to JSON file"""
+        """Append the result to the results store"""
         try:
-            # Load existing results
-            if os.path.exists(self.results_file):
-                with open(self.results_file, 'r') as f:
-                    all_results = json.load(f)
-            else:
-                all_results = []
-            
-            # Add new result
-            all_results.append(result)
-            
-            # Save updated results
-            with open(self.results_file, 'w') as f:
-                json.dump(all_results, f, indent=2)
-                
+            if self.results_sink is None:
+                self.results_sink = open_results_sink(self.results_file)
+            self.results_sink.append(result)
         except Exception as e:
             print(f"❌ Error saving results: {str(e)}")
+    
+    def close(self):
+        """Flush and close the results store"""
+        self._deferred.shutdown(wait=False, cancel_futures=True)
+        if self.results_sink is not None:
+            self.results_sink.close()
+            self.results_sink = None
+
+class ShardedFileHandler(AudioFileHandler):
+    def __init__(self, shard, watch_directory, **kwargs):
+        """AudioFileHandler that only takes files whose call hashes to this shard"""
+        super().__init__(**kwargs)
+        self.shard = shard
+        self.watch_directory = Path(watch_directory)
+    
+    def _shard_key(self, file_path):
+        # Relative to the shared directory so every host derives the same claim
+        try:
+            return file_path.relative_to(self.watch_directory).as_posix()
+        except ValueError:
+            return file_path.as_posix()
+    
+    def process_audio_file(self, file_path, priority=PRIORITY_LIVE):
+        """Skip other shards' calls, then claim the file across processes before queueing it"""
+        file_path = Path(file_path)
+        if file_path.suffix.lower() not in SUPPORTED_FORMATS:
+            return
+        if not self.shard.owns(call_id_from_path(file_path)):
+            return
+        with self._lock:
+            if str(file_path) in self.processed_files or str(file_path) in self.pending_files:
+                return
+        if not self.shard.claim(self._shard_key(file_path)):
+            return
+        super().process_audio_file(file_path, priority)
+    
+    def _release(self, file_path):
+        super()._release(file_path)
+        self.shard.release(self._shard_key(Path(file_path)))
+    
+    def handle_result(self, file_path, result, timing=None):
+        """Handle the result, then mark the claim done, or failed so it can be retried"""
+        try:
+            super().handle_result(file_path, result, timing)
+        finally:
+            key = self._shard_key(Path(file_path))
+            if result:
+                self.shard.mark_done(key)
+            else:
+                self.shard.mark_failed(key)
 
 class AudioEmotionMonitor:
-    def __init__(self, watch_directory="received_audio", results_file="emotion_results.json", 
-                 results_callback=None):
+    def __init__(self, watch_directory="received_audio", results_file="emotion_results.jsonl", 
+                 results_callback=None, model_name=DEFAULT_MODEL, backend=None, num_workers=None,
+                 torch_threads=None, queue_size=None, stats_interval=30, escalation_callback=None,
+                 shard=None):
         """Initialize the audio emotion monitoring system"""
         self.watch_directory = Path(watch_directory)
         self.results_file = results_file
         self.results_callback = results_callback
+        self.stats_interval = stats_interval
+        self.shard = shard
         
         # Create directory if it doesn't exist
         self.watch_directory.mkdir(exist_ok=True)
         
-        # Initialize recognizer
-        self.recognizer = AudioEmotionRecognizer()
+        # Pool size is tuned per box through the environment
+        if num_workers is None:
+            num_workers = int(os.environ.get("SER_WORKERS", 1))
+        if torch_threads is None:
+            torch_threads = int(os.environ.get("SER_TORCH_THREADS", 1))
+        if queue_size is None:
+            queue_size = int(os.environ.get("SER_QUEUE_SIZE", 64))
         
-        # Setup file handler
-        self.file_handler = AudioFileHandler(
-            self.recognizer, 
+        # Setup file handler; inference workers report back through it
+        self.call_states = CallStateTable(
+            ttl_seconds=float(os.environ.get("SER_CALL_TTL_SECONDS", 300)),
+            on_escalation=escalation_callback
+        )
+        ledger_path = os.environ.get("SER_BACKLOG_LEDGER", "backlog_ledger.db")
+        if shard is not None:
+            ledger_path = _per_shard(ledger_path, shard)
+        self.ledger = ProcessedLedger(ledger_path)
+        handler_kwargs = dict(
             results_callback=self.results_callback,
-            results_file=self.results_file
+            results_file=self.results_file,
+            call_states=self.call_states,
+            ledger=self.ledger
+        )
+        if shard is None:
+            self.file_handler = AudioFileHandler(**handler_kwargs)
+        else:
+            self.file_handler = ShardedFileHandler(shard, self.watch_directory, **handler_kwargs)
+        self.pool = InferenceWorkerPool(
+            model_name=model_name,
+            backend=backend,
+            num_workers=num_workers,
+            torch_threads=torch_threads,
+            queue_size=queue_size,
+            on_result=self.file_handler.handle_result
         )
+        self.file_handler.pool = self.pool
+        self.pool.start()
+        self.backlog = None
         
         # Setup observer
         self.observer = Observer()
@@ -203,76 +1332,93 @@ class AudioEmotionMonitor:
         self.observer.start()
         
         try:
+            last_stats = last_prune = time.monotonic()
             while True:
                 time.sleep(1)
+                if self.stats_interval and time.monotonic() - last_stats >= self.stats_interval:
+                    self.print_stats()
+                    last_stats = time.monotonic()
+                if self.shard is not None and time.monotonic() - last_prune >= 600:
+                    self.shard.prune()
+                    last_prune = time.monotonic()
         except KeyboardInterrupt:
             print("\n🛑 Stopping monitor...")
             self.observer.stop()
         
         self.observer.join()
+        if self.backlog is not None:
+            self.backlog.stop()
+        self.pool.stop()
+        self.file_handler.close()
+        self.ledger.close()
         print("✅ Monitor stopped")
     
+    def submit_upload(self, file_path, data):
+        """Score an HTTP upload straight from memory; False when the queue is full"""
+        return self.file_handler.process_upload(file_path, data)
+    
+    def print_stats(self):
+        """Print inference queue depth and latency"""
+        stats = self.pool.stats()
+        print(f"📈 Queue: {stats['queue_depth']}/{stats['queue_capacity']} | "
+              f"In flight: {stats['in_flight']} | Done: {stats['completed']} | "
+              f"Failed: {stats['failed']} | Cache hit rate: {stats['cache_hit_rate']:.1%} | "
+              f"No speech: {stats['skipped']} ({stats['audio_skipped_ratio']:.1%} of audio skipped) | "
+              f"Latency p50/p95: {stats['latency_ms']['p50']}/{stats['latency_ms']['p95']} ms")
+    
     def process_existing_files(self):
-        """Process any existing files in the directory"""
-        print("🔍 Checking for existing audio files...")
-        
-        for file_path in self.watch_directory.rglob("*"):
-            if (file_path.is_file() and 
-                file_path.suffix.lower() in self.recognizer.supported_formats):
-                self.file_handler.process_audio_file(file_path)
+        """Queue files in the directory that never finished, at backlog priority, from a background thread"""
+        if self.backlog is None:
+            self.backlog = BacklogWalker(
+                self.watch_directory,
+                lambda path: self.file_handler.process_audio_file(path, priority=PRIORITY_BACKLOG),
+                self.ledger,
+                SUPPORTED_FORMATS,
+                rescan_seconds=float(os.environ.get("SER_BACKLOG_RESCAN_SECONDS", 300))
+            ).start()
+        return self.backlog
 
-# Example usage and Flask integration functions
-import requests  # Add this at the top of the file
-
-import requests
-import json
-from pathlib import Path
+_default_recognizer = None
 
-def flask_callback(result):
-    """Send result to Express.js backend"""
-    print(f"🔄 Flask callback triggered for: {result['top_emotion']}")
+def predict_emotion(audio_path):
+    """Top emotion label for one file, using a shared recognizer loaded on first call"""
+    global _default_recognizer
+    if _default_recognizer is None:
+        _default_recognizer = AudioEmotionRecognizer()
+    result = _default_recognizer.predict_emotion_top3(audio_path)
+    return result['top_emotion'] if result else "unknown"
 
+# Example usage and Flask integration functions
+def build_prediction_payload(result):
+    """Body the Express.js backend expects for one prediction"""
     file_path = Path(result['file_path'])
-    file_name = file_path.name
 
-    # Expected filename: callerNumber_timestamp.wav
-    parts = file_name.split('_')
-    customer_name = parts[0] if len(parts) > 0 else "unknown"
-    user_id = "system"  # or "unknown" since agent ID is not available anymore
-
-    payload = {
-        "file_name": file_name,
+    return {
+        "file_name": file_path.name,
         "top_emotion": result['top_emotion'],
         "timestamp": result['timestamp'],
         "predictions": result['predictions'],
-        "customer_name": customer_name,
-        "user_id": user_id
+        # Expected filename: callerNumber_timestamp.wav
+        "customer_name": caller_from_path(file_path),
+        "user_id": "system",  # agent ID is not available in the filename
+        # Running per-call summary, so the backend does not have to rebuild it
+        "call": result.get('call')
     }
 
-    try:
-        response = requests.post(
-            "http://localhost:3000/api/receive-prediction",
-            json=payload,
-            headers={
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            },
-            timeout=10
-        )
 
-        if response.status_code == 200:
-            print(f"✅ Successfully sent emotion data to Express backend")
-            print(f"📋 Response: {response.json()}")
-        else:
-            print(f"⚠️ Express backend responded with status: {response.status_code}")
-            print(f"📋 Response: {response.text}")
+def flask_callback(result):
+    """Queue result for the Express.js backend; delivery happens off the inference path"""
+    from ser_delivery import get_delivery_client
+
+    get_delivery_client().submit(build_prediction_payload(result))
+
+
+def escalation_callback(event):
+    """Push an escalation event to the Express.js backend ahead of any storage round-trip"""
+    from ser_delivery import escalation_url, get_delivery_client
 
-    except requests.exceptions.ConnectionError:
-        print("❌ Failed to connect to Express backend. Is it running on port 3000?")
-    except requests.exceptions.Timeout:
-        print("❌ Request to Express backend timed out")
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Request failed: {str(e)}")
+    print(f"🚨 Escalating call {event['call_id']}: {event['reason']} ({event['emotion']})")
+    get_delivery_client().submit(event, url=escalation_url())
 
 
 def run_emotion_monitor():
@@ -280,18 +1426,86 @@ def run_emotion_monitor():
     # Initialize monitor with Flask callback
     monitor = AudioEmotionMonitor(
         watch_directory="received_audio",
-        results_file="emotion_results.json",
-        results_callback=flask_callback
+        results_file="emotion_results.jsonl",
+        results_callback=flask_callback,
+        escalation_callback=escalation_callback
     )
     
-    # Process any existing files first
+    # Existing files are queued in the background, behind live chunks
     monitor.process_existing_files()
     
     # Start monitoring for new files
     monitor.start_monitoring()
 
+def _per_shard(path, shard):
+    """backlog_ledger.db -> backlog_ledger.shard-2.db"""
+    path = Path(path)
+    return str(path.with_name(f"{path.stem}.{shard.node}{path.suffix}"))
+
+def run_shard(index, count, watch_directory="received_audio", results_file="emotion_results.jsonl"):
+    """One shard of a monitor split by call ID; run one per core or per host on a shared directory"""
+    shard = ShardAssignment(index, count, Path(watch_directory) / ".claims",
+                            stale_seconds=float(os.environ.get("SER_CLAIM_STALE_SECONDS", 600)))
+    # Each shard keeps its own results, ledger and outbox so nothing is written by two processes
+    outbox = os.environ.get("SER_DELIVERY_OUTBOX", "delivery_outbox.db")
+    os.environ["SER_DELIVERY_OUTBOX"] = _per_shard(outbox, shard)
+    print(f"🧩 Starting {shard.node} of {count}")
+    monitor = AudioEmotionMonitor(
+        watch_directory=watch_directory,
+        results_file=_per_shard(results_file, shard),
+        results_callback=flask_callback,
+        escalation_callback=escalation_callback,
+        shard=shard
+    )
+    monitor.process_existing_files()
+    monitor.start_monitoring()
+
+def run_sharded_monitor(num_shards, watch_directory="received_audio"):
+    """Run num_shards monitor processes on this box; all chunks of a call go to the same one"""
+    import multiprocessing as mp
+    
+    ctx = mp.get_context("spawn")
+    processes = [ctx.Process(target=run_shard, args=(i, num_shards, watch_directory), name=f"shard-{i}")
+                 for i in range(num_shards)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Children got the same SIGINT and shut down their own pools
+        for process in processes:
+            process.join(30)
+            if process.is_alive():
+                process.terminate()
+
 if __name__ == "__main__":
     # Install required packages first:
-    # pip install torch torchaudio transformers watchdog
+    # pip install torch torchaudio torchcodec soundfile transformers watchdog aiohttp
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Speech emotion monitor")
+    parser.add_argument("--stream", metavar="DIR",
+                        help="stream live calls being recorded in DIR (e.g. /tmp/livecalls)")
+    parser.add_argument("--window", type=float, default=4.0, help="window length in seconds")
+    parser.add_argument("--hop", type=float, default=1.0, help="seconds between predictions")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("SER_SHARDS", 1)),
+                        help="split calls across this many monitor processes (or hosts, with --shard-index)")
+    parser.add_argument("--shard-index", type=int,
+                        help="run only this shard; start one per host against a shared received_audio")
+    parser.add_argument("--benchmark-batch", metavar="DIR",
+                        help="compare per-file and batched throughput on the audio files in DIR")
+    parser.add_argument("--batch-size", type=int, default=8, help="batch size for --benchmark-batch")
+    args = parser.parse_args()
     
-    run_emotion_monitor()
\ No newline at end of file
+    if args.benchmark_batch:
+        clips = sorted(p for p in Path(args.benchmark_batch).iterdir() if p.suffix.lower() in SUPPORTED_FORMATS)
+        benchmark_batching(AudioEmotionRecognizer(), clips, args.batch_size)
+    elif args.stream:
+        run_live_call_streams(args.stream, flask_callback, args.window, args.hop)
+    elif args.shard_index is not None:
+        run_shard(args.shard_index, args.shards)
+    elif args.shards > 1:
+        run_sharded_monitor(args.shards)
+    else:
+        run_emotion_monitor()
\ No newline at end of file
@@ -0,0 +1,228 @@
+import time
+import threading
+
+from ser_startup import lazy_import
+
+torch = lazy_import("torch")
+torchaudio = lazy_import("torchaudio")
+sf = lazy_import("soundfile")
+
+TARGET_SR = 16000
+
+# Resample kernels keyed by (orig_sr, new_sr); building one costs more than applying it
+_resamplers = {}
+_resampler_lock = threading.Lock()
+
+
+def get_resampler(orig_sr, new_sr=TARGET_SR):
+    """Shared Resample transform for a rate pair, built once per process"""
+    key = (int(orig_sr), int(new_sr))
+    resampler = _resamplers.get(key)
+    if resampler is None:
+        with _resampler_lock:
+            resampler = _resamplers.get(key)
+            if resampler is None:
+                resampler = torchaudio.transforms.Resample(orig_freq=key[0], new_freq=key[1])
+                _resamplers[key] = resampler
+    return resampler
+
+
+def to_mono_16k(waveform, sr):
+    """Mix down to one float32 channel at 16kHz, shape (1, samples)"""
+    if waveform.dtype != torch.float32:
+        waveform = waveform.to(torch.float32)
+    # Mix before resampling so only one channel goes through the filter
+    if waveform.shape[0] > 1:
+        waveform = waveform.mean(dim=0, keepdim=True)
+    if sr != TARGET_SR:
+        waveform = get_resampler(sr)(waveform)
+    return waveform
+
+
+class StreamResampler:
+    def __init__(self, orig_sr, new_sr=TARGET_SR):
+        """Resample a live stream block by block, carrying filter context across blocks"""
+        # Resampling each block on its own zero-pads both edges, which clicks at every boundary.
+        # Here each output sample sees the same inputs as in a one-shot resample of the whole stream
+        self.passthrough = int(orig_sr) == int(new_sr)
+        if self.passthrough:
+            return
+        resampler = get_resampler(orig_sr, new_sr)
+        self.kernel = resampler.kernel
+        self.width = resampler.width
+        self.stride = int(resampler.orig_freq) // resampler.gcd
+        # Stands in for the audio before the stream started, like the one-shot left padding
+        self.pending = torch.zeros(self.width)
+
+    def __call__(self, samples):
+        """1-D float32 block in; the 1-D output it completes out (may be empty)"""
+        if self.passthrough:
+            return samples
+        pending = torch.cat([self.pending, samples])
+        span = 2 * self.width + self.stride
+        steps = (pending.shape[0] - span) // self.stride + 1 if pending.shape[0] >= span else 0
+        if steps == 0:
+            self.pending = pending
+            return pending.new_zeros(0)
+        used = (steps - 1) * self.stride + span
+        out = torch.nn.functional.conv1d(pending[None, None, :used], self.kernel, stride=self.stride)
+        self.pending = pending[steps * self.stride:]
+        return out[0].transpose(0, 1).reshape(-1)
+
+
+def peak_normalize_(waveform):
+    """Scale to a peak of 1.0 in place"""
+    max_val = waveform.abs().max()
+    if max_val > 0:
+        waveform.div_(max_val)
+    return waveform
+
+
+def prepare_waveform(source, peak_normalize=True, min_samples=TARGET_SR, timer=None):
+    """Decode a path or file-like object to a (1, samples) 16kHz mono tensor, or None if too short"""
+    # Skip peak normalization when the extractor z-normalizes afterwards; the scale cancels out
+    start = time.perf_counter()
+    waveform, sr = torchaudio.load(source)
+    decoded = time.perf_counter()
+    waveform = to_mono_16k(waveform, sr)
+    if timer is not None:
+        timer.add("decode", (decoded - start) * 1000)
+        timer.add("resample", (time.perf_counter() - decoded) * 1000)
+    if waveform.shape[1] < min_samples:
+        return None
+    if peak_normalize:
+        peak_normalize_(waveform)
+    return waveform
+
+
+def _audio_decoder(source, **kwargs):
+    """torchcodec decoder for what libsndfile cannot read (AAC/M4A, WMA, ...)"""
+    from torchcodec.decoders import AudioDecoder
+    return AudioDecoder(source, **kwargs)
+
+
+def audio_duration(source, open_source=None):
+    """Length in seconds from the container header, or None if the format does not say"""
+    try:
+        info = sf.info(source)
+        if info.frames and info.samplerate:
+            return info.frames / info.samplerate
+    except RuntimeError:
+        # Not a libsndfile format; ffmpeg reads the header instead
+        pass
+    decoder = _audio_decoder(open_source() if open_source else source)
+    return decoder.metadata.duration_seconds_from_header
+
+
+def _decode_windows(source, window_seconds, min_seconds):
+    """Sequential decode, resampled to 16kHz mono by ffmpeg, cut into windows"""
+    decoder = _audio_decoder(source, sample_rate=TARGET_SR, num_channels=1)
+    duration = decoder.metadata.duration_seconds_from_header
+    start = 0.0
+    while duration is None or start < duration:
+        chunk = decoder.get_samples_played_in_range(start, start + window_seconds).data
+        # Chunks are (channels, samples)
+        if chunk.shape[1] < min_seconds * TARGET_SR:
+            break
+        yield start, chunk
+        start += window_seconds
+
+
+def stream_windows(open_source, window_seconds=10.0, min_seconds=1.0):
+    """Yield (start_seconds, (1, samples) 16kHz waveform) per window, decoding one window at a time"""
+    # open_source() returns a fresh path or file object; file objects are consumed by each read
+    try:
+        f = sf.SoundFile(open_source())
+    except RuntimeError:
+        yield from _decode_windows(open_source(), window_seconds, min_seconds)
+        return
+    with f:
+        sr = f.samplerate
+        window_frames = int(window_seconds * sr)
+        min_frames = int(min_seconds * sr)
+        offset = 0
+        # One pass through the file, compressed or not; blocks are (frames, channels)
+        for block in f.blocks(blocksize=window_frames, dtype='float32', always_2d=True):
+            if block.shape[0] < min_frames:
+                # Too short to score alone; the previous window already covers most of the context
+                break
+            yield offset / sr, to_mono_16k(torch.from_numpy(block.T.copy()), sr)
+            offset += block.shape[0]
+
+
+def batch_input_values(waveforms, do_normalize=True, return_attention_mask=True):
+    """Pad 1-D or (1, n) waveforms into model inputs without a NumPy round trip"""
+    # Same as Wav2Vec2FeatureExtractor: right zero-padding, per-clip zero mean/unit variance
+    rows = [w.reshape(-1) for w in waveforms]
+    lengths = [row.shape[0] for row in rows]
+    input_values = torch.zeros(len(rows), max(lengths), dtype=torch.float32)
+    for i, row in enumerate(rows):
+        target = input_values[i, :lengths[i]]
+        target.copy_(row)
+        if do_normalize:
+            mean = target.mean()
+            std = torch.sqrt(target.var(unbiased=False) + 1e-7)
+            target.sub_(mean).div_(std)
+
+    inputs = {'input_values': input_values}
+    if return_attention_mask:
+        attention_mask = torch.zeros(len(rows), max(lengths), dtype=torch.long)
+        for i, length in enumerate(lengths):
+            attention_mask[i, :length] = 1
+        inputs['attention_mask'] = attention_mask
+    return inputs
+
+
+def _legacy_preprocess(path, extractor):
+    """The per-file pipeline this module replaces, kept for the benchmark"""
+    waveform, sr = torchaudio.load(path)
+    if sr != TARGET_SR:
+        waveform = torchaudio.transforms.Resample(orig_freq=sr, new_freq=TARGET_SR)(waveform)
+    if waveform.shape[0] > 1:
+        waveform = waveform.mean(dim=0).unsqueeze(0)
+    waveform = waveform / waveform.abs().max()
+    return extractor(waveform.squeeze().numpy(), sampling_rate=TARGET_SR,
+                     return_tensors="pt", padding=True)
+
+
+def benchmark_preprocessing(paths, repeats=3):
+    """Per-clip preprocessing cost of the legacy path versus this module"""
+    import transformers
+
+    paths = [str(p) for p in paths]
+    if not paths:
+        return None
+    extractor = transformers.Wav2Vec2FeatureExtractor(do_normalize=True)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for path in paths:
+            _legacy_preprocess(path, extractor)
+    legacy_ms = (time.perf_counter() - start) * 1000 / (repeats * len(paths))
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for path in paths:
+            batch_input_values([prepare_waveform(path, peak_normalize=False, min_samples=0)])
+    shared_ms = (time.perf_counter() - start) * 1000 / (repeats * len(paths))
+
+    report = {
+        'clips': len(paths),
+        'legacy_ms_per_clip': round(legacy_ms, 2),
+        'shared_ms_per_clip': round(shared_ms, 2),
+        'speedup': round(legacy_ms / shared_ms, 2) if shared_ms else None
+    }
+    print(f"⏱️ Preprocessing per clip: legacy {report['legacy_ms_per_clip']} ms | "
+          f"shared {report['shared_ms_per_clip']} ms")
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    files = []
+    for arg in sys.argv[1:] or ["received_audio"]:
+        path = Path(arg)
+        files.extend(sorted(path.rglob("*.wav")) if path.is_dir() else [path])
+    benchmark_preprocessing(files)
@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+SQLITE_SUFFIXES = {'.db', '.sqlite', '.sqlite3'}
+
+
+def caller_from_path(file_path):
+    """Caller number from a chunk named callerNumber_timestamp.wav"""
+    parts = Path(file_path).name.split('_')
+    return parts[0] if len(parts) > 0 and parts[0] else "unknown"
+
+
+def call_id_from_path(file_path):
+    """Call identifier: the file stem without a trailing _NNN chunk index"""
+    stem = Path(file_path).stem
+    parts = stem.split('_')
+    if len(parts) >= 3 and parts[-1].isdigit():
+        return '_'.join(parts[:-1])
+    return stem
+
+
+def _as_iso(value):
+    """Accept datetimes or ISO strings for time-range bounds"""
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+class JsonlResultsSink:
+    def __init__(self, path, fsync_every=20, fsync_interval=1.0):
+        """Append-only JSON Lines file; fsync is batched by count and time"""
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def append(self, result):
+        line = json.dumps(result, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def query(self, start=None, end=None, caller=None, top_emotion=None, limit=None):
+        """Results with start <= timestamp < end, oldest first"""
+        start, end = _as_iso(start), _as_iso(end)
+        with self._lock:
+            self._file.flush()
+        matches = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A crash can leave a torn final line; skip it
+                    continue
+                timestamp = result.get('timestamp', '')
+                if start and timestamp < start:
+                    continue
+                if end and timestamp >= end:
+                    continue
+                if caller and caller_from_path(result.get('file_path', '')) != caller:
+                    continue
+                if top_emotion and result.get('top_emotion') != top_emotion:
+                    continue
+                matches.append(result)
+                if limit and len(matches) >= limit:
+                    break
+        return matches
+
+    def close(self):
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+            self._file.close()
+
+
+class SqliteResultsSink:
+    def __init__(self, path):
+        """SQLite store in WAL mode, indexed by caller, timestamp and top emotion"""
+        self.path = Path(path)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                caller TEXT NOT NULL,
+                top_emotion TEXT,
+                file_path TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_results_caller ON results (caller, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_results_emotion ON results (top_emotion, timestamp);
+        """)
+        self._lock = threading.Lock()
+
+    def _row(self, result):
+        return (
+            result.get('timestamp', datetime.now().isoformat()),
+            caller_from_path(result.get('file_path', '')),
+            result.get('top_emotion'),
+            result.get('file_path'),
+            json.dumps(result, separators=(',', ':'))
+        )
+
+    def append(self, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO results (timestamp, caller, top_emotion, file_path, data) "
+                "VALUES (?, ?, ?, ?, ?)", self._row(result))
+            self._conn.commit()
+
+    def append_many(self, results):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO results (timestamp, caller, top_emotion, file_path, data) "
+                "VALUES (?, ?, ?, ?, ?)", [self._row(r) for r in results])
+            self._conn.commit()
+
+    def query(self, start=None, end=None, caller=None, top_emotion=None, limit=None):
+        """Results with start <= timestamp < end, oldest first"""
+        clauses, params = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(_as_iso(start))
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(_as_iso(end))
+        if caller:
+            clauses.append("caller = ?")
+            params.append(caller)
+        if top_emotion:
+            clauses.append("top_emotion = ?")
+            params.append(top_emotion)
+        sql = "SELECT data FROM results"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_json_array(json_path, sink):
+    """Copy a legacy emotion_results.json array into a sink, then retire the file"""
+    json_path = Path(json_path)
+    with open(json_path, 'r') as f:
+        results = json.load(f)
+    if hasattr(sink, 'append_many'):
+        sink.append_many(results)
+    else:
+        for result in results:
+            sink.append(result)
+    # Renamed rather than deleted so nothing is lost, and it is not imported twice
+    json_path.rename(json_path.with_name(json_path.name + '.migrated'))
+    print(f"📦 Migrated {len(results)} results from {json_path} to {sink.path}")
+    return len(results)
+
+
+def open_results_sink(results_file, fsync_every=20):
+    """Pick a sink from the file extension (.jsonl, or .db/.sqlite for SQLite)"""
+    # A .json path means the old array format: write to the .jsonl beside it instead
+    path = Path(results_file)
+    if path.suffix == '.json':
+        path = path.with_suffix('.jsonl')
+
+    if path.suffix.lower() in SQLITE_SUFFIXES:
+        sink = SqliteResultsSink(path)
+    else:
+        sink = JsonlResultsSink(path, fsync_every=fsync_every)
+
+    # Migrate a legacy array with the same name on first open
+    legacy = path.with_suffix('.json')
+    if legacy.exists():
+        try:
+            migrate_json_array(legacy, sink)
+        except (ValueError, OSError) as e:
+            print(f"❌ Could not migrate {legacy}: {str(e)}")
+    return sink
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query or migrate stored emotion results")
+    parser.add_argument("results_file", help=".jsonl or .db results store")
+    parser.add_argument("--start", help="ISO timestamp (inclusive)")
+    parser.add_argument("--end", help="ISO timestamp (exclusive)")
+    parser.add_argument("--caller")
+    parser.add_argument("--emotion")
+    parser.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    store = open_results_sink(args.results_file)
+    for item in store.query(args.start, args.end, args.caller, args.emotion, args.limit):
+        print(json.dumps(item))
+    store.close()
@@ -1,30 +1,39 @@
-import torch
-import torchaudio
-from transformers import Wav2Vec2ForSequenceClassification, Wav2Vec2FeatureExtractor
+import os
+import time
+
+from ser_backends import load_backend, resolve_model_path
+from ser_preprocessing import batch_input_values, prepare_waveform
+from ser_startup import lazy_import, record_startup
+
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
 
 # New, more generalized model
 model_name = "j-hartmann/emotion-english-wav2vec2"
 
-model = Wav2Vec2ForSequenceClassification.from_pretrained(model_name)
-feature_extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
+# Loaded on the first prediction rather than at import
+model = None
+feature_extractor = None
+backend = None
 
-model.eval()
+def load_model():
+    global model, feature_extractor, backend
+    if backend is not None:
+        return
+    start = time.perf_counter()
+    source = resolve_model_path(model_name)
+    model = transformers.Wav2Vec2ForSequenceClassification.from_pretrained(source)
+    feature_extractor = transformers.Wav2Vec2FeatureExtractor.from_pretrained(source)
+    model.eval()
+    # torch (default), torch-dynamic-int8 or onnx
+    backend = load_backend(os.environ.get("SER_BACKEND", "torch"), model_name, model=model)
+    record_startup("mix_model_load", time.perf_counter() - start)
 
 def preprocess_waveform(audio_path):
-    waveform, sr = torchaudio.load(audio_path)
-
-    # Resample to 16kHz
-    if sr != 16000:
-        waveform = torchaudio.transforms.Resample(orig_freq=sr, new_freq=16000)(waveform)
+    load_model()
+    waveform = prepare_waveform(audio_path, peak_normalize=not feature_extractor.do_normalize)
 
-    # Convert to mono
-    if waveform.shape[0] > 1:
-        waveform = waveform.mean(dim=0).unsqueeze(0)
-
-    # Normalize
-    waveform = waveform / waveform.abs().max()
-
-    if waveform.shape[1] < 16000:
+    if waveform is None:
         print("⚠️ Audio too short (<1 sec)")
         return None
 
@@ -35,15 +44,14 @@ def predict_emotion_mix(audio_path):
     if waveform is None:
         return "unknown"
 
-    inputs = feature_extractor(
-        waveform.squeeze().numpy(),
-        sampling_rate=16000,
-        return_tensors="pt",
-        padding=True
+    inputs = batch_input_values(
+        [waveform],
+        do_normalize=feature_extractor.do_normalize,
+        return_attention_mask=feature_extractor.return_attention_mask
     )
 
     with torch.no_grad():
-        logits = model(**inputs).logits
+        logits = backend.logits(inputs)
         probs = torch.nn.functional.softmax(logits, dim=1)
         topk = torch.topk(probs, k=3)
 
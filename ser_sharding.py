@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import hashlib
+from pathlib import Path
+
+# Claim file states; "claimed" is in progress, "failed" may be claimed again until out of attempts
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes, replicas=256):
+        """Consistent hash ring; adding or removing a node only moves that node's share of keys"""
+        self.nodes = list(nodes)
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key):
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+class ShardAssignment:
+    def __init__(self, index, count, claims_dir, replicas=256, stale_seconds=600, max_attempts=3,
+                 done_ttl_seconds=86400):
+        """This process's slice of the call-ID space plus cross-process file claims"""
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} out of range for {count} shards")
+        self.index = index
+        self.count = count
+        self.node = f"shard-{index}"
+        # A restarted shard takes back claims left by its previous run straight away
+        self.incarnation = uuid.uuid4().hex
+        self.ring = HashRing([f"shard-{i}" for i in range(count)], replicas)
+        # Must live on storage every shard sees (the shared watch directory)
+        self.claims_dir = Path(claims_dir)
+        self.claims_dir.mkdir(parents=True, exist_ok=True)
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.done_ttl_seconds = done_ttl_seconds
+
+    def owns(self, call_id):
+        return self.ring.node_for(call_id) == self.node
+
+    def _claim_path(self, key):
+        return self.claims_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.claim"
+
+    def _record(self, key, state, attempts):
+        return json.dumps({'state': state, 'node': self.node, 'incarnation': self.incarnation,
+                           'time': time.time(), 'attempts': attempts, 'key': key}).encode("utf-8")
+
+    @staticmethod
+    def _read(path):
+        try:
+            return json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, state, attempts):
+        # Replace, never rewrite in place, so readers always see a whole record
+        path = self._claim_path(key)
+        tmp = path.with_name(f"{path.name}.{self.incarnation}.tmp")
+        tmp.write_bytes(self._record(key, state, attempts))
+        os.replace(tmp, path)
+
+    def _can_take_over(self, record, path):
+        if record is None:
+            # Just created by another process and not written yet, or left half-written by a crash
+            try:
+                return time.time() - path.stat().st_mtime >= self.stale_seconds
+            except OSError:
+                return False
+        if record['state'] == DONE:
+            return False
+        if record['state'] == FAILED:
+            return record.get('attempts', 0) < self.max_attempts
+        if record['node'] == self.node:
+            return record['incarnation'] != self.incarnation
+        # Claimed by another live shard, unless it has not been heard from in a long time
+        return time.time() - record['time'] >= self.stale_seconds
+
+    def claim(self, key):
+        """True if this shard now owns the file; O_EXCL create is atomic, also on shared mounts"""
+        path = self._claim_path(key)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            record = self._read(path)
+            if not self._can_take_over(record, path):
+                return False
+            self._write(key, CLAIMED, record.get('attempts', 0) if record else 0)
+            return True
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._record(key, CLAIMED, 0))
+        return True
+
+    def mark_done(self, key):
+        self._write(key, DONE, 0)
+
+    def mark_failed(self, key):
+        """Record a failed attempt; the file can be claimed again until max_attempts"""
+        record = self._read(self._claim_path(key))
+        self._write(key, FAILED, (record.get('attempts', 0) if record else 0) + 1)
+
+    def release(self, key):
+        """Give a claim back without using an attempt, e.g. when the file could not be queued"""
+        try:
+            self._claim_path(key).unlink()
+        except OSError:
+            pass
+
+    def prune(self):
+        """Delete this shard's finished claims older than done_ttl_seconds; returns how many"""
+        # The backlog ledger, not the claim, keeps a finished file from being walked again
+        removed = 0
+        cutoff = time.time() - self.done_ttl_seconds
+        for path in self.claims_dir.glob("*.claim"):
+            record = self._read(path)
+            if (record and record['node'] == self.node and record['state'] in (DONE, FAILED)
+                    and record['time'] <= cutoff):
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
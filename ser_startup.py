@@ -0,0 +1,46 @@
+import time
+import importlib
+import threading
+
+# Seconds spent in each cold-start stage, in the order they happened
+STARTUP_TIMINGS = {}
+_PROCESS_START = time.perf_counter()
+_lock = threading.Lock()
+
+
+def record_startup(stage, seconds):
+    """Remember how long a cold-start stage took"""
+    with _lock:
+        STARTUP_TIMINGS[stage] = round(STARTUP_TIMINGS.get(stage, 0.0) + seconds, 3)
+
+
+def startup_report(prefix="⏱️ Startup"):
+    """Print and return the per-stage timings plus time since process start"""
+    with _lock:
+        report = dict(STARTUP_TIMINGS)
+    report['since_process_start'] = round(time.perf_counter() - _PROCESS_START, 3)
+    stages = ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in report.items())
+    print(f"{prefix}: {stages}")
+    return report
+
+
+class _LazyModule:
+    def __init__(self, name):
+        """Stand-in that imports the real module on first attribute access"""
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            # import_module is thread-safe; only the first finisher records the time
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            if self._module is None:
+                record_startup(f"import_{self._name}", time.perf_counter() - start)
+                self._module = module
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    """Defer importing a heavy module (torch, transformers, ...) until it is used"""
+    return _LazyModule(name)
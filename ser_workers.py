@@ -0,0 +1,435 @@
+import os
+import time
+import heapq
+import itertools
+import queue
+import threading
+import multiprocessing as mp
+from collections import deque
+
+from ser_files import wait_until_ready
+from ser_metrics import MODEL_LOAD_SECONDS, PREDICTIONS, REGISTRY, observe_stages
+
+DEFAULT_MODEL = "ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition"
+
+# Job classes; lower runs first
+PRIORITY_LIVE = 0
+PRIORITY_BACKLOG = 1
+
+
+def _worker_main(worker_id, task_queue, result_queue, model_name, backend, torch_threads,
+                 max_batch_size, max_wait_ms):
+    """Worker process: load the model once, then drain micro-batches from the task queue"""
+    from ser_metrics import StageTimer
+    from ser_prediction_cache import PredictionCache
+    from ser_predictor import make_recognizer, torch
+    from ser_vad import VoiceActivityDetector
+    torch.set_num_threads(torch_threads)
+
+    cache_path = os.environ.get("SER_PREDICTION_CACHE", "prediction_cache.db")
+    prediction_cache = PredictionCache(cache_path) if cache_path else None
+    # Opt-in: a gate that drops a chunk drops its prediction too
+    vad = VoiceActivityDetector() if os.environ.get("SER_VAD", "0") == "1" else None
+    recognizer = make_recognizer(model_name, backend, prediction_cache, vad)
+    startup = recognizer.warm_up()
+    result_queue.put(('ready', worker_id, startup))
+
+    max_wait = max_wait_ms / 1000.0
+    running = True
+    while running:
+        job = task_queue.get()
+        if job is None:
+            break
+        batch = [job]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = task_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                running = False
+                break
+            batch.append(job)
+
+        # Uploads arrive as bytes; only files on disk need to finish being written
+        sources = []
+        timers = [StageTimer() for _ in batch]
+        for job, timer in zip(batch, timers):
+            if 'audio' in job:
+                sources.append(job['audio'])
+            else:
+                with timer.stage("file_wait"):
+                    wait_until_ready(job['file_path'])
+                sources.append(job['file_path'])
+
+        started = time.time()
+        try:
+            results = recognizer.predict_batch(sources, timers)
+        except Exception as e:
+            print(f"❌ Worker {worker_id} failed on batch of {len(sources)}: {str(e)}")
+            results = [None] * len(sources)
+        finished = time.time()
+
+        for job, result, timer in zip(batch, results, timers):
+            job.pop('audio', None)
+            result_queue.put(('done', worker_id, {
+                'job': job,
+                'result': result,
+                'started': started,
+                'finished': finished,
+                'batch_size': len(batch),
+                'stages': timer.timings
+            }))
+
+
+class PriorityJobQueue:
+    def __init__(self, maxsize=64, backlog_maxsize=8, aging_seconds=30.0):
+        """Live and backlog jobs, each bounded, served oldest-effective-deadline first"""
+        # A job's key is enqueue time + priority * aging_seconds: a backlog job is served ahead of
+        # live jobs that arrived more than aging_seconds after it, so it cannot starve
+        self.maxsize = maxsize
+        self.aging_seconds = aging_seconds
+        self._capacity = {PRIORITY_LIVE: maxsize, PRIORITY_BACKLOG: backlog_maxsize}
+        self._heaps = {PRIORITY_LIVE: [], PRIORITY_BACKLOG: []}
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, job, priority=PRIORITY_LIVE, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            heap = self._heaps[priority]
+            while len(heap) >= self._capacity[priority] or self._closed:
+                # Once closed nobody will take the job, so callers waiting without a timeout give up too
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if self._closed or not block or (remaining is not None and remaining <= 0):
+                    raise queue.Full
+                self._cond.wait(remaining)
+            self._seq += 1
+            heapq.heappush(heap, (job['enqueued'] + priority * self.aging_seconds, self._seq, job))
+            self._cond.notify_all()
+
+    def get(self, allow_backlog=lambda: True, poll=0.5):
+        """Next job to run, or None once closed; backlog only when allow_backlog() says so"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                heads = []
+                if self._heaps[PRIORITY_LIVE]:
+                    heads.append(self._heaps[PRIORITY_LIVE])
+                if self._heaps[PRIORITY_BACKLOG] and allow_backlog():
+                    heads.append(self._heaps[PRIORITY_BACKLOG])
+                if heads:
+                    heap = min(heads, key=lambda h: h[0][:2])
+                    job = heapq.heappop(heap)[2]
+                    self._cond.notify_all()
+                    return job
+                # Woken by put()/notify(); the timeout re-checks allow_backlog
+                self._cond.wait(poll)
+
+    def notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def qsize(self, priority=None):
+        with self._cond:
+            if priority is not None:
+                return len(self._heaps[priority])
+            return sum(len(heap) for heap in self._heaps.values())
+
+
+class InferenceWorkerPool:
+    def __init__(self, model_name=DEFAULT_MODEL, backend=None, num_workers=1, torch_threads=1,
+                 queue_size=64, max_batch_size=4, max_wait_ms=50, prefetch=2,
+                 on_result=None, start_method=None, backlog_share=None, aging_seconds=None,
+                 supervise_interval=1.0, max_retries=1):
+        """Pool of inference processes fed from a bounded queue"""
+        self.model_name = model_name
+        self.backend = backend
+        self.num_workers = num_workers
+        self.torch_threads = torch_threads
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.on_result = on_result
+        self.supervise_interval = supervise_interval
+        # Jobs on a worker that died are requeued this many times, then reported as failed
+        self.max_retries = max_retries
+
+        if backlog_share is None:
+            backlog_share = float(os.environ.get("SER_BACKLOG_SHARE", 0.25))
+        if aging_seconds is None:
+            aging_seconds = float(os.environ.get("SER_PRIORITY_AGING_SECONDS", 30))
+
+        # Bounded in the parent so submit() applies backpressure and depth is exact
+        capacity = num_workers * max_batch_size * prefetch
+        self.pending = PriorityJobQueue(queue_size, backlog_maxsize=capacity, aging_seconds=aging_seconds)
+        self.in_flight = threading.BoundedSemaphore(capacity)
+        # Backlog may hold at most this many in-flight slots, i.e. roughly this share of the CPU
+        self.max_backlog_in_flight = max(1, int(capacity * backlog_share))
+        self._backlog_in_flight = 0
+
+        self._ctx = mp.get_context(start_method)
+        # One queue per worker, so the jobs a dead worker held are known
+        self.task_queues = [self._ctx.Queue() for _ in range(num_workers)]
+        self.result_queue = self._ctx.Queue()
+        self.workers = [self._spawn(i) for i in range(num_workers)]
+        self._outstanding = [{} for _ in range(num_workers)]
+        self._job_ids = itertools.count()
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self._queue_waits = deque(maxlen=500)
+        self._in_flight_count = 0
+        self._ready = set()
+        self.restarts = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.cache_hits = 0
+        self.skipped = 0
+        self.audio_seconds = 0.0
+        self.skipped_seconds = 0.0
+        self._running = False
+
+        # Read at scrape time, so the hot path pays nothing for them
+        REGISTRY.gauge("ser_queue_depth", "Clips waiting for a worker",
+                       function=lambda: self.pending.qsize())
+        REGISTRY.gauge("ser_clips_in_flight", "Clips handed to workers and not yet finished",
+                       function=lambda: self._in_flight_count)
+        REGISTRY.gauge("ser_workers_ready", "Workers that finished loading the model",
+                       function=lambda: len(self._ready))
+        REGISTRY.gauge("ser_prediction_cache_hit_ratio", "Share of finished clips served from the cache",
+                       function=lambda: self.cache_hits / self.completed if self.completed else 0.0)
+
+    def _spawn(self, worker_id):
+        return self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.task_queues[worker_id], self.result_queue, self.model_name,
+                  self.backend, self.torch_threads, self.max_batch_size, self.max_wait_ms),
+            daemon=True
+        )
+
+    def start(self):
+        """Start worker processes plus the dispatcher, collector and supervisor threads"""
+        print(f"🚀 Starting {self.num_workers} inference worker(s) "
+              f"({self.torch_threads} torch thread(s) each)...")
+        self._running = True
+        for worker in self.workers:
+            worker.start()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._dispatcher.start()
+        self._collector.start()
+        self._supervisor.start()
+
+    def stop(self, timeout=10):
+        """Stop the dispatcher and let workers finish what they already hold"""
+        self._running = False
+        self.pending.close()
+        self._dispatcher.join(timeout)
+        self._supervisor.join(timeout)
+        with self._lock:
+            for task_queue in self.task_queues:
+                task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout)
+        self.result_queue.put(None)
+        self._collector.join(timeout)
+
+    def submit(self, file_path, block=True, timeout=None, audio=None, priority=PRIORITY_LIVE):
+        """Enqueue a file (or in-memory audio for it); returns False if the queue stayed full"""
+        job = {'id': next(self._job_ids), 'file_path': str(file_path), 'enqueued': time.time(),
+               'priority': priority}
+        if audio is not None:
+            job['audio'] = audio
+        try:
+            self.pending.put(job, priority, block=block, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def stats(self):
+        """Queue depth, in-flight count and latency summary"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            waits = sorted(self._queue_waits)
+            return {
+                'workers': self.num_workers,
+                'workers_ready': len(self._ready),
+                'worker_restarts': self.restarts,
+                'queue_depth': self.pending.qsize(),
+                'queue_capacity': self.pending.maxsize,
+                'backlog_depth': self.pending.qsize(PRIORITY_BACKLOG),
+                'in_flight': self._in_flight_count,
+                'backlog_in_flight': self._backlog_in_flight,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'cache_hits': self.cache_hits,
+                'cache_hit_rate': round(self.cache_hits / self.completed, 4) if self.completed else 0.0,
+                'skipped': self.skipped,
+                'audio_skipped_ratio': round(self.skipped_seconds / self.audio_seconds, 4)
+                if self.audio_seconds else 0.0,
+                'latency_ms': _summarize(latencies),
+                'queue_wait_ms': _summarize(waits)
+            }
+
+    def _dispatch(self):
+        """Move jobs to the workers, keeping at most a few batches in flight"""
+        while self._running:
+            # Take the slot first so the job is chosen as late as possible, by current priority
+            if not self.in_flight.acquire(timeout=0.5):
+                continue
+            job = self.pending.get(
+                allow_backlog=lambda: self._backlog_in_flight < self.max_backlog_in_flight)
+            if job is None:
+                self.in_flight.release()
+                break
+            with self._lock:
+                self._in_flight_count += 1
+                if job['priority'] == PRIORITY_BACKLOG:
+                    self._backlog_in_flight += 1
+                # Least loaded live worker; a worker being restarted gets nothing new
+                alive = [i for i, worker in enumerate(self.workers) if worker.is_alive()]
+                worker_id = min(alive or range(self.num_workers), key=lambda i: len(self._outstanding[i]))
+                self._outstanding[worker_id][job['id']] = job
+                self.task_queues[worker_id].put(job)
+
+    def _supervise(self):
+        """Restart workers that died; their jobs are retried, then reported as failed"""
+        while self._running:
+            time.sleep(self.supervise_interval)
+            for worker_id in range(self.num_workers):
+                if self._running and not self.workers[worker_id].is_alive():
+                    self._recover(worker_id)
+
+    def _recover(self, worker_id):
+        with self._lock:
+            exitcode = self.workers[worker_id].exitcode
+            orphans = list(self._outstanding[worker_id].values())
+            self._outstanding[worker_id] = {}
+            self._ready.discard(worker_id)
+            # The old queue may still hold jobs, or be unusable if the worker died reading it
+            self.task_queues[worker_id] = self._ctx.Queue()
+            self.workers[worker_id] = self._spawn(worker_id)
+            self.workers[worker_id].start()
+            self.restarts += 1
+        print(f"💀 Inference worker {worker_id} died (exit code {exitcode}); restarted, "
+              f"{len(orphans)} job(s) recovered")
+
+        for job in orphans:
+            self._release_slot(job)
+            job['attempts'] = job.get('attempts', 0) + 1
+            if job['attempts'] <= self.max_retries:
+                try:
+                    self.pending.put(job, job['priority'], block=False)
+                    continue
+                except queue.Full:
+                    pass
+            print(f"❌ Giving up on {job['file_path']} after its worker died")
+            with self._lock:
+                self.failed += 1
+            PREDICTIONS.inc(outcome='failed')
+            job.pop('audio', None)
+            self._deliver(job, None, {
+                'worker': worker_id,
+                'total_ms': round((time.time() - job['enqueued']) * 1000, 1)
+            })
+
+    def _release_slot(self, job):
+        with self._lock:
+            self._in_flight_count -= 1
+            if job.get('priority') == PRIORITY_BACKLOG:
+                self._backlog_in_flight -= 1
+        self.in_flight.release()
+        # A backlog slot may have opened up
+        self.pending.notify()
+
+    def _deliver(self, job, result, timing):
+        if self.on_result:
+            try:
+                self.on_result(job['file_path'], result, timing)
+            except Exception as e:
+                print(f"❌ Error handling result for {job['file_path']}: {str(e)}")
+
+    def _collect(self):
+        """Receive results from workers and hand them to on_result"""
+        while True:
+            message = self.result_queue.get()
+            if message is None:
+                break
+            kind, worker_id, payload = message
+            if kind == 'ready':
+                with self._lock:
+                    self._ready.add(worker_id)
+                if payload:
+                    MODEL_LOAD_SECONDS.set(payload.get('model_load', 0.0), worker=worker_id)
+                print(f"✅ Inference worker {worker_id} ready")
+                continue
+
+            job = payload['job']
+            with self._lock:
+                # Unknown once its worker was declared dead and the job retried or failed
+                if self._outstanding[worker_id].pop(job['id'], None) is None:
+                    continue
+            now = time.time()
+            timing = {
+                'worker': worker_id,
+                'batch_size': payload['batch_size'],
+                'queue_wait_ms': round((payload['started'] - job['enqueued']) * 1000, 1),
+                'inference_ms': round((payload['finished'] - payload['started']) * 1000, 1),
+                'total_ms': round((now - job['enqueued']) * 1000, 1)
+            }
+            timing.update(payload.get('stages', {}))
+            observe_stages(timing)
+            self._release_slot(job)
+            with self._lock:
+                if payload['result'] is None:
+                    self.failed += 1
+                    outcome = 'failed'
+                else:
+                    self.completed += 1
+                    result = payload['result']
+                    outcome = 'scored'
+                    if result.get('cached'):
+                        self.cache_hits += 1
+                        outcome = 'cached'
+                    if result.get('skipped'):
+                        self.skipped += 1
+                        outcome = 'skipped'
+                    if result.get('vad'):
+                        self.audio_seconds += result['vad']['total_seconds']
+                        self.skipped_seconds += result['vad']['skipped_seconds']
+                self._latencies.append(timing['total_ms'])
+                self._queue_waits.append(timing['queue_wait_ms'])
+            PREDICTIONS.inc(outcome=outcome)
+            self._deliver(job, payload['result'], timing)
+
+
+def _summarize(values):
+    """Average/p50/p95/max of a sorted list of milliseconds"""
+    if not values:
+        return {'avg': 0, 'p50': 0, 'p95': 0, 'max': 0}
+    return {
+        'avg': round(sum(values) / len(values), 1),
+        'p50': values[len(values) // 2],
+        'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+        'max': values[-1]
+    }
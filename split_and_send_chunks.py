@@ -1,75 +1,335 @@
 import os
 import time
+import wave
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import subprocess
 
 WATCH_DIR = "/tmp/livecalls"
 CHUNK_DIR = "/tmp/chunks"
 SENT_DIR = "/tmp/sentchunks"
 FLASK_URL = "http://localhost:5000/receive_audio"
+PROGRESS_DB = "split_progress.db"
 
 os.makedirs(CHUNK_DIR, exist_ok=True)
 os.makedirs(SENT_DIR, exist_ok=True)
 
-def split_audio(file_path, filename):
-    base_name = filename.replace(".wav", "")
-    out_pattern = os.path.join(CHUNK_DIR, f"{base_name}_%03d.wav")
-    command = [
-        "ffmpeg", "-y", "-i", file_path,
-        "-f", "segment", "-segment_time", "15", "-c", "copy", out_pattern
-    ]
-    try:
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def read_wav_layout(f):
+    """(format, data offset, data size) of a RIFF/WAVE file, or None while the header is incomplete"""
+    f.seek(0)
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        return None
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        chunk_id, size = chunk[:4], int.from_bytes(chunk[4:], 'little')
+        if chunk_id == b'fmt ':
+            data = f.read(size)
+            if len(data) < 16:
+                return None
+            fmt = {
+                'channels': int.from_bytes(data[2:4], 'little'),
+                'sample_rate': int.from_bytes(data[4:8], 'little'),
+                'sample_width': int.from_bytes(data[14:16], 'little') // 8
+            }
+            if size & 1:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            # Recorders leave the size at 0 (or 0xFFFFFFFF) until the call ends
+            return fmt, f.tell(), size if 0 < size < 0xFFFFFFFF else None
+        else:
+            f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+class SplitProgress:
+    def __init__(self, path=PROGRESS_DB):
+        """Per-recording byte offset and next chunk index, so restarts resume instead of re-splitting"""
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS progress (
+                recording TEXT PRIMARY KEY,
+                byte_offset INTEGER NOT NULL,
+                next_index INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.commit()
+        self._done = {row[0] for row in self._conn.execute("SELECT recording FROM progress WHERE done = 1")}
+
+    def is_done(self, recording):
+        return recording in self._done
+
+    def get(self, recording):
+        row = self._conn.execute(
+            "SELECT byte_offset, next_index FROM progress WHERE recording = ?", (recording,)).fetchone()
+        return row if row else (0, 0)
+
+    def save(self, recording, byte_offset, next_index, done=False):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO progress (recording, byte_offset, next_index, done) VALUES (?, ?, ?, ?)",
+            (recording, byte_offset, next_index, int(done)))
+        self._conn.commit()
+        if done:
+            self._done.add(recording)
+
+    def close(self):
+        self._conn.close()
+
+
+class RecordingSegmenter:
+    def __init__(self, path, progress, on_chunk, segment_seconds=15.0, overlap_seconds=0.0,
+                 min_tail_seconds=1.0, read_bytes=1 << 20):
+        """Cut a (possibly still growing) WAV into overlapping windows as the data arrives"""
+        if not 0 <= overlap_seconds < segment_seconds:
+            raise ValueError("overlap must be shorter than the segment")
+        self.path = path
+        self.name = os.path.basename(path)
+        self.base_name = self.name.replace(".wav", "")
+        self.progress = progress
+        self.on_chunk = on_chunk
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.min_tail_seconds = min_tail_seconds
+        self.read_bytes = read_bytes
+
+        self.offset, self.index = progress.get(self.name)
+        self.buffer = bytearray()
+        self.layout = None
+        self.complete = False
+        self.last_growth = time.monotonic()
+        self._file = None
+
+    def _open(self):
+        self._file = open(self.path, 'rb')
+        layout = read_wav_layout(self._file)
+        if layout is None:
+            self._file.close()
+            self._file = None
+            return False
+        self.layout = layout
+        fmt = layout[0]
+        frame_bytes = fmt['channels'] * fmt['sample_width']
+        self.frame_bytes = frame_bytes
+        self.window_bytes = int(self.segment_seconds * fmt['sample_rate']) * frame_bytes
+        self.hop_bytes = int((self.segment_seconds - self.overlap_seconds) * fmt['sample_rate']) * frame_bytes
+        self.min_tail_bytes = int(self.min_tail_seconds * fmt['sample_rate']) * frame_bytes
         return True
-    except subprocess.CalledProcessError:
-        print(f"❌ Failed to split {filename}")
+
+    def _data_size(self):
+        """Final data size once the recorder has patched the header, else None"""
+        _, data_offset, data_size = self.layout
+        if data_size is None:
+            self._file.seek(data_offset - 4)
+            size = int.from_bytes(self._file.read(4), 'little')
+            data_size = size if 0 < size < 0xFFFFFFFF else None
+            if data_size is not None:
+                self.layout = (self.layout[0], data_offset, data_size)
+        return data_size
+
+    def poll(self):
+        """Read whatever was appended since the last call and emit every complete window"""
+        if self._file is None and not self._open():
+            return
+        _, data_offset, _ = self.layout
+        data_size = self._data_size()
+        position = self.offset + len(self.buffer)
+
+        grew = False
+        while True:
+            want = self.read_bytes
+            if data_size is not None:
+                want = min(want, data_size - position)
+            if want <= 0:
+                break
+            self._file.seek(data_offset + position)
+            data = self._file.read(want)
+            if not data:
+                break
+            grew = True
+            self.buffer += data
+            position += len(data)
+            self._emit_complete()
+
+        if grew:
+            self.last_growth = time.monotonic()
+        if data_size is not None and position >= data_size:
+            self.complete = True
+
+    def _emit_complete(self):
+        while len(self.buffer) >= self.window_bytes:
+            self._write_chunk(bytes(self.buffer[:self.window_bytes]))
+            del self.buffer[:self.hop_bytes]
+            self.offset += self.hop_bytes
+            self.index += 1
+            self.progress.save(self.name, self.offset, self.index)
+
+    def finish(self):
+        """Emit the trailing partial window and mark the recording done"""
+        if self.layout is not None:
+            tail = len(self.buffer) - len(self.buffer) % self.frame_bytes
+            overlap_bytes = self.window_bytes - self.hop_bytes
+            # A tail that only repeats the previous window's overlap adds nothing
+            if tail >= self.min_tail_bytes and (self.index == 0 or tail > overlap_bytes):
+                self._write_chunk(bytes(self.buffer[:tail]))
+                self.offset += tail
+                self.index += 1
+        self.buffer = bytearray()
+        self.progress.save(self.name, self.offset, self.index, done=True)
+        self.close()
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_growth
+
+    def _write_chunk(self, frames):
+        fmt = self.layout[0]
+        chunk_path = os.path.join(CHUNK_DIR, f"{self.base_name}_{self.index:03d}.wav")
+        # Write under a temporary name so directory watchers never see a half-written chunk
+        tmp_path = chunk_path + ".part"
+        with wave.open(tmp_path, 'wb') as out:
+            out.setnchannels(fmt['channels'])
+            out.setsampwidth(fmt['sample_width'])
+            out.setframerate(fmt['sample_rate'])
+            out.writeframes(frames)
+        os.replace(tmp_path, chunk_path)
+        self.on_chunk(chunk_path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def post_chunk(chunk_path, session=requests):
+    chunk = os.path.basename(chunk_path)
+
+    # Extract caller and timestamp from chunk name
+    base_name = chunk.replace(".wav", "")
+    parts = base_name.split("_")
+    if len(parts) < 3:
+        print(f"⚠️ Skipping badly named file: {chunk}")
         return False
+    timestamp = parts[0]
+    caller = "1000"  # Default/fallback value, or parse from filename if needed
+
+    print(f"📤 Sending {chunk}...")
+    try:
+        with open(chunk_path, "rb") as f:
+            r = session.post(
+                FLASK_URL,
+                files={"audio": f},
+                data={"caller": caller, "timestamp": timestamp},
+                timeout=30
+            )
+        if r.status_code == 200:
+            print(f"✅ Sent {chunk}")
+            os.rename(chunk_path, os.path.join(SENT_DIR, "sent_" + chunk))
+            return True
+        print(f"❌ Failed with status: {r.status_code}")
+    except Exception as e:
+        print(f"🔥 Error sending {chunk}: {e}")
+    return False
 
-def post_chunks():
-    for chunk in os.listdir(CHUNK_DIR):
-        if not chunk.endswith(".wav") or chunk.startswith("sent_"):
-            continue
-        chunk_path = os.path.join(CHUNK_DIR, chunk)
-        
-        # Extract caller and timestamp from chunk name
-        base_name = chunk.replace(".wav", "")
-        parts = base_name.split("_")
-        if len(parts) < 3:
-            print(f"⚠️ Skipping badly named file: {chunk}")
-            continue
-        timestamp = parts[0]
-        uniqueid = parts[1]
-        chunk_id = parts[2]
-        caller = "1000"  # Default/fallback value, or parse from filename if needed
-
-        print(f"📤 Sending {chunk}...")
+
+class ChunkUploader:
+    def __init__(self, session, max_parallel=2):
+        """Posts chunks off the segmenting loop, so a slow server never stalls reading recordings"""
+        self.session = session
+        self.executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="chunk-upload")
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def submit(self, chunk_path):
+        with self._lock:
+            if chunk_path in self._in_flight:
+                return
+            self._in_flight.add(chunk_path)
+        self.executor.submit(self._post, chunk_path)
+
+    def _post(self, chunk_path):
         try:
-            with open(chunk_path, "rb") as f:
-                r = requests.post(
-                    FLASK_URL,
-                    files={"audio": f},
-                    data={"caller": caller, "timestamp": timestamp}
-                )
-            if r.status_code == 200:
-                print(f"✅ Sent {chunk}")
-                os.rename(chunk_path, os.path.join(SENT_DIR, "sent_" + chunk))
-            else:
-                print(f"❌ Failed with status: {r.status_code}")
-        except Exception as e:
-            print(f"🔥 Error sending {chunk}: {e}")
-
-
-def watch_and_process():
-    processed = set()
-    while True:
-        for file in os.listdir(WATCH_DIR):
-            if not file.endswith(".wav") or file in processed:
+            # A retry scan may list a chunk whose first upload finished in the meantime
+            if os.path.exists(chunk_path):
+                post_chunk(chunk_path, self.session)
+        finally:
+            with self._lock:
+                self._in_flight.discard(chunk_path)
+
+    def retry_failed(self):
+        """Resubmit chunks whose upload failed earlier"""
+        for chunk in os.listdir(CHUNK_DIR):
+            if not chunk.endswith(".wav") or chunk.startswith("sent_"):
                 continue
-            file_path = os.path.join(WATCH_DIR, file)
-            if split_audio(file_path, file):
-                processed.add(file)
-        post_chunks()
-        time.sleep(5)
+            self.submit(os.path.join(CHUNK_DIR, chunk))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def watch_and_process(watch_dir=WATCH_DIR, segment_seconds=15.0, overlap_seconds=0.0,
+                      poll_interval=1.0, idle_timeout=10.0, retry_interval=30.0):
+    progress = SplitProgress()
+    session = requests.Session()
+    uploader = ChunkUploader(session)
+    active = {}
+    uploader.retry_failed()
+    last_retry = time.monotonic()
+
+    print(f"🚀 Segmenting recordings in {watch_dir} "
+          f"({segment_seconds}s windows, {overlap_seconds}s overlap)...")
+    try:
+        while True:
+            with os.scandir(watch_dir) as entries:
+                for entry in entries:
+                    if (entry.name.endswith(".wav") and entry.name not in active
+                            and not progress.is_done(entry.name)):
+                        active[entry.name] = RecordingSegmenter(
+                            entry.path, progress, uploader.submit,
+                            segment_seconds, overlap_seconds)
+
+            for name, segmenter in list(active.items()):
+                try:
+                    segmenter.poll()
+                except OSError as e:
+                    print(f"❌ Failed to read {name}: {e}")
+                    segmenter.close()
+                    del active[name]
+                    continue
+                # Header patched with the final size, or the recorder went quiet
+                if segmenter.complete or segmenter.idle_seconds() > idle_timeout:
+                    segmenter.finish()
+                    print(f"✂️ Finished {name}: {segmenter.index} chunks")
+                    del active[name]
+
+            if time.monotonic() - last_retry >= retry_interval:
+                uploader.retry_failed()
+                last_retry = time.monotonic()
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping segmenter...")
+    finally:
+        for segmenter in active.values():
+            segmenter.close()
+        progress.close()
+        uploader.close()
+        session.close()
+
 
 if __name__ == "__main__":
-    watch_and_process()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Split live call recordings into chunks and post them")
+    parser.add_argument("--watch", default=WATCH_DIR, help="directory with recordings")
+    parser.add_argument("--segment", type=float, default=15.0, help="chunk length in seconds")
+    parser.add_argument("--overlap", type=float, default=0.0, help="overlap between chunks in seconds")
+    args = parser.parse_args()
+
+    watch_and_process(args.watch, args.segment, args.overlap)
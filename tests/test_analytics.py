@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+from ser_analytics import EmotionAnalytics
+
+START = datetime.now().replace(hour=1, minute=0, second=0, microsecond=0)
+
+
+def result(call_id, when, emotion='happy'):
+    return {'call_id': call_id, 'top_emotion': emotion, 'timestamp': when.isoformat(),
+            'file_path': f"{call_id}_0001.wav"}
+
+
+def test_trend_keeps_the_latest_hours_whatever_the_arrival_order():
+    analytics = EmotionAnalytics(trend_hours=3)
+    for hours in (5, 4, 0, 3, 1, 2):
+        analytics.update(result("call", START + timedelta(hours=hours)))
+    times = [point['time'] for point in analytics.emotion_summary()['trendData']]
+    assert times == ["04:00", "05:00", "06:00"]
+
+
+def test_evicted_call_is_not_counted_again():
+    analytics = EmotionAnalytics(max_calls=2)
+    now = datetime.now()
+    for call_id in ("a", "b", "c", "a", "b"):
+        analytics.update(result(call_id, now))
+    stats = analytics.agent_stats('system')
+    assert stats['todayCalls'] == 3
+    assert stats['totalCalls'] == 3
+
+
+def test_agent_days_keep_only_today_and_yesterday():
+    analytics = EmotionAnalytics()
+    now = datetime.now()
+    # Left over from a previous day, for an agent with no calls since
+    analytics._agent_days['gone'] = {now.date() - timedelta(days=2): {"stale"}}
+    for days_ago, call_id in ((3, "old"), (1, "y1"), (1, "y2"), (0, "t1")):
+        analytics.update(result(call_id, now - timedelta(days=days_ago)))
+    stats = analytics.agent_stats('system')
+    assert (stats['todayCalls'], stats['yesterdayCalls'], stats['totalCalls']) == (1, 2, 3)
+    assert set(analytics._agent_days) == {'system'}
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from ser_backlog import BacklogWalker, ProcessedLedger
+
+FORMATS = {'.wav'}
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = ProcessedLedger(tmp_path / "ledger.db")
+    yield ledger
+    ledger.close()
+
+
+def make_walker(root, ledger):
+    submitted = []
+    walker = BacklogWalker(root, submitted.append, ledger, FORMATS, rescan_seconds=0, min_age_seconds=0)
+    return walker, submitted
+
+
+def write(path, data=b"RIFF"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_walk_queues_audio_and_skips_finished_and_hidden(tmp_path, ledger):
+    root = tmp_path / "audio"
+    done = write(root / "a" / "1_20240101_000.wav")
+    todo = write(root / "b" / "2_20240101_000.wav")
+    write(root / "notes.txt")
+    write(root / ".claims" / "x.wav")
+    ledger.mark_done(done)
+
+    walker, submitted = make_walker(root, ledger)
+    assert walker.walk() == 1
+    assert submitted == [todo]
+
+
+def test_jobs_lost_in_a_crash_are_queued_again(tmp_path, ledger):
+    root = tmp_path / "audio"
+    files = [write(root / f"{i}_20240101_000.wav") for i in range(3)]
+
+    walker, submitted = make_walker(root, ledger)
+    walker.walk()
+    # Only the first job finished before the process died
+    ledger.mark_done(submitted[0])
+
+    restarted, resubmitted = make_walker(root, ledger)
+    restarted.walk()
+    assert resubmitted == files[1:]
+
+
+def test_dropped_or_failed_files_are_retried_until_out_of_attempts(tmp_path):
+    root = tmp_path / "audio"
+    path = write(root / "1_20240101_000.wav")
+    ledger = ProcessedLedger(tmp_path / "ledger.db", max_attempts=2)
+
+    # Dropped on a full queue: never recorded, so queued again
+    walker, submitted = make_walker(root, ledger)
+    walker.walk()
+    walker.walk()
+    assert submitted == [path, path]
+
+    ledger.mark_failed(path)
+    assert ledger.needs_processing(path)
+    ledger.mark_failed(path)
+    assert not ledger.needs_processing(path)
+
+    # A rewritten file gets a fresh set of attempts
+    write(path, b"RIFF-longer")
+    assert ledger.needs_processing(path)
+    ledger.close()
+
+
+def test_file_with_old_mtime_added_after_a_walk_is_picked_up(tmp_path, ledger):
+    root = tmp_path / "audio"
+    first = write(root / "1_20240101_000.wav")
+    walker, submitted = make_walker(root, ledger)
+    walker.walk()
+    ledger.mark_done(first)
+
+    moved_in = write(root / "2_20240101_000.wav")
+    os.utime(moved_in, (1000, 1000))
+
+    walker.walk()
+    assert submitted == [first, moved_in]
+
+
+def test_ledger_is_done_tracks_the_exact_file(tmp_path):
+    ledger = ProcessedLedger(tmp_path / "ledger.db")
+    path = tmp_path / "a.wav"
+    path.write_bytes(b"1")
+    assert not ledger.is_done(path)
+    ledger.mark_failed(path)
+    assert not ledger.is_done(path)
+    ledger.mark_done(path)
+    assert ledger.is_done(path)
+    path.write_bytes(b"rewritten")
+    assert not ledger.is_done(path)
+    ledger.close()
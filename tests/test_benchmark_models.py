@@ -0,0 +1,16 @@
+import os
+
+from benchmark_models import _map_isolated
+
+
+def test_every_model_gets_a_fresh_process():
+    # Fewer workers than jobs: a reused process would report the same pid twice
+    pids = _map_isolated(os.getpid, [()] * 3, workers=1)
+    assert len(set(pids)) == 3
+    assert os.getpid() not in pids
+
+
+def test_failures_are_returned_in_job_order():
+    outcomes = _map_isolated(int, [("1",), ("x",), ("3",)], workers=2)
+    assert outcomes[0] == 1 and outcomes[2] == 3
+    assert isinstance(outcomes[1], ValueError)
@@ -0,0 +1,94 @@
+import sys
+import time
+import types
+
+import pytest
+
+from ser_delivery import DeliveryClient
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, statuses, **kwargs):
+        self.statuses = statuses
+        self.posts = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def post(self, url, json=None):
+        self.posts.append((url, json))
+        return FakeResponse(self.statuses.get(json['id'], 200))
+
+
+def fake_aiohttp(statuses):
+    module = types.ModuleType("aiohttp")
+    module.TCPConnector = lambda **kwargs: None
+    module.ClientTimeout = lambda **kwargs: None
+    module.ClientSession = lambda **kwargs: FakeSession(statuses, **kwargs)
+    return module
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    statuses = {'bad': 422, 'limited': 429, 'down': 503}
+    monkeypatch.setitem(sys.modules, "aiohttp", fake_aiohttp(statuses))
+    client = DeliveryClient(outbox_path=str(tmp_path / "outbox.db"), base_backoff=60)
+    yield client
+    client.close()
+
+
+def test_permanent_client_errors_are_dead_lettered(client):
+    for payload_id in ('ok', 'bad', 'limited', 'down'):
+        client.submit({'id': payload_id})
+    assert wait_for(lambda: client.stats()['delivered'] == 1 and client.stats()['dead_lettered'] == 1)
+    assert wait_for(lambda: client.failed_attempts == 2)
+
+    with client._db_lock:
+        dead = client._conn.execute("SELECT payload, error FROM dead_letter").fetchall()
+        retrying = client._conn.execute("SELECT payload, attempts FROM outbox ORDER BY id").fetchall()
+    assert dead == [('{"id": "bad"}', "HTTP 422")]
+    # 429 and 5xx stay in the outbox for a later attempt
+    assert retrying == [('{"id": "limited"}', 1), ('{"id": "down"}', 1)]
+
+
+def test_idle_loop_wakes_for_each_submit(client):
+    for i in range(20):
+        client.submit({'id': f'ok-{i}'})
+        assert wait_for(lambda: client.delivered == i + 1, timeout=2.0)
+
+
+def test_missing_aiohttp_is_reported(tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, "aiohttp", None)
+    client = DeliveryClient(outbox_path=str(tmp_path / "outbox.db"))
+    client._thread.join(2)
+    client.submit({'id': 'kept'})
+
+    stats = client.stats()
+    assert not stats['running']
+    assert stats['pending'] == 1
+    assert "aiohttp" in stats['last_error']
+    assert "aiohttp is not installed" in capsys.readouterr().out
+    client.close()
@@ -0,0 +1,36 @@
+import os
+import threading
+import time
+
+from ser_files import wait_until_ready
+
+
+def test_waits_for_a_file_to_stop_growing(tmp_path):
+    path = tmp_path / "chunk.wav"
+    path.write_bytes(b"x")
+
+    def grow():
+        with open(path, "ab") as f:
+            f.write(b"y" * 100)
+
+    timer = threading.Timer(0.05, grow)
+    timer.start()
+    assert wait_until_ready(path, interval=0.1, timeout=2.0)
+    timer.join()
+    assert path.stat().st_size == 101
+
+
+def test_missing_or_empty_file_is_not_ready(tmp_path):
+    assert not wait_until_ready(tmp_path / "gone.wav", timeout=0.2)
+    (tmp_path / "empty.wav").write_bytes(b"")
+    assert not wait_until_ready(tmp_path / "empty.wav", interval=0.05, timeout=0.2)
+
+
+def test_settled_file_is_ready_without_waiting(tmp_path):
+    path = tmp_path / "chunk.wav"
+    path.write_bytes(b"x" * 100)
+    old = time.time() - 10
+    os.utime(path, (old, old))
+    started = time.monotonic()
+    assert wait_until_ready(path, interval=1.0, timeout=5.0)
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,194 @@
+import pytest
+
+pytest.importorskip("watchdog")
+
+import ser_predictor  # noqa: E402
+
+
+class FakeRecognizer:
+    def __init__(self):
+        self.prediction_cache = object()
+        self.calls = []
+
+    def warm_up(self):
+        self.calls.append(('warm_up', self.prediction_cache))
+
+    def predict_emotion_top3(self, audio_path):
+        self.calls.append(('file', self.prediction_cache))
+
+    def predict_batch(self, audio_paths):
+        self.calls.append(('batch', self.prediction_cache))
+
+
+def test_benchmark_batching_warms_up_and_bypasses_cache():
+    recognizer = FakeRecognizer()
+    cache = recognizer.prediction_cache
+    report = ser_predictor.benchmark_batching(recognizer, ["a.wav", "b.wav", "c.wav"], max_batch_size=2)
+
+    assert [kind for kind, _ in recognizer.calls] == ['warm_up', 'file', 'file', 'file', 'batch', 'batch']
+    assert all(used is None for kind, used in recognizer.calls if kind != 'warm_up')
+    assert recognizer.prediction_cache is cache
+    assert report['clips'] == 3
+
+
+def test_unknown_length_takes_the_windowed_path(monkeypatch):
+    recognizer = ser_predictor.AudioEmotionRecognizer(long_audio_seconds=60)
+    monkeypatch.setattr(ser_predictor, "audio_duration", lambda source, open_source=None: None)
+    assert recognizer.is_long("call.mp3")
+    monkeypatch.setattr(ser_predictor, "audio_duration", lambda source, open_source=None: 12.0)
+    assert not recognizer.is_long("call.mp3")
+
+
+def _wav_header(sample_rate, channels):
+    fmt = ((1).to_bytes(2, 'little') + channels.to_bytes(2, 'little') + sample_rate.to_bytes(4, 'little')
+           + (sample_rate * channels * 2).to_bytes(4, 'little') + (channels * 2).to_bytes(2, 'little')
+           + (16).to_bytes(2, 'little'))
+    return (b'RIFF' + (0).to_bytes(4, 'little') + b'WAVE' + b'fmt ' + len(fmt).to_bytes(4, 'little') + fmt
+            + b'data' + (0).to_bytes(4, 'little'))
+
+
+def test_file_tail_waits_for_the_whole_header(tmp_path):
+    import threading
+    import numpy as np
+
+    path = tmp_path / "live.wav"
+    header = _wav_header(16000, 2)
+    pcm = np.arange(-800, 800, dtype='<i2').tobytes()
+    path.write_bytes(header[:20])
+
+    def finish_writing():
+        with open(path, 'ab') as f:
+            f.write(header[20:] + pcm)
+
+    timer = threading.Timer(0.3, finish_writing)
+    timer.start()
+    source = ser_predictor.FileTailSource(path, poll_interval=0.05, idle_timeout=1.0)
+    blocks = list(source)
+    timer.join()
+
+    assert (source.sample_rate, source.channels) == (16000, 2)
+    samples = np.concatenate(blocks, axis=1)
+    assert samples.shape == (2, 800)
+    assert samples[0, 0] == -800 / 32768.0
+
+
+def _entry(nbytes):
+    import numpy as np
+    entry = ser_predictor.FrameCacheEntry()
+    entry.tail = np.zeros(nbytes // 4, dtype=np.float32)
+    return entry
+
+
+def test_frame_cache_never_evicts_active_calls():
+    cache = ser_predictor.ConvFeatureCache(max_bytes=1000, ttl_seconds=0)
+    cache.pin("live")
+    cache.put("live", _entry(800))
+    cache.put("ended", _entry(800))
+    cache.touch("live")
+    assert set(cache.entries) == {"live"}
+
+    # Over budget with only active calls: they stay until their stream ends
+    cache.pin("live-2")
+    cache.put("live-2", _entry(800))
+    cache.touch("live-2")
+    assert set(cache.entries) == {"live", "live-2"}
+    cache.discard("live")
+    assert set(cache.entries) == {"live-2"} and cache.active == {"live-2"}
+
+
+class NormalizationRecorder:
+    """Records what each streaming path would feed the model"""
+    def __init__(self):
+        self.windows = []
+        self.encoded = []
+
+    def stream_normalization(self, samples):
+        return float(samples.mean()), float(samples.std()) + 1e-3
+
+    def predict_waveform_top3(self, waveform, source, normalize=True):
+        assert not normalize
+        self.windows.append(waveform[0].numpy().copy())
+        return {}
+
+    def encode_new_samples(self, call_id, samples, cache, keep_frames):
+        self.encoded.append(samples)
+        return 0
+
+
+class Blocks:
+    sample_rate = 16000
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+
+def test_cached_and_uncached_streams_normalize_alike():
+    import numpy as np
+    pytest.importorskip("torch")
+    rng = np.random.default_rng(0)
+    # Level drifts through the call, so per-window statistics would differ from the frozen ones
+    blocks = [(0.1 * rng.standard_normal((1, 4000)) + 0.02 * i).astype(np.float32) for i in range(40)]
+    raw = np.concatenate(blocks, axis=1)[0]
+
+    recorder = NormalizationRecorder()
+    streaming = ser_predictor.StreamingEmotionRecognizer(recorder, window_seconds=1.0, hop_seconds=0.5)
+    list(streaming.stream(Blocks(blocks), "call"))
+    for _, samples in streaming._normalized_blocks(Blocks(blocks)):
+        recorder.encode_new_samples("call", samples, None, 0)
+
+    shift, scale = recorder.stream_normalization(raw[:16000])
+    normalized = (raw - shift) / scale
+    assert np.allclose(np.concatenate(recorder.encoded), normalized, atol=1e-6)
+    # Each uncached window is a slice of the same normalized stream the conv cache is built from
+    ends = range(16000, len(raw) + 1, 8000)
+    assert len(recorder.windows) == len(ends)
+    for window, end in zip(recorder.windows, ends):
+        assert np.allclose(window, normalized[end - 16000:end], atol=1e-6)
+
+
+def test_recognizer_factory_builds_the_ensemble_for_workers(monkeypatch):
+    monkeypatch.setenv("SER_ENSEMBLE", "1")
+    monkeypatch.setenv("SER_ENSEMBLE_MODELS", "model-a,model-b")
+    monkeypatch.setenv("SER_ENSEMBLE_FUSION", "vote")
+    recognizer = ser_predictor.make_recognizer(prediction_cache=None)
+    assert isinstance(recognizer, ser_predictor.EnsembleEmotionRecognizer)
+    assert [member.model_name for member in recognizer.members] == ["model-a", "model-b"]
+    assert recognizer.fusion == "vote"
+    assert recognizer.cache_model_id.startswith("ensemble:vote:")
+
+    # The worker pool scores through predict_batch with one timer per clip
+    calls = []
+    monkeypatch.setattr(recognizer, "predict_emotion_top3",
+                        lambda path, timer=None: calls.append((path, timer)) or {'file_path': path})
+    assert recognizer.predict_batch(["a.wav", "b.wav"], ["ta", "tb"]) == [{'file_path': "a.wav"},
+                                                                           {'file_path': "b.wav"}]
+    assert calls == [("a.wav", "ta"), ("b.wav", "tb")]
+    recognizer.close()
+
+    monkeypatch.setenv("SER_ENSEMBLE", "0")
+    assert isinstance(ser_predictor.make_recognizer(), ser_predictor.AudioEmotionRecognizer)
+
+
+def test_cached_result_is_published_unless_the_ledger_has_it(tmp_path):
+    from ser_backlog import ProcessedLedger
+
+    ledger = ProcessedLedger(tmp_path / "ledger.db")
+    published = []
+    handler = ser_predictor.AudioFileHandler(results_callback=published.append, ledger=ledger)
+    path = tmp_path / "5550001_20240101_0001.wav"
+    path.write_bytes(b"RIFF")
+    cached = {'file_path': str(path), 'top_emotion': 'calm', 'already_processed': True,
+              'predictions': [{'emotion': 'calm', 'percentage': 90.0}]}
+
+    # Crashed after the worker cached it but before it was saved: publish it now
+    handler.handle_result(path, dict(cached))
+    assert len(published) == 1 and ledger.is_done(path)
+
+    # Saved and delivered before: skip
+    handler.handle_result(path, dict(cached))
+    assert len(published) == 1
+    handler.close()
+    ledger.close()
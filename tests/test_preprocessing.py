@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import ser_preprocessing
+
+
+def _fake_to_mono_16k(waveform, sr):
+    """Stands in for the torch resampler: mix down and pick every sr/16000-th sample"""
+    return waveform.mean(axis=0, keepdims=True)[:, ::sr // 16000]
+
+
+def test_compressed_audio_is_decoded_once_in_windows(monkeypatch, tmp_path):
+    sf = pytest.importorskip("soundfile")
+    path = tmp_path / "call.ogg"
+    sf.write(path, np.zeros((int(25.5 * 32000), 2), dtype=np.float32), 32000)
+    monkeypatch.setattr(ser_preprocessing, "torch", SimpleNamespace(from_numpy=lambda a: a))
+    monkeypatch.setattr(ser_preprocessing, "to_mono_16k", _fake_to_mono_16k)
+    opened = []
+
+    windows = list(ser_preprocessing.stream_windows(lambda: opened.append(path) or path, window_seconds=10.0))
+    assert [start for start, _ in windows] == [0.0, 10.0, 20.0]
+    assert [w.shape for _, w in windows] == [(1, 160000), (1, 160000), (1, 88000)]
+    assert len(opened) == 1
+
+
+class FakeDecoder:
+    """Header as ffmpeg reports it for formats libsndfile does not read"""
+    def __init__(self, duration):
+        self.metadata = SimpleNamespace(duration_seconds_from_header=duration)
+
+
+def test_duration_falls_back_to_decoder_header(monkeypatch, tmp_path):
+    sf = pytest.importorskip("soundfile")
+    path = tmp_path / "call.flac"
+    sf.write(path, np.zeros(8000 * 3, dtype=np.float32), 8000)
+    assert ser_preprocessing.audio_duration(path) == 3.0
+
+    m4a = tmp_path / "call.m4a"
+    m4a.write_bytes(b"\x00\x00\x00\x20ftypM4A ")
+    monkeypatch.setattr(ser_preprocessing, "_audio_decoder", lambda source, **kwargs: FakeDecoder(90.0))
+    assert ser_preprocessing.audio_duration(m4a) == 90.0
+    monkeypatch.setattr(ser_preprocessing, "_audio_decoder", lambda source, **kwargs: FakeDecoder(None))
+    assert ser_preprocessing.audio_duration(m4a) is None
+
+
+def test_stream_resampler_matches_one_shot_resample():
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("torchaudio")
+    signal = torch.sin(torch.arange(8000 * 3) * 2 * torch.pi * 300 / 8000)
+
+    resampler = ser_preprocessing.StreamResampler(8000)
+    blocks, start = [], 0
+    for size in [1, 7, 400, 1234, 4000, 33] * 8:
+        blocks.append(resampler(signal[start:start + size]))
+        start += size
+    streamed = torch.cat(blocks)
+    whole = ser_preprocessing.get_resampler(8000)(signal[:start].unsqueeze(0))[0]
+    # Everything but the last few samples, which wait for right-hand context
+    assert streamed.shape[0] >= whole.shape[0] - 2 * resampler.width * 2
+    assert torch.allclose(streamed, whole[:streamed.shape[0]], atol=1e-5)
@@ -0,0 +1,68 @@
+import json
+from collections import Counter
+
+from ser_sharding import DONE, FAILED, HashRing, ShardAssignment
+
+
+def test_ring_is_stable_and_roughly_balanced():
+    nodes = [f"shard-{i}" for i in range(4)]
+    ring = HashRing(nodes)
+    assert HashRing(nodes).node_for("5550001_20240101") == ring.node_for("5550001_20240101")
+    counts = Counter(ring.node_for(f"555{i:04d}_20240101") for i in range(8000))
+    assert set(counts) == set(nodes)
+    assert max(counts.values()) < 1.3 * min(counts.values())
+
+
+def test_each_call_has_exactly_one_owner(tmp_path):
+    shards = [ShardAssignment(i, 3, tmp_path) for i in range(3)]
+    for i in range(200):
+        assert sum(shard.owns(f"call-{i}") for shard in shards) == 1
+
+
+def test_claim_is_exclusive_and_done_is_final(tmp_path):
+    a = ShardAssignment(0, 2, tmp_path, stale_seconds=0)
+    b = ShardAssignment(1, 2, tmp_path, stale_seconds=0)
+    assert a.claim("x.wav")
+    assert not a.claim("x.wav")
+
+    a.mark_done("x.wav")
+    record = json.loads(a._claim_path("x.wav").read_bytes())
+    assert record['state'] == DONE
+    # Even a stale finished claim is never handed out again
+    assert not a.claim("x.wav")
+    assert not b.claim("x.wav")
+
+
+def test_failed_claim_is_retried_until_out_of_attempts(tmp_path):
+    shard = ShardAssignment(0, 1, tmp_path, max_attempts=2)
+    assert shard.claim("x.wav")
+    shard.mark_failed("x.wav")
+    assert json.loads(shard._claim_path("x.wav").read_bytes())['state'] == FAILED
+    assert shard.claim("x.wav")
+    shard.mark_failed("x.wav")
+    assert not shard.claim("x.wav")
+
+
+def test_restarted_shard_takes_back_its_own_claims(tmp_path):
+    first_run = ShardAssignment(0, 2, tmp_path)
+    other = ShardAssignment(1, 2, tmp_path)
+    assert first_run.claim("x.wav")
+    # Fresh claims are not stolen by other shards
+    assert not other.claim("x.wav")
+
+    restarted = ShardAssignment(0, 2, tmp_path)
+    assert restarted.claim("x.wav")
+
+
+def test_release_and_prune(tmp_path):
+    shard = ShardAssignment(0, 1, tmp_path, done_ttl_seconds=0)
+    assert shard.claim("dropped.wav")
+    shard.release("dropped.wav")
+    assert shard.claim("dropped.wav")
+
+    shard.claim("finished.wav")
+    shard.mark_done("finished.wav")
+    assert shard.prune() == 1
+    assert not shard._claim_path("finished.wav").exists()
+    # In-progress claims survive pruning
+    assert shard._claim_path("dropped.wav").exists()
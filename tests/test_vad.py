@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from ser_vad import SAMPLE_RATE, VoiceActivityDetector  # noqa: E402
+
+# F1-F3 of /a/, /i/, /u/ and /e/
+VOWELS = ((730, 1090, 2440), (270, 2290, 3010), (300, 870, 2240), (530, 1840, 2480))
+
+
+def resonator(x, freq, bandwidth):
+    r = np.exp(-np.pi * bandwidth / SAMPLE_RATE)
+    c, d = 2 * r * np.cos(2 * np.pi * freq / SAMPLE_RATE), -r * r
+    y = np.zeros_like(x)
+    y1 = y2 = 0.0
+    for n, value in enumerate(x):
+        y[n] = value + c * y1 + d * y2
+        y2, y1 = y1, y[n]
+    return y
+
+
+def voiced_speech(seconds, f0, syllables_per_second=4, seed=0):
+    """Source-filter vowels: a glottal pulse train with an intonation contour through formants"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    t = np.arange(n) / SAMPLE_RATE
+    pitch = np.interp(t, np.linspace(0, seconds, len(f0)), f0)
+    phase = np.cumsum(pitch * (1 + 0.005 * rng.standard_normal(n))) / SAMPLE_RATE
+    pulses = np.diff(np.floor(phase), prepend=0)
+    source = np.diff(np.convolve(pulses, 0.9 ** np.arange(40))[:n], prepend=0)
+
+    out = np.zeros(n)
+    syllable = SAMPLE_RATE // syllables_per_second
+    for k, start in enumerate(range(0, n, syllable)):
+        part = source[start:start + syllable]
+        for freq, bandwidth in zip(VOWELS[k % len(VOWELS)], (80, 100, 150)):
+            part = resonator(part, freq, bandwidth)
+        out[start:start + len(part)] = part * np.sin(np.pi * np.arange(len(part)) / syllable) ** 2
+    out += 1e-3 * np.abs(out).max() * rng.standard_normal(n)
+    return torch.from_numpy((0.5 * out / np.abs(out).max()).astype(np.float32)).unsqueeze(0)
+
+
+def tones(freqs, on_seconds, off_seconds, repeats=1, snr_db=45, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(on_seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    on = 0.3 * sum(np.sin(2 * np.pi * f * t) for f in freqs) / len(freqs)
+    signal = np.concatenate([on, np.zeros(int(off_seconds * SAMPLE_RATE))] * repeats)
+    signal += on.std() * 10 ** (-snr_db / 20) * rng.standard_normal(len(signal))
+    return torch.from_numpy(signal.astype(np.float32)).unsqueeze(0)
+
+
+@pytest.mark.parametrize("f0", [(100, 130, 95), (120, 120, 120), (200, 260, 190), (220, 300, 210)])
+def test_voiced_speech_is_kept(f0):
+    waveform = voiced_speech(3.0, f0)
+    trimmed, stats = VoiceActivityDetector().trim(waveform)
+    assert trimmed is not None
+    assert stats['speech_seconds'] >= 0.9 * stats['total_seconds']
+
+
+@pytest.mark.parametrize("freqs,on,off,repeats", [
+    ((440, 480), 2.0, 4.0, 1),   # US ringback
+    ((400, 450), 0.4, 0.2, 4),   # UK ringback
+    ((350, 440), 4.0, 0.0, 1),   # dial tone
+    ((425,), 1.0, 3.0, 2),       # single-tone beeps
+])
+def test_call_progress_tones_are_skipped(freqs, on, off, repeats):
+    trimmed, stats = VoiceActivityDetector().trim(tones(freqs, on, off, repeats))
+    assert trimmed is None
+    assert stats['speech_seconds'] == 0
+
+
+def test_ringback_is_trimmed_from_speech():
+    speech = voiced_speech(2.0, (110, 150, 100))
+    ring = tones((440, 480), 2.0, 1.0)
+    trimmed, stats = VoiceActivityDetector().trim(torch.cat([speech, ring], dim=1))
+    assert trimmed is not None
+    assert 1.8 <= stats['speech_seconds'] <= 2.8
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from ser_workers import PRIORITY_BACKLOG, PRIORITY_LIVE, PriorityJobQueue
+
+
+def test_blocked_put_gives_up_when_queue_closes():
+    jobs = PriorityJobQueue(maxsize=1, backlog_maxsize=1)
+    jobs.put({'enqueued': time.time()}, PRIORITY_BACKLOG)
+    errors = []
+
+    def put_forever():
+        try:
+            jobs.put({'enqueued': time.time()}, PRIORITY_BACKLOG, timeout=None)
+        except queue.Full as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=put_forever)
+    thread.start()
+    time.sleep(0.1)
+    jobs.close()
+    thread.join(2)
+    assert not thread.is_alive()
+    assert len(errors) == 1
+
+
+class FullLivePool:
+    """Live queue always full; backlog submits block until there is room"""
+    def __init__(self):
+        self.submitted = []
+        self.accepted = threading.Event()
+
+    def submit(self, file_path, block=True, timeout=None, audio=None, priority=PRIORITY_LIVE):
+        if priority == PRIORITY_LIVE:
+            return False
+        self.submitted.append((str(file_path), priority))
+        self.accepted.set()
+        return True
+
+
+def test_queue_full_file_is_deferred_not_dropped(tmp_path):
+    pytest.importorskip("watchdog")
+    from ser_predictor import AudioFileHandler
+
+    pool = FullLivePool()
+    handler = AudioFileHandler(pool=pool, submit_timeout=0)
+    path = tmp_path / "5550001_20240101_0001.wav"
+    handler.process_audio_file(path)
+
+    assert pool.accepted.wait(2)
+    assert pool.submitted == [(str(path), PRIORITY_BACKLOG)]
+    # Still pending, so a watchdog event for the same file does not queue it twice
+    assert str(path) in handler.pending_files
+    handler.close()
+
+
+def _fake_worker(worker_id, task_queue, result_queue, *args):
+    """Scores instantly; dies on any file named crash*"""
+    import os
+    result_queue.put(('ready', worker_id, {}))
+    while True:
+        job = task_queue.get()
+        if job is None:
+            break
+        if os.path.basename(job['file_path']).startswith('crash'):
+            os._exit(1)
+        job.pop('audio', None)
+        now = time.time()
+        result_queue.put(('done', worker_id, {'job': job, 'result': {'emotion': 'neutral'},
+                                              'started': now, 'finished': now, 'batch_size': 1}))
+
+
+def test_dead_worker_jobs_are_retried_then_failed(monkeypatch):
+    import multiprocessing as mp
+    import ser_workers
+    if 'fork' not in mp.get_all_start_methods():
+        pytest.skip("needs fork to run a test-defined worker")
+    monkeypatch.setattr(ser_workers, '_worker_main', _fake_worker)
+
+    results = {}
+    done = threading.Event()
+
+    def on_result(file_path, result, timing):
+        results[file_path] = result
+        if len(results) == 4:
+            done.set()
+
+    pool = ser_workers.InferenceWorkerPool(num_workers=2, max_batch_size=1, start_method='fork',
+                                           on_result=on_result, supervise_interval=0.1)
+    pool.start()
+    try:
+        for name in ("a.wav", "crash.wav", "b.wav", "c.wav"):
+            assert pool.submit(name, timeout=1)
+        assert done.wait(15), results
+    finally:
+        pool.stop(timeout=2)
+
+    assert results == {"a.wav": {'emotion': 'neutral'}, "b.wav": {'emotion': 'neutral'},
+                       "c.wav": {'emotion': 'neutral'}, "crash.wav": None}
+    stats = pool.stats()
+    # First run plus one retry, each killing a worker
+    assert stats['worker_restarts'] == 2
+    assert stats['failed'] == 1 and stats['completed'] == 3
+    assert stats['in_flight'] == 0
@@ -1,85 +1,105 @@
 import torch
-import torchaudio
 from transformers import (
     Wav2Vec2ForSequenceClassification, 
     Wav2Vec2FeatureExtractor,
     TrainingArguments,
     Trainer,
+    TrainerCallback,
     EarlyStoppingCallback
 )
+from torch.utils.data import DataLoader
 from datasets import load_from_disk, Dataset
 import numpy as np
 from sklearn.metrics import accuracy_score, f1_score
 import logging
+import time
+
+from ser_feature_store import FeatureStoreCollator, LengthBucketBatchSampler, load_or_build_feature_store
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Padded samples per batch (64000 = 4 s at 16kHz, so 8 full-length clips); replaces a fixed batch size
+TRAIN_SAMPLE_BUDGET = 512000
+EVAL_SAMPLE_BUDGET = 1024000
+
+
+class BucketedTrainer(Trainer):
+    """Trainer whose dataloaders use length-bucketed batches from the feature store"""
+    
+    def __init__(self, *args, store=None, eval_collator=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = store
+        self.eval_collator = eval_collator or self.data_collator
+        self.train_batch_sampler = LengthBucketBatchSampler(
+            self.store.lengths[self.train_dataset["index"]],
+            max_samples_per_batch=TRAIN_SAMPLE_BUDGET,
+            seed=self.args.seed
+        )
+    
+    def get_train_dataloader(self):
+        return DataLoader(
+            self.train_dataset,
+            batch_sampler=self.train_batch_sampler,
+            collate_fn=self.data_collator,
+            num_workers=self.args.dataloader_num_workers
+        )
+    
+    def get_eval_dataloader(self, eval_dataset=None):
+        eval_dataset = eval_dataset if eval_dataset is not None else self.eval_dataset
+        return DataLoader(
+            eval_dataset,
+            batch_sampler=LengthBucketBatchSampler(
+                self.store.lengths[eval_dataset["index"]],
+                max_samples_per_batch=EVAL_SAMPLE_BUDGET,
+                shuffle=False
+            ),
+            collate_fn=self.eval_collator,
+            num_workers=self.args.dataloader_num_workers
+        )
+
+
+class EpochStatsCallback(TrainerCallback):
+    """Log epoch wall time, throughput and padding ratio"""
+    
+    def __init__(self, collator, batch_sampler):
+        self.collator = collator
+        self.batch_sampler = batch_sampler
+        self.epoch_start = None
+    
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.batch_sampler.set_epoch(state.epoch or 0)
+        self.collator.reset_stats()
+        self.epoch_start = time.perf_counter()
+    
+    def on_epoch_end(self, args, state, control, **kwargs):
+        seconds = time.perf_counter() - self.epoch_start
+        samples_per_second = self.collator.batched_samples / 16000 / seconds if seconds else 0.0
+        logger.info(
+            f"Epoch {state.epoch:.0f}: {seconds:.1f}s, {self.collator.batches} batches, "
+            f"{samples_per_second:.1f} audio-s/s, padding ratio {self.collator.padding_ratio():.1%}"
+        )
+        state.log_history.append({
+            "epoch": state.epoch,
+            "epoch_seconds": round(seconds, 2),
+            "padding_ratio": round(self.collator.padding_ratio(), 4)
+        })
+
 
 def test_pretrained_models():
     """Test different pre-trained emotion models on your data"""
-    
-    pretrained_models = [
-        "ehcalabres/wav2vec2-lg-xlsr-en-speech-emotion-recognition",
-        "harshit345/xlsr-wav2vec-speech-emotion-recognition",
-        "m3hrdadfi/wav2vec2-xlsr-persian-speech-emotion-recognition"  # Try cross-lingual
-    ]
+    from benchmark_models import CANDIDATE_MODELS, run_benchmark
     
     # Load your dataset
     dataset = load_from_disk("ser_dataset")
-    test_samples = list(dataset["test"])[:20]  # Test on 20 samples first
     
-    for model_name in pretrained_models:
-        try:
-            logger.info(f"\nTesting {model_name}...")
-            
-            # Load model
-            model = Wav2Vec2ForSequenceClassification.from_pretrained(model_name)
-            extractor = Wav2Vec2FeatureExtractor.from_pretrained(model_name)
-            
-            correct = 0
-            total = 0
-            
-            for sample in test_samples:
-                try:
-                    # Load and preprocess audio
-                    audio, sr = torchaudio.load(sample["path"])
-                    if sr != 16000:
-                        audio = torchaudio.transforms.Resample(sr, 16000)(audio)
-                    
-                    inputs = extractor(
-                        audio.squeeze().numpy(), 
-                        sampling_rate=16000, 
-                        return_tensors="pt"
-                    )
-                    
-                    # Predict
-                    with torch.no_grad():
-                        outputs = model(**inputs)
-                        predicted_id = torch.argmax(outputs.logits, dim=-1).item()
-                        predicted_emotion = model.config.id2label[predicted_id]
-                    
-                    # Check if prediction matches (approximate matching)
-                    actual_emotion = sample["label"].lower()
-                    predicted_emotion = predicted_emotion.lower()
-                    
-                    # Simple matching (you may need to adjust this)
-                    if any(word in predicted_emotion for word in actual_emotion.split()) or \
-                       any(word in actual_emotion for word in predicted_emotion.split()):
-                        correct += 1
-                    
-                    total += 1
-                    
-                    logger.info(f"Actual: {actual_emotion}, Predicted: {predicted_emotion}")
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to process sample: {e}")
-            
-            accuracy = correct / total if total > 0 else 0
-            logger.info(f"Approximate accuracy for {model_name}: {accuracy:.2f}")
-            
-        except Exception as e:
-            logger.error(f"Failed to load {model_name}: {e}")
+    # Decodes the test split once and scores the candidates in parallel processes
+    report = run_benchmark(list(dataset["test"]), CANDIDATE_MODELS)
+    for row in report:
+        if 'error' not in row:
+            logger.info(f"{row['model']}: accuracy {row['accuracy']:.2f}, macro-F1 {row['macro_f1']:.2f}, "
+                        f"p95 {row['latency_ms_p95']} ms")
+    return report
 
 def fine_tune_pretrained_model():
     """Fine-tune a pre-trained emotion model on your data"""
@@ -133,40 +153,20 @@ def fine_tune_pretrained_model():
     except Exception as e:
         logger.warning(f"Could not transfer weights: {e}")
     
-    # Preprocessing function
-    def preprocess(batch):
-        try:
-            audio, sr = torchaudio.load(batch["path"])
-            if sr != 16000:
-                audio = torchaudio.transforms.Resample(sr, 16000)(audio)
-        
-            if audio.shape[0] > 1:
-                audio = audio[0:1, :]
-        
-            inputs = extractor(
-                audio.squeeze().numpy(),
-                sampling_rate=16000,
-                return_tensors="pt",
-                padding=True,
-                truncation=True,
-                max_length=64000 
-            )
-        
-            batch["input_values"] = inputs.input_values.squeeze().numpy()
-            batch["label"] = label2id[batch["label"]]
-            return batch
-        except Exception as e:
-            logger.warning(f"Skipping file {batch.get('path')} due to error: {e}")
-            return {"skip": True}
- 
-
+    # Decode once into a memory-mapped store; later runs reuse it while the files are unchanged
+    store = load_or_build_feature_store(
+        [item["path"] for item in all_data],
+        "feature_cache",
+        max_samples=64000,
+        do_normalize=extractor.do_normalize
+    )
+    label_by_path = {str(item["path"]): item["label"] for item in all_data}
     
-    # Create dataset
-    full_dataset = Dataset.from_list(all_data)
-    full_dataset = full_dataset.map(preprocess)
-    full_dataset = full_dataset.filter(lambda x: "skip" not in x)
+    # Create dataset of store indices; the collator pulls the audio from the mapped file
+    full_dataset = Dataset.from_list([
+        {"index": i, "label": label2id[label_by_path[path]]} for i, path in enumerate(store.paths)
+    ])
 
-    
     # Split dataset
     split_dataset = full_dataset.train_test_split(test_size=0.2, seed=42)
     
@@ -189,7 +189,8 @@ def fine_tune_pretrained_model():
         eval_steps=25,
         save_strategy="steps",
         save_steps=25,
-        per_device_train_batch_size=2,  # Very small batch
+        # Batch sizes come from the sample budget in BucketedTrainer, not from these
+        per_device_train_batch_size=2,
         per_device_eval_batch_size=2,
         learning_rate=5e-6,  # Very low learning rate
         num_train_epochs=20,
@@ -203,6 +204,7 @@ def fine_tune_pretrained_model():
         dataloader_drop_last=False,
         fp16=torch.cuda.is_available(),
         seed=42,
+        remove_unused_columns=False,  # the collator needs the "index" column
         report_to=None
     )
     
@@ -213,22 +215,9 @@ def fine_tune_pretrained_model():
         f1 = f1_score(labels, preds, average="weighted", zero_division=0)
         return {"accuracy": acc, "f1": f1}
     
-    def data_collator(features):
-        features = [f for f in features if "input_values" in f] 
-        batch = {}
-        max_len = max(len(f["input_values"]) for f in features)
-        input_values = []
-        labels = []
-        
-        for f in features:
-            input_val = f["input_values"]
-            padded = np.pad(input_val, (0, max_len - len(input_val)), mode='constant')
-            input_values.append(padded)
-            labels.append(f["label"])
-        
-        batch["input_values"] = torch.tensor(input_values, dtype=torch.float32)
-        batch["labels"] = torch.tensor(labels, dtype=torch.long)
-        return batch
+    # Separate collators so the padding stats only count training batches
+    data_collator = FeatureStoreCollator(store, return_attention_mask=extractor.return_attention_mask)
+    eval_collator = FeatureStoreCollator(store, return_attention_mask=extractor.return_attention_mask)
     
     # Early stopping
     early_stopping = EarlyStoppingCallback(
@@ -237,15 +226,18 @@ def fine_tune_pretrained_model():
     )
     
     # Trainer
-    trainer = Trainer(
+    trainer = BucketedTrainer(
         model=model,
         args=training_args,
         train_dataset=split_dataset["train"],
         eval_dataset=split_dataset["test"],
         data_collator=data_collator,
         compute_metrics=compute_metrics,
-        callbacks=[early_stopping]
+        callbacks=[early_stopping],
+        store=store,
+        eval_collator=eval_collator
     )
+    trainer.add_callback(EpochStatsCallback(data_collator, trainer.train_batch_sampler))
     
     # Train
     logger.info("Starting fine-tuning...")
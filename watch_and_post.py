@@ -1,63 +1,231 @@
 import os
 import time
-import requests
 import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from ser_files import wait_until_ready
 
 WATCH_DIR = "/tmp/chunks"
 FLASK_URL = "http://localhost:5000/receive_audio"
 DB_PATH = "sent_chunks.db"
 
-# Ensure the database and table exists
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
+
+class SentLog:
+    def __init__(self, path=DB_PATH, flush_every=50, flush_interval=1.0):
+        """Sent filenames in one long-lived WAL connection, written in batches"""
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
             CREATE TABLE IF NOT EXISTS sent_files (
                 filename TEXT PRIMARY KEY
             );
         """)
+        self._conn.commit()
+        # Lookups hit this set; the table only has to survive restarts
+        self._sent = {row[0] for row in self._conn.execute("SELECT filename FROM sent_files")}
+        self._pending = []
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
 
-# Check if the file has already been sent
-def is_already_sent(filename):
-    with sqlite3.connect(DB_PATH) as conn:
-        result = conn.execute("SELECT 1 FROM sent_files WHERE filename = ?", (filename,)).fetchone()
-        return result is not None
+    def __contains__(self, filename):
+        with self._lock:
+            return filename in self._sent
 
-# Mark file as sent
-def mark_as_sent(filename):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("INSERT OR IGNORE INTO sent_files (filename) VALUES (?)", (filename,))
-        conn.commit()
+    def __len__(self):
+        with self._lock:
+            return len(self._sent)
 
-def post_chunk(filepath):
-    filename = os.path.basename(filepath)
-    if not filename.endswith(".wav") or is_already_sent(filename):
-        return
+    def mark(self, filename):
+        with self._lock:
+            self._sent.add(filename)
+            self._pending.append((filename,))
+            if (len(self._pending) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
 
-    parts = filename.replace(".wav", "").split("_")
-    caller = parts[0] if len(parts) > 0 else "unknown"
-    timestamp = parts[1] if len(parts) > 1 else "unknown"
+    def flush(self):
+        with self._lock:
+            self._flush()
 
-    try:
-        print(f"📤 Sending {filename}...")
-        with open(filepath, 'rb') as f:
-            r = requests.post(FLASK_URL, files={"audio": f}, data={"caller": caller, "timestamp": timestamp})
+    def _flush(self):
+        if self._pending:
+            self._conn.executemany("INSERT OR IGNORE INTO sent_files (filename) VALUES (?)", self._pending)
+            self._conn.commit()
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._conn.close()
+
+
+class ChunkUploader:
+    def __init__(self, watch_dir=WATCH_DIR, url=FLASK_URL, db_path=DB_PATH, max_parallel=4,
+                 retry_delay=5.0, timeout=30):
+        """Upload finished chunks as they appear, several at a time over one pooled session"""
+        self.watch_dir = watch_dir
+        self.url = url
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.sent = SentLog(db_path)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_parallel)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="chunk-upload")
+
+        self._in_flight = set()
+        self._retry_at = {}
+        self._lock = threading.Lock()
+
+        self.uploaded = 0
+        self.failed = 0
+        self._completed = deque(maxlen=1000)
+        self._lags = deque(maxlen=500)
+        self._started = time.monotonic()
+
+    def enqueue(self, filepath):
+        filename = os.path.basename(filepath)
+        if not filename.endswith(".wav") or filename in self.sent:
+            return
+        with self._lock:
+            if filepath in self._in_flight:
+                return
+            self._in_flight.add(filepath)
+            self._retry_at.pop(filepath, None)
+        self.executor.submit(self._upload, filepath)
+
+    def scan_existing(self):
+        """One pass over the directory for chunks written while we were down"""
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self.enqueue(entry.path)
+
+    def retry_due(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [path for path, when in self._retry_at.items() if when <= now]
+        for path in due:
+            self.enqueue(path)
+
+    def _upload(self, filepath):
+        filename = os.path.basename(filepath)
+        parts = filename.replace(".wav", "").split("_")
+        caller = parts[0] if len(parts) > 0 else "unknown"
+        timestamp = parts[1] if len(parts) > 1 else "unknown"
+
+        ok = False
+        try:
+            if not wait_until_ready(filepath):
+                return
+            written = os.path.getmtime(filepath)
+            with open(filepath, 'rb') as f:
+                r = self.session.post(self.url, files={"audio": f},
+                                      data={"caller": caller, "timestamp": timestamp},
+                                      timeout=self.timeout)
             if r.status_code == 200:
+                ok = True
+                self.sent.mark(filename)
+                done = time.time()
+                with self._lock:
+                    self.uploaded += 1
+                    self._completed.append(time.monotonic())
+                    self._lags.append(done - written)
                 print(f"✅ Sent {filename}")
-                mark_as_sent(filename)
             else:
                 print(f"❌ Failed {filename} → {r.status_code}")
-    except Exception as e:
-        print(f"🔥 Error sending {filename}: {e}")
-
-def watch_and_send():
-    init_db()
-    print("🚀 Watching for new audio chunks...")
-    while True:
-        for file in os.listdir(WATCH_DIR):
-            fullpath = os.path.join(WATCH_DIR, file)
-            if os.path.isfile(fullpath):
-                post_chunk(fullpath)
-        time.sleep(2)  # near real-time
+        except Exception as e:
+            print(f"🔥 Error sending {filename}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(filepath)
+                if not ok and os.path.exists(filepath):
+                    self.failed += 1
+                    self._retry_at[filepath] = time.monotonic() + self.retry_delay
+
+    def stats(self, window_seconds=60):
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._completed if now - t <= window_seconds]
+            span = min(window_seconds, now - self._started)
+            lags = sorted(self._lags)
+            stats = {
+                'uploaded': self.uploaded,
+                'failed': self.failed,
+                'in_flight': len(self._in_flight),
+                'retrying': len(self._retry_at),
+                'chunks_per_sec': round(len(recent) / span, 2) if span > 0 else 0.0,
+                'lag_ms': {}
+            }
+        if lags:
+            stats['lag_ms'] = {
+                'p50': round(1000 * lags[len(lags) // 2], 1),
+                'p95': round(1000 * lags[min(len(lags) - 1, int(len(lags) * 0.95))], 1),
+                'max': round(1000 * lags[-1], 1)
+            }
+        return stats
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        self.sent.close()
+
+
+class ChunkEventHandler(FileSystemEventHandler):
+    def __init__(self, uploader):
+        self.uploader = uploader
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.uploader.enqueue(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.uploader.enqueue(event.dest_path)
+
+
+def watch_and_send(watch_dir=WATCH_DIR, url=FLASK_URL, max_parallel=4, stats_interval=30):
+    os.makedirs(watch_dir, exist_ok=True)
+    uploader = ChunkUploader(watch_dir, url, max_parallel=max_parallel)
+    observer = Observer()
+    observer.schedule(ChunkEventHandler(uploader), watch_dir, recursive=False)
+    observer.start()
+    uploader.scan_existing()
+    print(f"🚀 Watching {watch_dir} for new audio chunks ({max_parallel} parallel uploads)...")
+
+    last_stats = time.monotonic()
+    try:
+        while True:
+            time.sleep(1)
+            uploader.retry_due()
+            uploader.sent.flush()
+            if time.monotonic() - last_stats >= stats_interval:
+                last_stats = time.monotonic()
+                s = uploader.stats()
+                lag = s['lag_ms']
+                print(f"📊 Uploaded {s['uploaded']} | {s['chunks_per_sec']} chunks/s | "
+                      f"in flight {s['in_flight']} | retrying {s['retrying']} | "
+                      f"lag p50 {lag.get('p50', '-')} ms, p95 {lag.get('p95', '-')} ms")
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping uploader...")
+    finally:
+        observer.stop()
+        observer.join()
+        uploader.close()
+
 
 if __name__ == "__main__":
-    watch_and_send()
+    watch_and_send(max_parallel=int(os.environ.get("SER_UPLOAD_PARALLEL", 4)))